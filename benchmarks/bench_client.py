@@ -0,0 +1,149 @@
+"""
+ZMON client micro benchmarks.
+
+Run with:
+
+    $ python -m benchmarks.bench_client
+"""
+import os
+import json
+import time
+import timeit
+import tracemalloc
+
+from opentracing.mocktracer import MockTracer
+from opentracing_utils import trace
+
+from zmon_cli.client import Zmon, NOOP_SPAN
+from zmon_cli.models import Entity, to_plain
+from zmon_cli.output import write_json
+from zmon_cli.entity_filter import EntityIndex
+
+
+URL = 'https://zmon.example.org'
+
+NUMBER = 20000
+
+ENTITIES = 200000
+
+CHECKS = 2000
+
+
+class FakeResponse:
+    ok = True
+    status_code = 200
+    text = '{"id": "entity-1"}'
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'id': 'entity-1'}
+
+
+class FakeSession:
+    """No HTTP calls, to measure client overhead only."""
+
+    def get(self, url, **kwargs):
+        return FakeResponse()
+
+
+def get_client(**kwargs):
+    zmon = Zmon(URL, token='123', **kwargs)
+    zmon._session = FakeSession()
+
+    return zmon
+
+
+def report(name, seconds, baseline=None):
+    usec = seconds / NUMBER * 1e6
+    overhead = ' (+{:.2f} usec)'.format(usec - baseline) if baseline is not None else ''
+    print('{:<40} {:8.2f} usec/call{}'.format(name, usec, overhead))
+    return usec
+
+
+def bench_tracing():
+    print('Tracing overhead of Zmon.get_entity:')
+
+    zmon = get_client()
+    undecorated = Zmon.get_entity.__wrapped__
+    baseline = report('undecorated',
+                      timeit.timeit(lambda: undecorated(zmon, 'entity-1', span=NOOP_SPAN), number=NUMBER))
+
+    report('tracing disabled', timeit.timeit(lambda: zmon.get_entity('entity-1'), number=NUMBER), baseline)
+
+    legacy = trace(pass_span=True)(undecorated)
+    report('opentracing_utils.trace (noop tracer)', timeit.timeit(lambda: legacy(zmon, 'entity-1'), number=NUMBER),
+           baseline)
+
+    for rate in (0.01, 0.1, 1.0):
+        tracer = MockTracer()
+        zmon = get_client(tracer=tracer, trace_sample_rate=rate)
+        report('mock tracer, sample rate {}'.format(rate),
+               timeit.timeit(lambda: zmon.get_entity('entity-1'), number=NUMBER), baseline)
+
+
+def entities():
+    # parsed JSON, i.e. no shared strings
+    return [{
+        'id': 'instance-{}'.format(i), 'type': ''.join('instance'), 'application_id': 'app-{}'.format(i % 100),
+        'team': ''.join('team-a'), 'ip': '10.0.{}.{}'.format(i // 256 % 256, i % 256),
+        'last_modified': ''.join('2017-01-01 01:01:01.000'),
+    } for i in range(ENTITIES)]
+
+
+def bench_models():
+    print('Memory of {} entities:'.format(ENTITIES))
+
+    for name, convert in (('dicts', None), ('models', Entity.from_list)):
+        tracemalloc.start()
+        data = entities()
+        if convert:
+            data = convert(data)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print('{:<40} {:8.1f} MB retained {:8.1f} MB peak'.format(name, current / 2 ** 20, peak / 2 ** 20))
+        del data
+
+
+def bench_entity_filter():
+    print('Matching {} check definitions against {} entities:'.format(CHECKS, ENTITIES))
+
+    data = Entity.from_list(entities())
+    checks = [{
+        'entities': [{'type': 'instance', 'application_id': 'app-{}'.format(i % 100)}],
+        'entities_exclude': [{'ip': '10.0.0.{}'.format(i % 256)}],
+    } for i in range(CHECKS)]
+
+    start = time.time()
+    index = EntityIndex(data)
+    print('{:<40} {:8.2f} sec'.format('index', time.time() - start))
+
+    start = time.time()
+    matched = sum(len(index.match_check(check)) for check in checks)
+    print('{:<40} {:8.2f} sec ({} matches)'.format('match', time.time() - start, matched))
+
+
+def bench_json():
+    print('JSON output of {} entities:'.format(ENTITIES))
+
+    data = Entity.from_list(entities())
+
+    with open(os.devnull, 'w') as fd:
+        for name, dump in (('json.dumps', lambda: print(json.dumps(to_plain(data), indent=4), file=fd)),
+                           ('write_json', lambda: write_json(data, fd, indent=4))):
+            start = time.time()
+            tracemalloc.start()
+            dump()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print('{:<40} {:8.1f} MB peak {:8.2f} sec'.format(name, peak / 2 ** 20, time.time() - start))
+
+
+if __name__ == '__main__':
+    bench_tracing()
+    bench_models()
+    bench_entity_filter()
+    bench_json()
@@ -0,0 +1,130 @@
+"""
+ZMON client transport benchmarks: bulk entity push and concurrent multi-get, per transport.
+
+Requires the optional ``httpx`` dependency (``pip install "zmon-cli[httpx]"``). Run against a ZMON backend with:
+
+    $ ZMON_URL=https://zmon.example.org ZMON_TOKEN=... python -m benchmarks.bench_transport
+
+Benchmark entities (type ``zmon-cli-benchmark``) are removed afterwards.
+
+Without ``ZMON_URL``, a local stub backend is started, answering every request after ``ZMON_BENCH_LATENCY`` seconds
+(default 0.005) to stand in for network and backend latency. It speaks plain HTTP/1.1 only, so both transports are
+compared over HTTP/1.1: the stub results say nothing about HTTP/2.
+"""
+import os
+import json
+import time
+import threading
+import contextlib
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from zmon_cli.bulk import run_concurrently
+from zmon_cli.client import Zmon
+from zmon_cli.transport import TRANSPORTS
+
+
+ENTITY_TYPE = 'zmon-cli-benchmark'
+
+LATENCY = float(os.environ.get('ZMON_BENCH_LATENCY', 0.005))
+
+ENTITIES = int(os.environ.get('ZMON_BENCH_ENTITIES', 200))
+
+CONCURRENCY = (1, 8, 32)
+
+
+def entity_id(i):
+    return 'zmon-cli-benchmark-{}'.format(i)
+
+
+def timed(fn, items, concurrency):
+    start = time.time()
+    results = run_concurrently(fn, items, concurrency=concurrency)
+    elapsed = time.time() - start
+
+    failed = len([r for r in results if r[2] is not None])
+    return elapsed, failed
+
+
+def report(transport, workload, concurrency, elapsed, failed):
+    print('{:<10} {:<10} j={:<3} {:8.3f} sec {:8.1f} req/sec{}'.format(
+        transport, workload, concurrency, elapsed, ENTITIES / elapsed, ' ({} failed)'.format(failed) if failed else ''))
+
+
+def bench_transports(url, token):
+    ids = [entity_id(i) for i in range(ENTITIES)]
+
+    for transport in TRANSPORTS:
+        zmon = Zmon(url, token=token, transport=transport)
+
+        # warm up connection
+        zmon.status()
+
+        for concurrency in CONCURRENCY:
+            report(transport, 'push', concurrency, *timed(
+                lambda i: zmon.add_entity({'id': i, 'type': ENTITY_TYPE}), ids, concurrency))
+
+            report(transport, 'get', concurrency, *timed(zmon.get_entity, ids, concurrency))
+
+        run_concurrently(zmon.delete_entity, ids, concurrency=max(CONCURRENCY))
+        zmon.session.close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Minimal ZMON API: every request succeeds after ``LATENCY`` seconds."""
+
+    protocol_version = 'HTTP/1.1'
+
+    # headers and body in one segment, no delayed ACK stalls
+    wbufsize = 65536
+    disable_nagle_algorithm = True
+
+    def _respond(self, body):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        time.sleep(LATENCY)
+
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._respond(json.dumps({'id': self.path.rsplit('/', 1)[-1], 'type': ENTITY_TYPE}))
+
+    def do_PUT(self):
+        self._respond('')
+
+    def do_DELETE(self):
+        self._respond('1')
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # concurrent benchmark connections must not be refused
+    request_queue_size = 128
+
+
+@contextlib.contextmanager
+def stub_backend():
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    if os.environ.get('ZMON_URL'):
+        bench_transports(os.environ['ZMON_URL'], os.environ['ZMON_TOKEN'])
+    else:
+        with stub_backend() as url:
+            bench_transports(url, 'benchmark')
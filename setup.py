@@ -136,6 +136,7 @@ def setup_package():
         test_suite='tests',
         packages=setuptools.find_packages(exclude=['tests', 'tests.*']),
         install_requires=get_install_requirements('requirements.txt'),
+        extras_require={'httpx': ['httpx[http2]']},
         setup_requires=['flake8'],
         cmdclass=cmdclass,
         tests_require=['pytest-cov', 'pytest'],
@@ -1,10 +1,27 @@
+import io
+import os
+import gzip
+import json
 import yaml
+import logging
+import logging.handlers
+import requests
+import multiprocessing
+import pytest
 from unittest.mock import MagicMock
 from click.testing import CliRunner
 
 
 from zmon_cli.main import cli
-from zmon_cli.client import Zmon
+from zmon_cli.client import Zmon, ZmonArgumentError, ZmonCircuitOpenError
+from zmon_cli.records import iter_json
+from zmon_cli.mirror import EntityMirror
+from zmon_cli.config import stop_logging, get_log_file_handler, SharedRotatingFileHandler
+from zmon_cli.models import Entity, to_plain
+from zmon_cli.status_watch import StatusHistory
+from zmon_cli.output import Output, render_entities, render_checks
+from zmon_cli import completion, daemon, main
+from zmon_cli.cmds import command
 
 
 def get_client(config):
@@ -48,6 +65,169 @@ def test_status(monkeypatch):
         assert 'd ago' in result.output
 
 
+def test_status_watch(monkeypatch):
+    get = MagicMock()
+    get.side_effect = [{
+        'alerts_active': 3,
+        'queues': [{'name': 'zmon:queue:default', 'size': size}],
+        'workers': [
+            {'name': 'w-1', 'check_invocations': invocations, 'last_execution_time': 1},
+            {'name': 'w-2', 'check_invocations': 500, 'last_execution_time': 1},
+        ],
+    } for size, invocations in ((100, 10), (60, 20), (20, 30))]
+    monkeypatch.setattr('zmon_cli.client.Zmon.status', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        result = runner.invoke(cli, ['status', '--watch', '--interval', '0', '--count', '3', '--stall-after', '0',
+                                     '-o', 'json'], catch_exceptions=False)
+
+        summaries = [json.loads(line) for line in result.output.splitlines()]
+
+        assert len(summaries) == 3
+        assert get.call_count == 3
+
+        queue = summaries[-1]['queues'][0]
+        assert queue['size'] == 20
+        assert queue['rate'] < 0
+        assert queue['eta'] > 0
+
+        workers = {w['name']: w for w in summaries[-1]['workers']}
+        assert workers['w-1']['rate'] > 0
+        assert not workers['w-1']['stalled']
+        assert workers['w-2']['rate'] == 0
+        assert workers['w-2']['stalled']
+
+
+def test_status_history():
+    history = StatusHistory(size=3)
+
+    for t, invocations in ((0, 100), (10, 150), (20, 5), (30, 25)):
+        history.add({'workers': [{'name': 'w-1', 'check_invocations': invocations}]}, timestamp=t)
+
+    assert len(history) == 3
+    assert history.span == 20
+
+    worker, = history.workers(stall_after=15)
+
+    # counter reset by worker restart
+    assert worker['rate'] == 2.0
+    assert worker['recent_rate'] == 2.0
+    assert not worker['stalled']
+
+    history.add({'workers': [{'name': 'w-1', 'check_invocations': 25}]}, timestamp=40)
+    history.add({'workers': [{'name': 'w-1', 'check_invocations': 25}]}, timestamp=50)
+
+    worker, = history.workers(stall_after=15)
+    assert worker['stalled']
+
+
+def test_completion(monkeypatch, tmpdir, capsys):
+    monkeypatch.setenv('ZMON_COMPLETION_CACHE', str(tmpdir))
+
+    checks = MagicMock(return_value=[{'id': 12, 'owning_team': 'team-a'}, {'id': 13, 'owning_team': 'Team B'}])
+    alerts = MagicMock(return_value=[{'id': 101, 'team': 'team-a', 'responsible_team': 'team-c'}])
+    search = MagicMock(return_value={'dashboards': [{'id': 7, 'team': 'team-d'}], 'grafana_dashboards': []})
+    entities = MagicMock(return_value=[{'id': 'app-1'}, {'id': 'app-2'}, {'id': 'db-1'}])
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', checks)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', alerts)
+    monkeypatch.setattr('zmon_cli.client.Zmon.search', search)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', entities)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'completion', 'refresh'], catch_exceptions=False)
+
+        assert '2 checks, 1 alerts, 1 dashboards, 3 entities, 3 teams' in result.output
+
+    def complete(*words):
+        monkeypatch.setattr('sys.argv', ['zmon', '__complete', str(len(words) - 1), 'zmon'] + list(words[1:]))
+        with pytest.raises(SystemExit) as e:
+            main.main()
+        assert e.value.code == 0
+        return capsys.readouterr().out.split()
+
+    assert complete('zmon', 'entities', 'get', 'app') == ['app-1', 'app-2']
+    assert complete('zmon', '-c', 'test.yaml', 'alert', 'get', '') == ['101']
+    assert complete('zmon', 'check-definitions', 'delete', '1') == ['12', '13']
+    assert complete('zmon', 'dashboard', 'get', '') == ['7']
+    assert complete('zmon', 'search', '--team', 'team-') == ['team-a', 'team-c', 'team-d']
+    assert complete('zmon', 'entities', 'push', '') == []
+
+
+def test_completion_refresh_in_background(monkeypatch, tmpdir):
+    popen = MagicMock()
+    monkeypatch.setattr('subprocess.Popen', popen)
+
+    assert completion.refresh_in_background('test.yaml', interval=60, path=str(tmpdir))
+    assert popen.call_args[0][0][-3:] == ['test.yaml', 'completion', 'refresh']
+
+    # not stale anymore
+    assert not completion.refresh_in_background('test.yaml', interval=60, path=str(tmpdir))
+    assert not completion.refresh_in_background('test.yaml', interval=0, path=str(tmpdir))
+    assert popen.call_count == 1
+
+
+def test_completion_refresh_in_daemon(monkeypatch):
+    refresh = MagicMock()
+    monkeypatch.setattr('zmon_cli.cmds.command.refresh_in_background', refresh)
+    monkeypatch.setattr('zmon_cli.daemon.serving', True)
+
+    ctx = MagicMock(invoked_subcommand='status', params={})
+    ctx.obj.config = {'url': 'https://zmon'}
+
+    # daemon's stdout is no terminal, the forwarding client's stdout decides
+    monkeypatch.setattr('zmon_cli.daemon.interactive', False)
+    command.refresh_completion_cache(ctx)
+    refresh.assert_not_called()
+
+    monkeypatch.setattr('zmon_cli.daemon.interactive', True)
+    command.refresh_completion_cache(ctx)
+    refresh.assert_called_once_with(command.DEFAULT_CONFIG_FILE, interval=command.DEFAULT_REFRESH_INTERVAL)
+
+
+def test_deadline(monkeypatch):
+    get = MagicMock()
+    monkeypatch.setattr('requests.Session.get', get)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'https://zmon', 'token': '123'}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', '--deadline', '0.000001', 'status'])
+
+        assert result.exit_code == 1
+        assert 'Deadline exceeded (--deadline 1e-06 sec)' in result.output
+        get.assert_not_called()
+
+
+def test_circuit_open(monkeypatch):
+    get = MagicMock()
+    get.side_effect = ZmonCircuitOpenError('zmon', retry_after=30)
+    monkeypatch.setattr('zmon_cli.client.Zmon.status', get)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'https://zmon', 'token': '123', 'circuit_breaker': True}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'status'])
+
+        assert result.exit_code == 1
+        assert 'Circuit open for zmon after repeated failures, retry in 30 sec' in result.output
+
+
 def test_status_zign(monkeypatch):
     get = MagicMock()
     get.return_value = {
@@ -76,6 +256,204 @@ def test_status_zign(monkeypatch):
     get_token.assert_called_with('zmon', ['uid'])
 
 
+def test_logging(monkeypatch):
+    get = MagicMock()
+    get.return_value = {'workers': []}
+    monkeypatch.setattr('zmon_cli.client.Zmon.status', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': '123', 'log_file': 'zmon-{pid}.log', 'log_debug_sample_rate': 0}, fd)
+
+        runner.invoke(cli, ['-v', '-c', 'test.yaml', 'status'], catch_exceptions=False)
+
+        logger = logging.getLogger('zmon_cli.test')
+        logger.debug('sampled out')
+        logger.warning('always logged')
+
+        stop_logging()
+
+        with open('zmon-{}.log'.format(os.getpid())) as fd:
+            log = fd.read()
+
+        assert 'always logged' in log
+        assert 'sampled out' not in log
+
+    assert isinstance(get_log_file_handler(), SharedRotatingFileHandler)
+
+
+def test_shared_log_file_bounded(tmpdir):
+    config = {'log_file': str(tmpdir.join('zmon-cli.log')), 'log_max_bytes': 1000, 'log_backup_count': 2}
+
+    # handlers of concurrent processes, writing to the same file
+    handlers = [get_log_file_handler(config) for _ in range(2)]
+    for i in range(200):
+        handlers[i % 2].handle(logging.makeLogRecord({'msg': 'record {:04d}'.format(i)}))
+
+    files = sorted(os.listdir(str(tmpdir)))
+    assert files == ['zmon-cli.log', 'zmon-cli.log.1', 'zmon-cli.log.2', 'zmon-cli.log.lock']
+    for name in files:
+        assert os.path.getsize(str(tmpdir.join(name))) <= 1000
+
+    assert 'record 0199' in tmpdir.join('zmon-cli.log').read()
+
+    for handler in handlers:
+        handler.close()
+
+
+def test_old_log_files_removed(tmpdir):
+    old, recent = tmpdir.join('zmon-1.log'), tmpdir.join('zmon-2.log')
+    for path in (old, recent, tmpdir.join('zmon-1.log.1'), tmpdir.join('other.log')):
+        path.write('log')
+        os.utime(str(path), (0, 0))
+    recent.write('log')
+
+    get_log_file_handler({'log_file': str(tmpdir.join('zmon-{pid}.log'))})
+
+    assert sorted(os.listdir(str(tmpdir))) == ['other.log', 'zmon-2.log']
+
+
+def test_daemon(monkeypatch, tmpdir, capsys):
+    def get(*args):
+        return {'workers': [{'name': os.environ.get('HTTPS_PROXY'), 'check_invocations': 12377,
+                             'last_execution_time': 1}]}
+
+    monkeypatch.setenv('HTTPS_PROXY', 'http://proxy:3128')
+    monkeypatch.setattr('zmon_cli.client.Zmon.status', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    path = str(tmpdir.join('daemon.sock'))
+
+    # output is redirected process wide while serving commands
+    server = multiprocessing.get_context('fork').Process(target=daemon.serve, args=(path,))
+    server.start()
+
+    try:
+        for _ in range(50):
+            if daemon.request({'command': 'status'}, path=path):
+                break
+            server.join(0.1)
+
+        assert daemon.forward(['status'], path=path) == 0
+        out = capsys.readouterr().out
+        assert '12377' in out
+        assert 'http://proxy:3128' in out
+
+        # exit code of failing batch is forwarded
+        batch = tmpdir.join('batch.ndjson')
+        batch.write(json.dumps({'id': 'fail', 'args': ['entities', 'filter', 'type']}))
+        assert daemon.forward(['batch', str(batch)], path=path) == 1
+        assert '1 failed' in capsys.readouterr().err
+
+        # prompting commands must run in calling process
+        assert daemon.forward(['alert-definitions', 'init', str(tmpdir.join('alert.yaml'))], path=path) is None
+        assert daemon.forward(['entities', 'push', '-'], path=path) is None
+
+        # long running commands must run in calling process
+        assert daemon.forward(['status', '--watch'], path=path) is None
+
+        assert daemon.request({'command': 'status'}, path=path)['served'] == 2
+    finally:
+        daemon.request({'command': 'stop'}, path=path)
+        server.join()
+
+    assert not os.path.exists(path)
+    assert daemon.forward(['status'], path=path) is None
+
+
+def test_daemon_output():
+    connection = MagicMock()
+    out = daemon.DaemonOutput(connection, 'stdout')
+
+    out.write('Listing ... ')
+    out.flush()
+    assert not connection.send.called
+
+    out.write('OK\nAlert name: ')
+    connection.send.assert_called_once_with({'stdout': 'Listing ... OK\n'})
+
+    out.send_rest()
+    connection.send.assert_called_with({'stdout': 'Alert name: '})
+
+
+def test_cached_clients(monkeypatch):
+    created = []
+
+    def create_client(config):
+        created.append(MagicMock())
+        return created[-1]
+
+    monkeypatch.setattr('zmon_cli.cmds.command.create_client', create_client)
+
+    config = {'url': 'https://zmon', 'token': 'secret-token'}
+
+    command.enable_cache(60)
+    try:
+        client = command.get_client(config)
+        assert command.get_client(config) is client
+        assert not any('secret-token' in str(key) for key in command._cache)
+
+        # expired client is closed, when replaced
+        for key, (expiry, value) in list(command._cache.items()):
+            command._cache[key] = (0, value)
+
+        assert command.get_client(config) is not client
+        client.close.assert_called_once_with()
+    finally:
+        command.enable_cache(0)
+
+    # cached clients are closed, when cache is disabled
+    assert len(created) == 2
+    created[1].close.assert_called_once_with()
+
+
+def test_batch(monkeypatch):
+    status = MagicMock()
+    status.return_value = {'workers': [{'name': 'foo', 'check_invocations': 12377, 'last_execution_time': 1}]}
+    monkeypatch.setattr('zmon_cli.client.Zmon.status', status)
+
+    add = MagicMock()
+    monkeypatch.setattr('zmon_cli.client.Zmon.add_entity', add)
+
+    get = MagicMock()
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definition', get)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        ops = [
+            {'id': 'status', 'args': ['status']},
+            {'id': 'push', 'args': 'entities push \'{"id": "e-1", "type": "instance"}\''},
+            {'id': 'fail', 'args': ['entities', 'filter', 'type'], 'depends_on': 'push'},
+            {'id': 'alert', 'args': ['alert-definitions', 'get', '1'], 'depends_on': ['fail']},
+        ]
+        with open('batch.ndjson', 'w') as fd:
+            fd.write('\n'.join(json.dumps(op) for op in ops))
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'batch', 'batch.ndjson', '-o', 'json'])
+
+        assert result.exit_code == 1
+
+        results = json.loads(result.output)
+
+        assert [r['id'] for r in results] == ['status', 'push', 'fail', 'alert']
+        assert [r['exit_code'] for r in results] == [0, 0, 1, None]
+
+        assert '12377' in results[0]['output']
+        assert 'e-1' in results[1]['output']
+        assert 'Invalid filters count' in results[2]['output']
+        assert 'Dependency failed: fail' in results[3]['error']
+
+        add.assert_called_once_with({'id': 'e-1', 'type': 'instance'})
+        get.assert_not_called()
+
+
 def test_get_alert_definition(monkeypatch):
     get = MagicMock()
     get.return_value = {
@@ -119,6 +497,51 @@ def test_list_alert_definitions(monkeypatch):
         assert 'Link' in out
 
 
+def test_list_alert_definitions_with_checks(monkeypatch):
+    alerts = MagicMock()
+    alerts.return_value = [
+        {
+            'team': 'ZMON', 'responsible_team': 'ZMON', 'name': 'alert-1', 'id': 1, 'status': 'ACTIVE', 'priority': 1,
+            'last_modified': 1473418659294, 'last_modified_by': 'user-1', 'check_definition_id': 33
+        },
+        {
+            'team': 'ZMON', 'responsible_team': 'ZMON', 'name': 'alert-2', 'id': 2, 'status': 'ACTIVE', 'priority': 2,
+            'last_modified': 1473418659294, 'last_modified_by': 'user-1', 'check_definition_id': 99
+        },
+    ]
+    checks = MagicMock()
+    checks.return_value = [
+        {'id': 33, 'name': 'check-33', 'interval': 60, 'command': 'http("/health").code()', 'owning_team': 'ZMON'},
+    ]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', alerts)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', checks)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'l', '--with-checks', '-o', 'json'],
+                               catch_exceptions=False)
+
+        joined = json.loads(result.output)
+
+        assert joined[0]['check_name'] == 'check-33'
+        assert joined[0]['check_interval'] == 60
+        assert joined[0]['check_command'] == 'http("/health").code()'
+        assert joined[1]['check_name'] is None
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'l', '--with-checks'], catch_exceptions=False)
+
+        assert 'Interval' in result.output
+        assert 'check-33' in result.output
+
+        checks.assert_called_with()
+
+
 def test_filter_alert_definitions(monkeypatch):
     get = MagicMock()
     get.return_value = [
@@ -210,6 +633,125 @@ def test_update_check_definition(monkeypatch):
         assert '/check-definitions/view/7' in result.output
 
 
+def test_apply_check_definitions(monkeypatch):
+    get = MagicMock()
+    get.return_value = [
+        {'id': 1, 'name': 'check-1', 'owning_team': 'ZMON', 'command': 'http().code()', 'last_modified': 1},
+        {'id': 2, 'name': 'check-2', 'owning_team': 'ZMON', 'command': 'http().code()', 'last_modified': 1},
+    ]
+    post = MagicMock()
+    post.side_effect = lambda check, **kwargs: check
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', get)
+    monkeypatch.setattr('zmon_cli.client.Zmon.update_check_definition', post)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': '123'}, fd)
+
+        os.mkdir('checks')
+        checks = [
+            {'id': 1, 'name': 'check-1', 'owning_team': 'ZMON', 'command': 'http().code()\n'},
+            {'id': 2, 'name': 'check-2', 'owning_team': 'ZMON', 'command': 'http().json()'},
+            {'name': 'check-3', 'owning_team': 'ZMON', 'command': 'def x('},
+        ]
+        for check in checks:
+            with open(os.path.join('checks', '{}.yaml'.format(check['name'])), 'w') as fd:
+                yaml.safe_dump(check, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'check', 'apply', 'checks'], catch_exceptions=False)
+
+        assert 'check-3.yaml: Invalid check command: line 1, column' in result.output
+        assert '/check-definitions/view/2' in result.output
+        assert '3 total, 1 unchanged, 1 updated, 1 failed' in result.output
+        assert result.exit_code == 1
+
+        post.assert_called_once()
+        assert post.call_args[0][0]['name'] == 'check-2'
+
+        post.reset_mock()
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'check', 'apply', 'checks', '--dry-run'], catch_exceptions=False)
+
+        assert 'check-2.yaml: changed' in result.output
+        post.assert_not_called()
+
+        # failed updates are not counted as updated
+        os.remove(os.path.join('checks', 'check-3.yaml'))
+        post.side_effect = RuntimeError('update failed')
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'check', 'apply', 'checks'], catch_exceptions=False)
+
+        assert '2 total, 1 unchanged, 0 updated, 1 failed' in result.output
+        assert result.exit_code == 1
+
+
+def test_apply_manifest(monkeypatch):
+    get_checks = MagicMock()
+    get_checks.return_value = [
+        {'id': 1, 'name': 'check-1', 'owning_team': 'ZMON', 'command': 'http().code()', 'last_modified': 1},
+    ]
+    get_alerts = MagicMock()
+    get_alerts.return_value = [
+        {'id': 10, 'name': 'alert-1', 'check_definition_id': 1, 'condition': '>0', 'last_modified': 1},
+    ]
+
+    update_check = MagicMock()
+    update_check.side_effect = lambda check, **kwargs: dict(check, id=check.get('id', 2))
+    create_alert = MagicMock()
+    create_alert.side_effect = lambda alert: dict(alert, id=11)
+    update_alert = MagicMock()
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', get_checks)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', get_alerts)
+    monkeypatch.setattr('zmon_cli.client.Zmon.update_check_definition', update_check)
+    monkeypatch.setattr('zmon_cli.client.Zmon.create_alert_definition', create_alert)
+    monkeypatch.setattr('zmon_cli.client.Zmon.update_alert_definition', update_alert)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    manifest = {
+        'checks': {
+            'existing': {'name': 'check-1', 'owning_team': 'ZMON', 'command': 'http().code()'},
+            'new': {'name': 'check-2', 'owning_team': 'ZMON', 'command': 'http().json()'},
+            'invalid': {'name': 'check-3', 'owning_team': 'ZMON', 'command': 'def x('},
+        },
+        'alerts': [
+            {'name': 'alert-1', 'check_definition_id': 'existing', 'condition': '>0'},
+            {'name': 'alert-2', 'check_definition_id': 'new', 'condition': '>0'},
+            {'name': 'alert-3', 'check_definition_id': 'invalid', 'condition': '>0'},
+        ],
+    }
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': '123', 'user': 'user-1'}, fd)
+
+        with open('manifest.yaml', 'w') as fd:
+            yaml.safe_dump(manifest, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'apply', 'manifest.yaml'], catch_exceptions=False)
+
+        assert 'check:existing: unchanged' in result.output
+        assert 'check:new: created' in result.output
+        assert 'check:invalid: ZMON client error: Invalid check command' in result.output
+        assert 'alert:0: unchanged' in result.output
+        assert 'alert:1: created' in result.output
+        assert 'alert:2: Dependency failed: check:invalid' in result.output
+        assert result.exit_code == 1
+
+        update_check.assert_called_once()
+        update_alert.assert_not_called()
+
+        create_alert.assert_called_once()
+        alert = create_alert.call_args[0][0]
+        assert alert['check_definition_id'] == 2
+        assert alert['last_modified_by'] == 'user-1'
+
+
 def test_get_check_definition(monkeypatch):
     get = MagicMock()
     get.return_value = {
@@ -295,6 +837,93 @@ def test_filter_check_definitions(monkeypatch):
         assert 'check-2' not in out
 
 
+ENTITIES = [
+    {'id': 'i-1', 'type': 'instance', 'application_id': 'app-1', 'ports': [8080, 9090]},
+    {'id': 'i-2', 'type': 'instance', 'application_id': 'app-2', 'ports': [8080]},
+    {'id': 'i-3', 'type': 'instance', 'application_id': 'app-2'},
+    {'id': 'db-1', 'type': 'database'},
+]
+
+
+def test_check_definition_entities(monkeypatch):
+    entities = MagicMock()
+    entities.return_value = ENTITIES
+    checks = MagicMock()
+    checks.return_value = [
+        {'id': 1, 'name': 'check-1', 'entities': [{'type': 'instance'}], 'entities_exclude': [{'id': 'i-3'}]},
+        {'id': 2, 'name': 'check-2', 'entities': [{'type': 'instance', 'ports': '9090'}, {'type': 'database'}]},
+        {'id': 3, 'name': 'check-3', 'entities': [{'type': 'GLOBAL'}]},
+    ]
+    check = MagicMock()
+    check.return_value = checks.return_value[1]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', entities)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', checks)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definition', check)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'check', 'entities', '-o', 'json'], catch_exceptions=False)
+
+        assert [(m['id'], m['matched']) for m in json.loads(result.output)] == [(1, 2), (2, 2), (3, 0)]
+        entities.assert_called_with(models=True)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'check', 'entities', '2', '--ids', '-o', 'json'],
+                               catch_exceptions=False)
+
+        assert json.loads(result.output) == [{'id': 2, 'name': 'check-2', 'matched': 2, 'entities': ['db-1', 'i-1']}]
+        check.assert_called_with(2)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'check', 'entities', '2', '--ids'], catch_exceptions=False)
+
+        assert 'db-1' in result.output
+        assert 'i-2' not in result.output
+
+
+def test_alert_definition_entities(monkeypatch):
+    entities = MagicMock()
+    entities.return_value = ENTITIES
+    alerts = MagicMock()
+    alerts.return_value = [
+        {'id': 10, 'name': 'alert-10', 'check_definition_id': 1, 'entities': []},
+        {'id': 11, 'name': 'alert-11', 'check_definition_id': 1, 'entities': [{'application_id': 'app-2'}]},
+        {'id': 12, 'name': 'alert-12', 'check_definition_id': 1, 'entities_exclude': [{'ports': 8080}]},
+        {'id': 13, 'name': 'alert-13', 'check_definition_id': 99},
+    ]
+    checks = MagicMock()
+    checks.return_value = [
+        {'id': 1, 'name': 'check-1', 'entities': [{'type': 'instance'}]},
+    ]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', entities)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', alerts)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', checks)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'entities', '--ids', '-o', 'json'],
+                               catch_exceptions=False)
+
+        matches = {m['id']: m['entities'] for m in json.loads(result.output)}
+
+        assert matches == {10: ['i-1', 'i-2', 'i-3'], 11: ['i-2', 'i-3'], 12: ['i-3'], 13: []}
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'alert', 'entities'], catch_exceptions=False)
+
+        assert 'alert-11' in result.output
+        assert 'Check ID' in result.output
+
+
 def test_filter_entities(monkeypatch):
     get = MagicMock()
     get.return_value = [
@@ -318,7 +947,371 @@ def test_filter_entities(monkeypatch):
         assert 'e-1' in out
         assert 'app-1' in out
 
-        get.assert_called_with(query={'type': 'instance', 'application_id': 'app-1'})
+        get.assert_called_with(query={'type': 'instance', 'application_id': 'app-1'}, models=True)
+
+
+def test_push_entities_invalid(monkeypatch):
+    add = MagicMock()
+    monkeypatch.setattr('zmon_cli.client.Zmon.add_entity', add)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        entities = json.dumps([{'id': 'e-1', 'type': 'instance'}, {'id': 'e-1', 'type': 'instance'}, {'id': 'E 2'}])
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'push', entities])
+
+        assert result.exit_code == 1
+        assert 'Invalid entity #1 (e-1): Duplicate entity ID' in result.output
+        assert 'Invalid entity #2 (E 2)' in result.output
+        add.assert_not_called()
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'push', '--skip-invalid', entities])
+
+        assert result.exit_code == 0
+        add.assert_called_once_with({'id': 'e-1', 'type': 'instance'})
+
+
+def test_push_entities_stream(monkeypatch):
+    add = MagicMock()
+    monkeypatch.setattr('zmon_cli.client.Zmon.add_entity', add)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+    monkeypatch.setattr('zmon_cli.cmds.entity.PUSH_CHUNK_SIZE', 2)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        with open('entities.yaml', 'w') as fd:
+            fd.write('id: e-1\ntype: instance\n---\n- id: e-2\n  type: instance\n- id: e-3\n  type: instance\n')
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'push', 'entities.yaml'], catch_exceptions=False)
+
+        assert result.exit_code == 0
+        assert sorted(c[0][0]['id'] for c in add.call_args_list) == ['e-1', 'e-2', 'e-3']
+
+        add.reset_mock()
+        ndjson = '\n'.join(json.dumps({'id': 'e-{}'.format(i), 'type': 'instance'}) for i in range(5))
+        ndjson += '\n{"id": "e-0", "type": "instance"}\n{"id": "e-6"'
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'push', '-'], input=gzip.compress(ndjson.encode()))
+
+        assert result.exit_code == 1
+        assert 'Invalid JSON input' in result.output
+        add.assert_not_called()
+
+        # invalid entity in last chunk, all input is validated before pushing
+        ndjson = ndjson.rsplit('\n', 1)[0]
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'push', '-'], input=gzip.compress(ndjson.encode()))
+
+        assert result.exit_code == 1
+        assert 'Invalid entity #5 (e-0): Duplicate entity ID, first seen at #0' in result.output
+        assert 'no entities pushed' in result.output
+        add.assert_not_called()
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'push', '--skip-invalid', '-'], input=ndjson)
+
+        assert result.exit_code == 0
+        assert sorted(c[0][0]['id'] for c in add.call_args_list) == ['e-{}'.format(i) for i in range(5)]
+
+
+@pytest.mark.parametrize('read_size', (1, 3, 64))
+def test_iter_json_spanning_reads(read_size):
+    records = [{'id': 'e-1', 'data': 'a"}]{[\\'}, {'id': 'e-2', 'values': [1.25, -3e2, None, True]}, 12.5, 'x']
+    text = '\n'.join(json.dumps(r) for r in records)
+
+    assert list(iter_json(io.StringIO(text), read_size=read_size)) == records
+    assert list(iter_json(io.StringIO(json.dumps(records)), read_size=read_size)) == records
+
+    with pytest.raises(ZmonArgumentError):
+        list(iter_json(io.StringIO('{"id": "e-1"} {"id": }\n{"id": "e-2"}'), read_size=read_size))
+
+
+def test_render_entities_no_mutation(capsys):
+    entities = [
+        {'id': 'e-1', 'type': 'instance', 'application_id': 'app-1', 'last_modified': '2017-01-01 01:01:01.000'},
+        Entity.from_dict({'id': 'e-2', 'type': 'instance', 'last_modified': '2017-01-01 01:01:02.000'}),
+    ]
+    checks = [{'id': 1, 'name': 'check', 'owning_team': 'team', 'last_modified': 1483232461000}]
+
+    render_entities(entities, 'text')
+    render_checks(checks)
+
+    assert 'application_id=app-1' in capsys.readouterr().out
+    assert 'last_modified' in entities[0] and 'data' not in entities[0]
+    assert entities[1]['last_modified'] == '2017-01-01 01:01:02.000'
+    assert checks == [{'id': 1, 'name': 'check', 'owning_team': 'team', 'last_modified': 1483232461000}]
+
+
+def test_render_entities_iterator(capsys):
+    entities = [
+        {'id': 'e-{}'.format(i), 'type': 'instance', 'last_modified': '2017-01-01 01:01:{:02d}.000'.format(59 - i)}
+        for i in range(60)
+    ]
+
+    render_entities(iter(entities), 'text')
+
+    out = capsys.readouterr().out.splitlines()
+    assert sum(1 for line in out if line.startswith('Id')) == 1
+    assert [line.split()[0] for line in out[1:]] == [e['id'] for e in reversed(entities)]
+
+
+@pytest.mark.parametrize('pretty', (False, True))
+def test_output_json_stream(capsys, pretty):
+    data = [
+        Entity.from_dict({'id': 'e-1', 'type': 'instance', 'ports': [80, {'name': 'http'}], 'note': 'a\nb'}),
+        {'id': 'e-2', 'type': 'instance', 'tags': {}, 'empty': []},
+    ]
+    expected = json.dumps(to_plain(data), indent=4 if pretty else None) + '\n'
+
+    Output('', output='json', pretty_json=pretty).echo(e for e in data)
+    assert capsys.readouterr().out == expected
+
+    Output('', output='json', pretty_json=pretty).echo({'entities': iter(data), 'empty': iter([])})
+    assert capsys.readouterr().out == json.dumps(
+        {'entities': to_plain(data), 'empty': []}, indent=4 if pretty else None) + '\n'
+
+
+def test_list_entities_paged(monkeypatch):
+    pages = MagicMock()
+    pages.side_effect = [
+        ([{'id': 'e-{}'.format(i), 'type': 'instance', 'last_modified': '2017-01-01 01:01:01.000'} for i in range(2)],
+         None),
+        ([{'id': 'e-2', 'type': 'instance', 'last_modified': '2017-01-01 01:01:01.000'}], None),
+    ]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities_page', pages)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': 123}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', '--page-size', '2', '-o', 'json'],
+                               catch_exceptions=False)
+
+        assert [e['id'] for e in json.loads(result.output)] == ['e-0', 'e-1', 'e-2']
+        assert pages.call_count == 2
+
+        entity = {'type': 'instance', 'last_modified': '2017-01-01 01:01:01.000'}
+        pages.side_effect = [([dict(entity, id='e-{}'.format(i)) for i in range(3)], None)]
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities'], catch_exceptions=False)
+
+        assert 'e-2' in result.output
+
+
+def test_get_entity_targets(monkeypatch):
+    def get_entity(self, entity_id):
+        if self.base_url == 'https://zmon-us':
+            resp = requests.Response()
+            resp.status_code = 404
+            raise requests.HTTPError(response=resp)
+        if self.base_url == 'https://zmon-ap':
+            raise requests.ConnectionError('unreachable')
+        return {'id': entity_id, 'type': 'instance'}
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entity', get_entity)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({
+                'url': 'https://zmon-eu',
+                'token': '123',
+                'targets': {
+                    'eu': {'url': 'https://zmon-eu', 'token': '123'},
+                    'us': {'url': 'https://zmon-us', 'token': '456'},
+                    'ap': {'url': 'https://zmon-ap', 'user': 'foo', 'password': 'bar'},
+                    'sa': {'url': 'https://zmon-sa'},
+                }
+            }, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'get', 'e-1', '--targets', 'eu,us,ap'],
+                               catch_exceptions=False)
+
+        assert result.exit_code == 1
+        assert 'target: eu' in result.output
+        assert 'target: us' not in result.output
+        assert 'Target ap failed: unreachable' in result.output
+        assert 'Error: Targets failed: ap' in result.output
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'get', 'e-1', '--targets', 'eu,xx'])
+
+        assert result.exit_code == 2
+        assert 'Unknown targets: xx' in result.output
+
+        # credentials are never inherited
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'entities', 'get', 'e-1', '--targets', 'all'])
+
+        assert result.exit_code == 2
+        assert 'Target "sa" is improperly configured: key "token" or "user" and "password" missing' in result.output
+
+
+def test_export(monkeypatch):
+    checks = MagicMock()
+    checks.return_value = [{'id': 1, 'last_modified': 100}, {'id': 2, 'last_modified': 100}]
+    check = MagicMock()
+    check.side_effect = lambda check_id: {'id': check_id, 'name': 'check-{}'.format(check_id), 'command': 'x ',
+                                          'technical_details': None}
+    alerts = MagicMock()
+    alerts.return_value = []
+    search = MagicMock()
+    search.return_value = {'alerts': [], 'checks': [], 'dashboards': [{'id': 3}], 'grafana_dashboards': []}
+    dashboard = MagicMock()
+    dashboard.return_value = {'id': 3, 'name': 'dash'}
+    entities = MagicMock()
+    entities.return_value = [{'id': 'e-1', 'type': 'instance', 'last_modified': '2017-01-01 01:01:01.000'}]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', checks)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definition', check)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', alerts)
+    monkeypatch.setattr('zmon_cli.client.Zmon.search', search)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_dashboard', dashboard)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', entities)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': '123'}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'export', 'backup'], catch_exceptions=False)
+
+        assert '4 fetched, 0 unchanged' in result.output
+
+        with open(os.path.join('backup', 'check-definitions', '1.yaml')) as fd:
+            assert fd.read() == 'id: 1\nname: check-1\ncommand: |-\n  x\n'
+
+        assert os.path.exists(os.path.join('backup', 'dashboards', '3.yaml'))
+        assert os.path.exists(os.path.join('backup', 'entities', 'e-1.yaml'))
+
+        checks.return_value = [{'id': 1, 'last_modified': 200}]
+        check.reset_mock()
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'export', 'backup', '--incremental'], catch_exceptions=False)
+
+        assert '2 fetched, 1 unchanged, 1 removed' in result.output
+
+        check.assert_called_once_with(1)
+        assert not os.path.exists(os.path.join('backup', 'check-definitions', '2.yaml'))
+
+        # failed fetch keeps previous export
+        checks.return_value = [{'id': 1, 'last_modified': 300}]
+        check.side_effect = requests.HTTPError()
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'export', 'backup', '--incremental'], catch_exceptions=False)
+
+        assert result.exit_code == 1
+        assert '0 removed, 1 failed' in result.output
+        assert os.path.exists(os.path.join('backup', 'check-definitions', '1.yaml'))
+
+        with open(os.path.join('backup', '.zmon-export.json')) as fd:
+            assert json.load(fd)['check-definitions'] == {'1': 200}
+
+        # failed listing
+        checks.side_effect = requests.HTTPError()
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'export', 'backup', '--incremental'], catch_exceptions=False)
+
+        assert result.exit_code == 1
+        assert 'Listing failed' in result.output
+        assert os.path.exists(os.path.join('backup', 'check-definitions', '1.yaml'))
+
+        # full export of one kind keeps manifest of other kinds
+        checks.side_effect = None
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'export', 'backup', '-k', 'dashboards'],
+                               catch_exceptions=False)
+
+        assert '1 fetched, 0 unchanged' in result.output
+
+        with open(os.path.join('backup', '.zmon-export.json')) as fd:
+            manifest = json.load(fd)
+
+        assert manifest['check-definitions'] == {'1': 200}
+        assert list(manifest['dashboards']) == ['3']
+
+
+def test_mirror_entities(monkeypatch):
+    get = MagicMock()
+    get.return_value = [
+        {'id': 'e-1', 'type': 'instance', 'application_id': 'app-1', 'last_modified': '2017-01-01 01:01:01.000'},
+        {'id': 'e-2', 'type': 'instance', 'application_id': 'app-2', 'last_modified': '2017-01-01 01:01:01.000'},
+        {'id': 'e-3', 'type': 'host', 'application_id': 'app-1', 'last_modified': '2017-01-01 01:01:01.000'},
+    ]
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_entities', get)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': '123', 'entity_mirror': 'entities.db'}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'e', 'query', 'type', 'instance'], catch_exceptions=False)
+        assert 'run "zmon entities mirror" first' in result.output
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'mirror', '-i', 'application_id'], catch_exceptions=False)
+        assert '3 added, 0 updated, 0 deleted, 0 unchanged' in result.output
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'query', 'type', 'instance', 'application_id', 'app-1', '-o', 'json'],
+            catch_exceptions=False)
+
+        assert [e['id'] for e in json.loads(result.output)] == ['e-1']
+
+        get.return_value = get.return_value[1:]
+        get.return_value[0] = dict(get.return_value[0], application_id='app-1', last_modified='2018-01-01 01:01:01.000')
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'e', 'mirror'], catch_exceptions=False)
+        assert '0 added, 1 updated, 1 deleted, 1 unchanged' in result.output
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'e', 'query', 'application_id', 'app-1'], catch_exceptions=False)
+
+        assert 'e-1' not in result.output
+        assert 'e-2' in result.output
+        assert 'e-3' in result.output
+
+
+def test_mirror_entities_query_values(tmpdir):
+    with EntityMirror(str(tmpdir.join('entities.db'))) as mirror:
+        mirror.sync([
+            {'id': 'e-1', 'type': 'instance', 'port': 8080, 'enabled': True, 'tags': ['x', 'y'], 'owner': None},
+            {'id': 'e-2', 'type': 'instance', 'port': '8080', 'enabled': False, 'tags': ['y', 1]},
+            {'id': 'e-3', 'type': 'instance', 'port': 80.5, 'tags': 'x', 'meta': {'x': 1}},
+        ])
+
+        def ids(**query):
+            return sorted(e['id'] for e in mirror.query(query))
+
+        for indexed in (False, True):
+            if indexed:
+                mirror.add_indexes(['port', 'enabled', 'tags', 'owner', 'meta'])
+
+            assert ids(port='8080') == ['e-1', 'e-2']
+            assert ids(port=8080) == ['e-1', 'e-2']
+            assert ids(port='80.5') == ['e-3']
+            assert ids(enabled='true') == ['e-1']
+            assert ids(enabled='false') == ['e-2']
+            assert ids(tags='x') == ['e-1', 'e-3']
+            assert ids(tags='1') == ['e-2']
+            assert ids(owner='null') == ['e-1']
+            assert ids(meta='x') == []
+            assert ids(type='instance', tags='y', enabled='true') == ['e-1']
 
 
 def test_search(monkeypatch):
@@ -358,3 +1351,121 @@ def test_search(monkeypatch):
             cli, ['-c', 'test.yaml', 'search', 'eagle'], catch_exceptions=False)
 
         assert 'eagle' in result.output
+
+
+def test_search_offline(monkeypatch):
+    checks = MagicMock()
+    checks.return_value = [
+        {'id': 1, 'name': 'Health check', 'owning_team': 'ZMON', 'command': "http('/health').code()",
+         'last_modified': 1},
+        {'id': 2, 'name': 'Disk usage', 'owning_team': 'FANCY', 'command': 'disk()', 'last_modified': 1},
+    ]
+    alerts = MagicMock()
+    alerts.return_value = [
+        {'id': 3, 'name': 'Disk alert', 'team': 'FANCY', 'condition': '>90', 'last_modified': 1},
+    ]
+    search = MagicMock()
+    search.return_value = {'alerts': [], 'checks': [], 'dashboards': [{'id': 4, 'title': 'Health', 'team': 'ZMON'}],
+                           'grafana_dashboards': []}
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_check_definitions', checks)
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_alert_definitions', alerts)
+    monkeypatch.setattr('zmon_cli.client.Zmon.search', search)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': '123', 'search_index': 'index.json'}, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'search', '--offline', 'health'], catch_exceptions=False)
+        assert 'run "zmon search --refresh-index" first' in result.output
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'search', '--refresh-index'], catch_exceptions=False)
+        assert '4 indexed, 0 removed, 0 unchanged' in result.output
+
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'search', '--offline', 'heal', '-o', 'json'], catch_exceptions=False)
+        data = json.loads(result.output)
+
+        assert [c['id'] for c in data['checks']] == [1]
+        assert [d['id'] for d in data['dashboards']] == [4]
+        assert data['alerts'] == []
+        assert '/check-definitions/view/1' in data['checks'][0]['link']
+
+        # search check commands
+        result = runner.invoke(
+            cli, ['-c', 'test.yaml', 'search', '--offline', 'disk', '-t', 'FANCY', '-o', 'json'],
+            catch_exceptions=False)
+        data = json.loads(result.output)
+
+        assert [c['id'] for c in data['checks']] == [2]
+        assert [a['id'] for a in data['alerts']] == [3]
+
+        checks.return_value = checks.return_value[:1]
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'search', '--refresh-index'], catch_exceptions=False)
+        assert '1 indexed, 1 removed, 2 unchanged' in result.output
+
+        search.assert_called_with('', limit=10000)
+
+
+def test_grafana_sync(monkeypatch):
+    existing = {
+        'unchanged': {'dashboard': {'uid': 'unchanged', 'title': 'A', 'id': 1, 'version': 7, 'schemaVersion': 16},
+                      'meta': {'slug': 'a'}},
+        'changed': {'dashboard': {'uid': 'changed', 'title': 'B', 'id': 2, 'version': 7}, 'meta': {'slug': 'b'}},
+    }
+
+    def get_dashboard(uid):
+        if uid not in existing:
+            resp = MagicMock()
+            resp.status_code = 404
+            raise requests.HTTPError(response=resp)
+        return existing[uid]
+
+    get = MagicMock(side_effect=get_dashboard)
+    post = MagicMock()
+
+    monkeypatch.setattr('zmon_cli.client.Zmon.get_grafana_dashboard', get)
+    monkeypatch.setattr('zmon_cli.client.Zmon.update_grafana_dashboard', post)
+    monkeypatch.setattr('zmon_cli.cmds.command.get_client', get_client)
+
+    runner = CliRunner()
+
+    with runner.isolated_filesystem():
+        with open('test.yaml', 'w') as fd:
+            yaml.dump({'url': 'foo', 'token': '123'}, fd)
+
+        os.mkdir('grafana')
+        dashboards = [
+            {'dashboard': {'uid': 'unchanged', 'title': 'A'}},
+            {'dashboard': {'uid': 'changed', 'title': 'B2', 'version': 7}},
+            {'dashboard': {'uid': 'new', 'title': 'C'}},
+            {'dashboard': {'title': 'D'}},
+        ]
+        for i, dashboard in enumerate(dashboards):
+            with open(os.path.join('grafana', '{}.json'.format(i)), 'w') as fd:
+                json.dump(dashboard, fd)
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'grafana', 'sync', 'grafana'], catch_exceptions=False)
+
+        assert result.exit_code == 1
+        assert '4 total, 1 unchanged, 2 updated, 1 failed' in result.output
+        assert '3.json: Grafana dashboard must have "uid"' in result.output
+        assert '/visualization/dashboard/new' in result.output
+
+        assert sorted(c[0][0]['dashboard']['uid'] for c in post.call_args_list) == ['changed', 'new']
+
+        # failed updates are not counted as updated
+        def update_dashboard(dashboard):
+            if dashboard['dashboard']['uid'] == 'new':
+                raise requests.HTTPError()
+
+        post.side_effect = update_dashboard
+
+        result = runner.invoke(cli, ['-c', 'test.yaml', 'grafana', 'sync', 'grafana'], catch_exceptions=False)
+
+        assert result.exit_code == 1
+        assert '4 total, 1 unchanged, 1 updated, 2 failed' in result.output
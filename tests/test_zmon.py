@@ -1,14 +1,21 @@
+import sys
 import json
+import threading
 
 from datetime import datetime
 from unittest.mock import MagicMock
 
 import pytest
 
-from requests.exceptions import HTTPError
+from opentracing.mocktracer import MockTracer
+
+from requests.exceptions import ConnectionError, HTTPError
 
 import zmon_cli.client as client
-from zmon_cli.client import Zmon, DEFAULT_TIMEOUT
+from zmon_cli.client import Zmon, ZmonError, ZmonCircuitOpenError, DEFAULT_TIMEOUT
+from zmon_cli.breaker import CircuitBreaker
+from zmon_cli.transport import HttpxTransport
+from zmon_cli.models import Entity, to_plain
 
 
 URL = 'https://some-zmon'
@@ -103,6 +110,49 @@ def test_zmon_headers(monkeypatch):
     assert zmon.session.verify is False
 
 
+def test_zmon_transport_unknown(monkeypatch):
+    with pytest.raises(ZmonError):
+        Zmon(URL, token=TOKEN, transport='carrier-pigeon')
+
+
+def test_zmon_transport_httpx_without_h2(monkeypatch, caplog):
+    pytest.importorskip('httpx')
+
+    # import of missing h2 fails
+    monkeypatch.setitem(sys.modules, 'h2', None)
+
+    transport = HttpxTransport()
+    assert 'using HTTP/1.1' in caplog.text
+
+    transport.close()
+
+
+def test_zmon_transport_httpx(monkeypatch):
+    httpx = pytest.importorskip('httpx')
+
+    def handler(request):
+        assert request.headers['Authorization'] == 'Bearer {}'.format(TOKEN)
+
+        if request.url.path.endswith('/entities/missing'):
+            return httpx.Response(404, json={'message': 'not found'})
+        if request.method == 'PUT':
+            return httpx.Response(200, json={'id': json.loads(request.content.decode())['id']})
+        return httpx.Response(200, json={'id': 'e-1', 'type': 'dummy'})
+
+    zmon = Zmon(URL, token=TOKEN)
+    zmon._session = HttpxTransport(headers=zmon.session.headers, transport=httpx.MockTransport(handler))
+
+    assert zmon.get_entity('e-1') == {'id': 'e-1', 'type': 'dummy'}
+
+    assert zmon.add_entity({'id': 'e-2', 'type': 'dummy'}).ok
+
+    with pytest.raises(HTTPError) as ex:
+        zmon.get_entity('missing')
+
+    assert ex.value.response.status_code == 404
+    assert ex.value.response.json() == {'message': 'not found'}
+
+
 def test_zmon_status(monkeypatch):
     get = MagicMock()
     result = {'status': 'success'}
@@ -152,6 +202,340 @@ def test_zmon_get_entity(monkeypatch):
     get.assert_called_with(zmon.endpoint(client.ENTITIES, 1, trailing_slash=False), timeout=DEFAULT_TIMEOUT)
 
 
+def test_zmon_get_entities_models(monkeypatch):
+    result = [
+        {'id': 'e-1', 'type': 'instance', 'application_id': 'app-1'},
+        {'id': 'e-2', 'type': 'instance', 'application_id': 'app-2', 'last_modified': '2017-01-01 01:01:01.000'},
+    ]
+
+    get = MagicMock()
+    get.return_value.json.return_value = [dict(e) for e in result]
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN, models=True)
+
+    res = zmon.get_entities()
+
+    assert [type(e) for e in res] == [Entity, Entity]
+    assert res == result
+    assert res[0].id == 'e-1'
+    assert res[1].attributes == {'application_id': 'app-2'}
+    assert to_plain(res) == result
+
+    # per call override
+    get.return_value.json.return_value = [dict(e) for e in result]
+    assert type(zmon.get_entities(models=False)[0]) is dict
+
+
+def paged_get(entities, paging=True, cursor=False):
+    def get(url, params=None, timeout=None):
+        resp = MagicMock()
+        if not paging:
+            resp.json.return_value = entities
+        elif cursor:
+            offset = int(params.get('cursor', 0))
+            page = entities[offset:offset + params['limit']]
+            next_cursor = str(offset + len(page)) if offset + len(page) < len(entities) else None
+            resp.json.return_value = {'entities': page, 'next_cursor': next_cursor}
+        else:
+            resp.json.return_value = entities[params['offset']:params['offset'] + params['limit']]
+        return resp
+
+    return MagicMock(side_effect=get)
+
+
+@pytest.mark.parametrize('count,paging,cursor,calls', [
+    (5, True, False, 3),
+    (4, True, False, 3),
+    (5, True, True, 3),
+    (3, False, False, 1),
+    (5, False, False, 1),
+    (2, False, False, 3),  # paging ignored, first page returned again, then all entities retrieved
+])
+def test_zmon_iter_entities(monkeypatch, count, paging, cursor, calls):
+    entities = [{'id': 'e-{}'.format(i), 'type': 'instance'} for i in range(count)]
+
+    get = paged_get(entities, paging=paging, cursor=cursor)
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    res = zmon.iter_entities(query={'type': 'instance'}, page_size=2)
+
+    assert list(res) == entities
+    assert get.call_count == calls
+
+    params = get.call_args_list[0][1]['params']
+    assert params == {'query': json.dumps({'type': 'instance'}), 'limit': 2, 'offset': 0}
+
+
+def test_zmon_iter_entities_paging_ignored(monkeypatch):
+    entities = [{'id': 'e-1', 'type': 'instance'}, {'id': 'e-2', 'type': 'instance'}]
+
+    def get(url, params=None, timeout=None):
+        # paging parameters are ignored, and order is not stable
+        entities.reverse()
+        resp = MagicMock()
+        resp.json.return_value = list(entities)
+        return resp
+
+    get = MagicMock(side_effect=get)
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    assert sorted(e['id'] for e in zmon.iter_entities(page_size=2)) == ['e-1', 'e-2']
+    assert get.call_count == 3
+
+    # paging is not tried again
+    assert sorted(e['id'] for e in zmon.iter_entities(page_size=2)) == ['e-1', 'e-2']
+    assert get.call_count == 4
+    assert not get.call_args[1]['params']
+
+
+def test_zmon_iter_entities_offset_ignored(monkeypatch):
+    entities = [{'id': 'e-{}'.format(i), 'type': 'instance'} for i in range(5)]
+
+    def get(url, params=None, timeout=None):
+        # limit is honoured, offset is ignored
+        resp = MagicMock()
+        resp.json.return_value = entities[:params['limit']] if params else entities
+        return resp
+
+    get = MagicMock(side_effect=get)
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    assert list(zmon.iter_entities(page_size=2)) == entities
+    assert get.call_count == 3
+
+
+@pytest.mark.parametrize('count', [1, 2])
+def test_zmon_iter_entities_unsupported_page_size(monkeypatch, count):
+    entities = [{'id': 'e-{}'.format(i), 'type': 'instance'} for i in range(count)]
+
+    def get(url, params=None, timeout=None):
+        resp = MagicMock()
+        if 'limit' in (params or {}):
+            resp.status_code = 400
+            resp.raise_for_status.side_effect = HTTPError(response=resp)
+        resp.json.return_value = entities
+        return resp
+
+    get = MagicMock(side_effect=get)
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+
+    # all entities fit into a single page, no further page is requested
+    assert list(zmon.iter_entities(page_size=2)) == entities
+    assert get.call_count == 2
+
+
+def test_zmon_iter_entities_unsupported(monkeypatch):
+    entities = [{'id': 'e-1', 'type': 'instance'}]
+
+    def get(url, params=None, timeout=None):
+        resp = MagicMock()
+        if 'limit' in (params or {}):
+            resp.status_code = 400
+            resp.raise_for_status.side_effect = HTTPError(response=resp)
+        resp.json.return_value = entities
+        return resp
+
+    monkeypatch.setattr('requests.Session.get', MagicMock(side_effect=get))
+
+    zmon = Zmon(URL, token=TOKEN, models=True)
+
+    res = list(zmon.iter_entities(page_size=2))
+
+    assert res == entities
+    assert type(res[0]) is Entity
+
+
+def test_zmon_circuit_breaker(monkeypatch):
+    now = [0]
+    breaker = CircuitBreaker(failure_threshold=2, open_interval=10, clock=lambda: now[0])
+
+    get = MagicMock()
+    get.side_effect = ConnectionError('down')
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN, circuit_breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            zmon.get_entity(1)
+
+    with pytest.raises(ZmonCircuitOpenError) as e:
+        zmon.get_entity(1)
+
+    assert isinstance(e.value, ZmonError)
+    assert e.value.retry_after == 10
+    assert get.call_count == 2
+
+    host = 'some-zmon'
+    assert zmon.stats()['circuits'][host] == {'state': 'open', 'failures': 2, 'times_opened': 1, 'rejected': 1}
+
+    # failed probe opens the circuit again
+    now[0] = 10
+    get.side_effect = None
+    get.return_value.status_code = 503
+    get.return_value.raise_for_status.side_effect = HTTPError()
+
+    with pytest.raises(HTTPError):
+        zmon.get_entity(1)
+
+    with pytest.raises(ZmonCircuitOpenError):
+        zmon.get_entity(1)
+
+    now[0] = 20
+    get.return_value = MagicMock(status_code=200)
+    get.return_value.json.return_value = {'id': 1}
+
+    assert zmon.get_entity(1) == {'id': 1}
+    assert zmon.get_entity(1) == {'id': 1}
+    assert zmon.stats()['circuits'][host]['state'] == 'closed'
+
+    # any error of a probe opens the circuit again
+    breaker.failure(host)
+    breaker.failure(host)
+    now[0] = 30
+    get.side_effect = ValueError('unexpected')
+
+    with pytest.raises(ValueError):
+        zmon.get_entity(1)
+
+    assert zmon.stats()['circuits'][host]['state'] == 'open'
+
+    # disabled by default
+    zmon = Zmon(URL, token=TOKEN)
+    assert zmon.stats()['circuits'] == {}
+
+    zmon = Zmon(URL, token=TOKEN, circuit_breaker=True)
+    assert zmon.circuit_breaker is not None
+
+
+def test_zmon_hedging(monkeypatch):
+    slow = threading.Event()
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        resp = MagicMock(status_code=200)
+        resp.json.return_value = {'id': len(calls)}
+        if len(calls) == 21:
+            # first request after warm up hangs until the hedge has answered
+            slow.wait(5)
+        return resp
+
+    monkeypatch.setattr('requests.Session.get', MagicMock(side_effect=get))
+
+    zmon = Zmon(URL, token=TOKEN, hedging={'percentile': 50, 'max_extra': 0.1, 'min_samples': 20})
+
+    # no hedging while latencies are observed
+    for _ in range(20):
+        zmon.get_entity(1)
+
+    assert zmon.get_entity(1) == {'id': 22}
+    slow.set()
+
+    stats = zmon.stats()['hedging']
+    assert stats['requests'] == 21
+    assert stats['hedges'] == 1
+    assert stats['hedge_wins'] == 1
+
+    # extra load is capped
+    policy = zmon.hedging
+    policy.requests = 15
+    assert not policy.acquire()
+
+    policy.requests = 30
+    assert policy.acquire()
+
+    zmon.session.close()
+
+
+def test_zmon_deadline(monkeypatch):
+    delete = MagicMock()
+    delete.return_value.text = '1'
+    monkeypatch.setattr('requests.Session.delete', delete)
+
+    zmon = Zmon(URL, token=TOKEN, timeout=20, connect_timeout=2)
+
+    assert zmon.request_timeout() == (2, 20)
+    assert zmon.remaining() is None
+
+    with zmon.deadline(5):
+        connect_timeout, timeout = zmon.request_timeout()
+        assert connect_timeout == 2
+        assert 4 < timeout <= 5
+
+        # nested deadlines can only be shorter
+        with zmon.deadline(60):
+            assert zmon.remaining() <= 5
+
+        with zmon.deadline(0):
+            with pytest.raises(client.ZmonDeadlineExceeded):
+                zmon.delete_entity(1)
+
+        assert zmon.delete_entity(1) is True
+
+    assert zmon.deadline_at is None
+    assert delete.call_count == 1
+    assert delete.call_args[1]['timeout'][1] <= 5
+
+
+def test_zmon_tracing_disabled(monkeypatch):
+    get = MagicMock()
+    get.return_value.json.return_value = {'id': 1}
+    monkeypatch.setattr('requests.Session.get', get)
+
+    zmon = Zmon(URL, token=TOKEN)
+    assert zmon.tracer is None
+
+    start_span = MagicMock()
+    monkeypatch.setattr('opentracing.Tracer.start_span', start_span)
+
+    # caller span is ignored
+    parent_span = MockTracer().start_span('parent')
+    assert zmon.get_entity(1, span=parent_span) == {'id': 1}
+
+    start_span.assert_not_called()
+    assert parent_span.tags == {}
+
+
+@pytest.mark.parametrize('rate,traced', [
+    (1.0, ['get_entity', 'get_entities']),
+    (0, []),
+    ({'get_entity': 0}, ['get_entities']),
+    ({'get_entity': 1, '*': 0}, ['get_entity']),
+])
+def test_zmon_tracing_sampling(monkeypatch, rate, traced):
+    get = MagicMock()
+    get.return_value.json.return_value = {'id': 1}
+    monkeypatch.setattr('requests.Session.get', get)
+
+    tracer = MockTracer()
+    zmon = Zmon(URL, token=TOKEN, tracer=tracer, trace_sample_rate=rate)
+
+    with tracer.start_active_span('parent'):
+        zmon.get_entity(1)
+        zmon.get_entities()
+
+    spans = tracer.finished_spans()
+    assert [s.operation_name for s in spans] == traced + ['parent']
+
+    for span in spans[:-1]:
+        assert span.parent_id == spans[-1].context.span_id
+        assert span.tags['component'] == client.TRACING_COMPONENT
+
+    if 'get_entity' in traced:
+        assert spans[0].tags['entity_id'] == 1
+
+
 @pytest.mark.parametrize('e,result', [
     (
         {'id': '2', 'type': 'dummy', 'date-field': DATE},
@@ -199,7 +583,7 @@ def test_zmon_delete_entity(monkeypatch, result):
 
     assert deleted is (result == '1')
 
-    delete.assert_called_with(zmon.endpoint(client.ENTITIES, 1))
+    delete.assert_called_with(zmon.endpoint(client.ENTITIES, 1), timeout=DEFAULT_TIMEOUT)
 
 
 def test_zmon_get_dashboard(monkeypatch):
@@ -336,6 +720,96 @@ def test_zmon_update_check_defintion(monkeypatch, c, skip, result):
         post.assert_called_with(zmon.endpoint(client.CHECK_DEF), json=c, timeout=DEFAULT_TIMEOUT)
 
 
+def test_zmon_validate_check_command_cached(monkeypatch, tmpdir):
+    path = str(tmpdir.join('cache', 'check-commands.db'))
+    zmon = Zmon(URL, token=TOKEN, check_command_cache=path)
+
+    parse = MagicMock(side_effect=client.ast.parse)
+    monkeypatch.setattr('zmon_cli.client.ast.parse', parse)
+
+    zmon.validate_check_command('http().code()', cache=zmon.check_command_cache)
+    zmon.validate_check_command('http().code()', cache=zmon.check_command_cache)
+
+    with pytest.raises(client.ZmonError):
+        zmon.validate_check_command('def x(', cache=zmon.check_command_cache)
+
+    assert parse.call_count == 2
+
+    # closing the client closes the cache database
+    zmon.close()
+    assert zmon.check_command_cache._db is None
+
+    # persistent cache is shared across clients
+    zmon = Zmon(URL, token=TOKEN, check_command_cache=path)
+    with pytest.raises(client.ZmonError):
+        zmon.validate_check_command('def x(', cache=zmon.check_command_cache)
+
+    assert parse.call_count == 2
+
+
+def test_check_command_cache_prune(tmpdir):
+    path = str(tmpdir.join('check-commands.db'))
+    cache = client.CheckCommandCache(path, max_size=1, max_db_size=2)
+
+    cache.set('a', client.VALID_CHECK_COMMAND)
+    cache.set('b', client.VALID_CHECK_COMMAND)
+
+    # "a" is used more recently than "b"
+    cache.clear()
+    assert cache.get('a') == client.VALID_CHECK_COMMAND
+
+    cache.set('c', client.VALID_CHECK_COMMAND)
+    cache.clear()
+
+    assert set(cache.get_many(['a', 'b', 'c'])) == {'a', 'c'}
+
+
+@pytest.mark.parametrize('min_pool_size', [1, 32])
+def test_zmon_validate_check_commands(min_pool_size):
+    zmon = Zmon(URL, token=TOKEN, check_command_cache=None)
+    zmon.check_command_cache = client.CheckCommandCache()
+
+    results = zmon.validate_check_commands(
+        ['http().code()', 'x = 1\ndef y(', 'http().code()', 'True'], min_pool_size=min_pool_size)
+
+    assert [r.valid for r in results] == [True, False, True, True]
+    assert results[1].lineno == 2
+    assert 'line 2, column' in str(results[1])
+
+
+@pytest.mark.parametrize('min_pool_size', [256, 0])
+@pytest.mark.parametrize('fix_ids', [False, True])
+def test_zmon_validate_entities(min_pool_size, fix_ids):
+    entities = [
+        {'id': 'e-1', 'type': 'dummy', 'date-field': DATE},
+        {'id': 'E 2', 'type': 'dummy'},
+        {'id': 'e-1', 'type': 'dummy'},
+        {'type': 'dummy'},
+        {'id': 'e-3', 'type': 'dummy', 'tags': {'a'}},
+        'e-4',
+    ]
+
+    valid, errors = Zmon.validate_entities(entities, fix_ids=fix_ids, workers=2, min_pool_size=min_pool_size)
+
+    if fix_ids:
+        assert valid == [entities[0], {'id': 'e-2', 'type': 'dummy'}]
+        assert entities[1]['id'] == 'E 2'
+    else:
+        assert valid == [entities[0]]
+
+    assert [(e.index, e.entity_id) for e in errors if e.index != 1] == [(2, 'e-1'), (3, None), (4, 'e-3'), (5, None)]
+    assert 'Duplicate entity ID, first seen at #0' in str(errors[-4])
+    assert 'not JSON serializable' in errors[-2].error
+
+    # streamed in chunks
+    seen = {}
+    Zmon.validate_entities(entities[:1], seen=seen)
+    valid, errors = Zmon.validate_entities(entities[2:3], start=2, seen=seen)
+
+    assert valid == []
+    assert str(errors[0]) == '#2 (e-1): Duplicate entity ID, first seen at #0'
+
+
 @pytest.mark.parametrize('result', [True, False])
 def test_zmon_delete_check_definition(monkeypatch, result):
     delete = MagicMock()
@@ -349,7 +823,7 @@ def test_zmon_delete_check_definition(monkeypatch, result):
 
     assert res.ok is result
 
-    delete.assert_called_with(zmon.endpoint(client.CHECK_DEF, 1))
+    delete.assert_called_with(zmon.endpoint(client.CHECK_DEF, 1), timeout=DEFAULT_TIMEOUT)
 
 
 def test_zmon_get_alert_defintion(monkeypatch):
@@ -483,7 +957,7 @@ def test_zmon_delete_alert_definition(monkeypatch):
 
     assert res == result
 
-    delete.assert_called_with(zmon.endpoint(client.ALERT_DEF, 1))
+    delete.assert_called_with(zmon.endpoint(client.ALERT_DEF, 1), timeout=DEFAULT_TIMEOUT)
 
 
 def test_zmon_alert_data(monkeypatch):
@@ -619,7 +1093,7 @@ def test_zmon_update_grafana_dashboard(monkeypatch, g, result):
         check = zmon.update_grafana_dashboard(g)
         assert check == result
 
-        post.assert_called_with(zmon.endpoint(client.GRAFANA), json=json.dumps(g), timeout=DEFAULT_TIMEOUT)
+        post.assert_called_with(zmon.endpoint(client.GRAFANA), data=json.dumps(g), timeout=DEFAULT_TIMEOUT)
 
 
 @pytest.mark.parametrize('d,result', [
@@ -709,7 +1183,7 @@ def test_zmon_switch_active_user(monkeypatch, success):
         switched = zmon.switch_active_user('g', 'u')
         assert switched is True
 
-    delete.assert_called_with(zmon.endpoint(client.GROUPS, 'g', 'active'))
+    delete.assert_called_with(zmon.endpoint(client.GROUPS, 'g', 'active'), timeout=DEFAULT_TIMEOUT)
     if del_success:
         put.assert_called_with(zmon.endpoint(client.GROUPS, 'g', 'active', 'u'), timeout=DEFAULT_TIMEOUT)
 
@@ -741,7 +1215,7 @@ def test_zmon_remove_member(monkeypatch):
 
     assert deleted is True
 
-    delete.assert_called_with(zmon.endpoint(client.GROUPS, 'group', client.MEMBER, 'user1'))
+    delete.assert_called_with(zmon.endpoint(client.GROUPS, 'group', client.MEMBER, 'user1'), timeout=DEFAULT_TIMEOUT)
 
 
 def test_zmon_add_phone(monkeypatch):
@@ -772,7 +1246,8 @@ def test_zmon_remove_phone(monkeypatch):
 
     assert deleted is True
 
-    delete.assert_called_with(zmon.endpoint(client.GROUPS, 'user1@something', client.PHONE, '12345'))
+    delete.assert_called_with(
+        zmon.endpoint(client.GROUPS, 'user1@something', client.PHONE, '12345'), timeout=DEFAULT_TIMEOUT)
 
 
 def test_zmon_set_name(monkeypatch):
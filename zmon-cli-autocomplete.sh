@@ -14,7 +14,7 @@ _zmon() {
     }
 
     # options that we can complete
-    opts="--config-file -v --verbose -V --version -h --help alert-definitions check-definitions entities groups help members status"
+    opts="--config-file -v --verbose -V --version -h --help alert-definitions check-definitions completion dashboard entities groups help members search status"
 
     if [ $prev == $command ]; then
         if [[ ${cur} == [a-zA-Z]* ]] || [[ ${cur} == -* ]]; then
@@ -24,12 +24,15 @@ _zmon() {
     fi
 
     case "${prev}" in
-        alert-definitions|check-definitions|entities|groups|members)
+        alert-definitions|check-definitions|completion|dashboard|entities|groups|members)
             local cmd_defs=$(_get_zmon_cmd $command $prev)
             COMPREPLY=($(compgen -W "${cmd_defs}" -- ${cur})) 
             return 0
             ;;
         *)
+            # check, alert, dashboard and entity IDs and team names, from local completion cache (no network)
+            COMPREPLY=($(${command} __complete ${COMP_CWORD} "${COMP_WORDS[@]}" 2>/dev/null))
+            return 0
             ;;
     esac
 }
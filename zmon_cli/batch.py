@@ -0,0 +1,193 @@
+import io
+import sys
+import json
+import shlex
+import logging
+import threading
+
+import yaml
+import click
+import requests
+
+from zmon_cli.bulk import DEFAULT_CONCURRENCY, run_graph
+from zmon_cli.client import ZmonArgumentError
+from zmon_cli.output import log_http_exception
+
+
+# commands which cannot run as batch operations
+UNSUPPORTED_COMMANDS = ('batch', 'configure', 'daemon')
+
+logger = logging.getLogger(__name__)
+
+
+class OperationFailed(Exception):
+    """Batch operation exited with non-zero exit code."""
+
+    def __init__(self, result):
+        super().__init__('exit code {}'.format(result['exit_code']))
+        self.result = result
+
+
+class ThreadLocalStream:
+    """Stream proxy writing to a per-thread buffer, if one is set, otherwise to the wrapped stream."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self, buffer):
+        self._local.buffer = buffer
+
+    def __getattr__(self, name):
+        return getattr(getattr(self._local, 'buffer', None) or self._stream, name)
+
+
+def parse_operation(op, index) -> dict:
+    """
+    Parse a single batch operation.
+
+    An operation is either a command line string, a list of arguments, or a dict with ``args`` and optional ``id``
+    and ``depends_on``.
+
+    >>> parse_operation('entities push "{\\\\"id\\\\": \\\\"e-1\\\\"}"', 0)
+    {'id': '0', 'args': ['entities', 'push', '{"id": "e-1"}'], 'depends_on': []}
+    """
+    if not isinstance(op, dict):
+        op = {'args': op}
+
+    args = op.get('args')
+    if isinstance(args, str):
+        args = shlex.split(args)
+
+    if not args or not isinstance(args, list):
+        raise ZmonArgumentError('Invalid batch operation #{}: "args" is missing'.format(index))
+
+    if '-' in args:
+        raise ZmonArgumentError('Invalid batch operation #{}: reading stdin is not supported'.format(index))
+
+    depends_on = op.get('depends_on') or []
+    if not isinstance(depends_on, list):
+        depends_on = [depends_on]
+
+    return {
+        'id': str(op.get('id', index)),
+        'args': [str(a) for a in args],
+        'depends_on': [str(d) for d in depends_on],
+    }
+
+
+def parse_operations(data) -> list:
+    """
+    Parse batch operations from YAML (a list, or a mapping with ``operations`` list) or NDJSON.
+
+    >>> [op['args'] for op in parse_operations('{"args": ["status"]}\\n["search", "foo"]\\n')]
+    [['status'], ['search', 'foo']]
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+
+    try:
+        ops = yaml.safe_load(data)
+    except yaml.YAMLError:
+        ops = None
+
+    if isinstance(ops, dict) and 'operations' in ops:
+        ops = ops['operations']
+
+    if not isinstance(ops, list):
+        try:
+            ops = [json.loads(line) for line in data.splitlines() if line.strip()]
+        except ValueError as e:
+            raise ZmonArgumentError('Invalid batch file: {}'.format(e))
+
+    operations = [parse_operation(op, i) for i, op in enumerate(ops)]
+
+    ids = [op['id'] for op in operations]
+    duplicates = sorted(set(i for i in ids if ids.count(i) > 1))
+    if duplicates:
+        raise ZmonArgumentError('Invalid batch file: duplicate operation IDs: {}'.format(', '.join(duplicates)))
+
+    return operations
+
+
+def run_operation(cli, obj, args, color=None) -> dict:
+    """
+    Run a single CLI subcommand with shared context object.
+
+    :return: Operation result with ``exit_code`` and captured ``output``.
+    :rtype: dict
+    """
+    exit_code = 0
+
+    parent = click.Context(cli, info_name='zmon', obj=obj, color=color)
+    try:
+        with parent:
+            cmd_name, cmd, rest = cli.resolve_command(parent, list(args))
+            if cmd.name in UNSUPPORTED_COMMANDS:
+                raise click.UsageError('Command not supported in batch: {}'.format(cmd.name))
+
+            with cmd.make_context(cmd_name, rest, parent=parent) as ctx:
+                cmd.invoke(ctx)
+    except click.ClickException as e:
+        e.show()
+        exit_code = e.exit_code
+    except click.Abort:
+        click.echo('Aborted!', err=True)
+        exit_code = 1
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except requests.HTTPError as e:
+        log_http_exception(e)
+        exit_code = 1
+    except Exception as e:
+        logger.debug('Batch operation {} failed'.format(args), exc_info=True)
+        click.echo('Error: {}'.format(e), err=True)
+        exit_code = 1
+
+    return {'exit_code': exit_code}
+
+
+def run_batch(cli, obj, operations, concurrency=DEFAULT_CONCURRENCY, color=None) -> list:
+    """
+    Run batch operations. Independent operations run concurrently, each with its own captured output.
+
+    :return: List of operation results, in the same order as ``operations``. Each result has ``id``, ``args``,
+             ``exit_code``, ``output`` and ``error``.
+    :rtype: list
+    """
+    stdout, stderr = ThreadLocalStream(sys.stdout), ThreadLocalStream(sys.stderr)
+
+    def _task(op):
+        def _run(deps):
+            buffer = io.StringIO()
+            stdout.capture(buffer)
+            stderr.capture(buffer)
+            try:
+                result = run_operation(cli, obj, op['args'], color=color)
+            finally:
+                stdout.capture(None)
+                stderr.capture(None)
+
+            result.update(id=op['id'], args=op['args'], output=buffer.getvalue(), error=None)
+            if result['exit_code']:
+                raise OperationFailed(result)
+            return result
+
+        return _run, op['depends_on']
+
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        results = run_graph({op['id']: _task(op) for op in operations}, concurrency=concurrency)
+    finally:
+        sys.stdout, sys.stderr = stdout._stream, stderr._stream
+
+    ordered = []
+    for op in operations:
+        result, e = results[op['id']]
+        if isinstance(e, OperationFailed):
+            result = e.result
+        elif e is not None:
+            result = {'id': op['id'], 'args': op['args'], 'exit_code': None, 'output': '', 'error': str(e)}
+        ordered.append(result)
+
+    return ordered
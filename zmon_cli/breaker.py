@@ -0,0 +1,134 @@
+"""
+Per-host circuit breaker, so the client fails fast while the ZMON backend is down.
+
+A circuit is *closed* as long as requests succeed. After ``failure_threshold`` consecutive failures it *opens*, and
+requests are rejected without being sent. After ``open_interval`` seconds it is *half-open*: up to
+``half_open_probes`` requests are let through as probes. A successful probe closes the circuit, a failed one opens it
+again.
+"""
+import time
+import threading
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_OPEN_INTERVAL = 30
+DEFAULT_HALF_OPEN_PROBES = 1
+
+
+class Circuit:
+    """Circuit state of a single host."""
+
+    __slots__ = ('state', 'failures', 'opened_at', 'probes', 'times_opened', 'rejected')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected,
+        }
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker keeping a circuit per host. Thread-safe.
+
+    >>> breaker = CircuitBreaker(failure_threshold=2, open_interval=60)
+    >>> breaker.failure('zmon'); breaker.failure('zmon')
+    >>> breaker.allow('zmon')
+    False
+    >>> breaker.stats()['zmon']['state']
+    'open'
+
+    :param failure_threshold: Consecutive failures opening the circuit.
+    :type failure_threshold: int
+
+    :param open_interval: Seconds to reject requests, before probing the host again.
+    :type open_interval: float
+
+    :param half_open_probes: Concurrent probe requests while half-open.
+    :type half_open_probes: int
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, open_interval=DEFAULT_OPEN_INTERVAL,
+                 half_open_probes=DEFAULT_HALF_OPEN_PROBES, clock=time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_interval = open_interval
+        self.half_open_probes = max(1, half_open_probes)
+
+        self._clock = clock
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _circuit(self, host) -> Circuit:
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = self._circuits[host] = Circuit()
+        return circuit
+
+    def allow(self, host) -> bool:
+        """Return whether a request to ``host`` may be sent. Requests let through while half-open are probes."""
+        with self._lock:
+            circuit = self._circuit(host)
+
+            if circuit.state == OPEN and self._clock() - circuit.opened_at >= self.open_interval:
+                circuit.state = HALF_OPEN
+                circuit.probes = 0
+
+            if circuit.state == CLOSED:
+                return True
+
+            if circuit.state == HALF_OPEN and circuit.probes < self.half_open_probes:
+                circuit.probes += 1
+                return True
+
+            circuit.rejected += 1
+            return False
+
+    def retry_after(self, host) -> float:
+        """Seconds until the circuit of ``host`` is probed again."""
+        with self._lock:
+            circuit = self._circuit(host)
+            if circuit.state != OPEN:
+                return 0
+            return max(0, self.open_interval - (self._clock() - circuit.opened_at))
+
+    def success(self, host):
+        with self._lock:
+            circuit = self._circuit(host)
+            circuit.state = CLOSED
+            circuit.failures = 0
+            circuit.probes = 0
+
+    def failure(self, host):
+        with self._lock:
+            circuit = self._circuit(host)
+            circuit.failures += 1
+
+            if circuit.state == HALF_OPEN or circuit.failures >= self.failure_threshold:
+                if circuit.state != OPEN:
+                    circuit.times_opened += 1
+                circuit.state = OPEN
+                circuit.opened_at = self._clock()
+                circuit.probes = 0
+
+    def state(self, host) -> str:
+        with self._lock:
+            return self._circuit(host).state
+
+    def stats(self) -> dict:
+        """Circuit state and counters per host."""
+        with self._lock:
+            return {host: circuit.stats() for host, circuit in self._circuits.items()}
@@ -0,0 +1,238 @@
+import os
+import json
+import hashlib
+import itertools
+import logging
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import yaml
+
+from zmon_cli.client import JSONDateEncoder
+from zmon_cli.output import LITERAL_FIELDS, remove_trailing_whitespace
+
+
+DEFAULT_CONCURRENCY = 8
+
+# quick-search limit, when used to list all (grafana) dashboards
+DEFAULT_LISTING_LIMIT = 10000
+
+DEFINITION_FILE_EXTENSIONS = ('.yaml', '.yml')
+
+# fields maintained by ZMON backend, which should never trigger an update
+VOLATILE_FIELDS = set(['last_modified', 'last_modified_by'])
+
+logger = logging.getLogger(__name__)
+
+
+def find_definition_files(directory, extensions=DEFINITION_FILE_EXTENSIONS) -> list:
+    """Return sorted list of definition files under ``directory`` (recursive)."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for fn in sorted(files):
+            if fn.endswith(extensions):
+                paths.append(os.path.join(root, fn))
+
+    return paths
+
+
+def load_yaml_file(path):
+    with open(path, 'rb') as fd:
+        return yaml.safe_load(fd)
+
+
+def run_concurrently(fn, items, concurrency=DEFAULT_CONCURRENCY) -> list:
+    """
+    Call ``fn`` for every item using a bounded thread pool.
+
+    :return: List of ``(item, result, exception)`` tuples, in the same order as ``items``.
+    :rtype: list
+    """
+    items = list(items)
+
+    def _call(item):
+        try:
+            return item, fn(item), None
+        except Exception as e:
+            logger.debug('Concurrent call failed for {}: {}'.format(item, e))
+            return item, None, e
+
+    if not items:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as executor:
+        return list(executor.map(_call, items))
+
+
+def call_concurrently(*fns, concurrency=DEFAULT_CONCURRENCY) -> list:
+    """
+    Call functions concurrently, e.g. independent API requests.
+
+    >>> call_concurrently(lambda: 1, lambda: 2)
+    [1, 2]
+
+    :return: List of results, in the same order as ``fns``. The first exception is raised, after all calls are done.
+    :rtype: list
+    """
+    results = run_concurrently(lambda fn: fn(), fns, concurrency=concurrency)
+
+    for _, _, e in results:
+        if e is not None:
+            raise e
+
+    return [result for _, result, _ in results]
+
+
+def chunked(items, size):
+    """
+    Split iterable into lists of ``size`` items, consuming it lazily.
+
+    >>> list(chunked(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def hash_join(left, right, left_key, right_key='id', fields=(), prefix='') -> list:
+    """
+    Join ``right`` items into copies of ``left`` items, matching ``left_key`` to ``right_key``. The joined ``fields``
+    are added with ``prefix``, and are ``None`` for unmatched items.
+
+    >>> hash_join([{'id': 1, 'check_id': 7}, {'id': 2, 'check_id': 8}], [{'id': 7, 'name': 'c'}], 'check_id',
+    ...           fields=['name'], prefix='check_')
+    [{'id': 1, 'check_id': 7, 'check_name': 'c'}, {'id': 2, 'check_id': 8, 'check_name': None}]
+    """
+    index = {item[right_key]: item for item in right}
+
+    joined = []
+    for item in left:
+        match = index.get(item.get(left_key), {})
+
+        row = dict(item)
+        for field in fields:
+            row[prefix + field] = match.get(field)
+        joined.append(row)
+
+    return joined
+
+
+class DependencyError(Exception):
+    """A task was not executed, because one of its dependencies failed or could not be resolved."""
+    pass
+
+
+def run_graph(tasks: dict, concurrency=DEFAULT_CONCURRENCY) -> dict:
+    """
+    Run dependent tasks using a bounded thread pool. Independent tasks run concurrently, and a task is started as
+    soon as all of its dependencies succeeded.
+
+    :param tasks: Dict of task key to ``(fn, dependencies)``. ``fn`` is called with a dict of dependency results.
+    :type tasks: dict
+
+    :return: Dict of task key to ``(result, exception)``.
+    :rtype: dict
+
+    >>> results = run_graph({'a': (lambda r: 1, []), 'b': (lambda r: r['a'] + 1, ['a']), 'c': (lambda r: 0, ['x'])})
+    >>> results['b']
+    (2, None)
+    >>> results['c'][1]
+    DependencyError('Unknown dependency: x')
+    """
+    results = {}
+    pending = dict(tasks)
+    running = {}
+
+    def _fail(key, e):
+        results[key] = (None, e)
+        pending.pop(key, None)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        while pending or running:
+            for key, (fn, deps) in list(pending.items()):
+                unknown = [d for d in deps if d not in tasks]
+                if unknown:
+                    _fail(key, DependencyError('Unknown dependency: {}'.format(', '.join(map(str, unknown)))))
+                    continue
+
+                failed = [d for d in deps if d in results and results[d][1] is not None]
+                if failed:
+                    _fail(key, DependencyError('Dependency failed: {}'.format(', '.join(map(str, failed)))))
+                    continue
+
+                if all(d in results for d in deps):
+                    del pending[key]
+                    running[executor.submit(fn, {d: results[d][0] for d in deps})] = key
+
+            if not running:
+                # remaining tasks can never become ready
+                for key in list(pending):
+                    _fail(key, DependencyError('Dependency cycle'))
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                key = running.pop(f)
+                try:
+                    results[key] = (f.result(), None)
+                except Exception as e:
+                    logger.debug('Task {} failed: {}'.format(key, e))
+                    results[key] = (None, e)
+
+    return results
+
+
+def normalize_definition(definition: dict, exclude=VOLATILE_FIELDS) -> dict:
+    """
+    Return a normalized copy of a definition, suitable for content comparison.
+
+    >>> normalize_definition({'id': 1, 'last_modified': 2, 'command': 'x  \\n', 'foo': None})
+    {'command': 'x', 'id': 1}
+    """
+    normalized = {}
+    for k, v in definition.items():
+        if k in exclude or v is None:
+            continue
+        if k in LITERAL_FIELDS and isinstance(v, str):
+            # ``dump_yaml`` strips trailing whitespace, so a round-tripped definition must still compare equal
+            v = remove_trailing_whitespace(v)
+        normalized[k] = v
+
+    return dict(sorted(normalized.items()))
+
+
+def content_hash(definition: dict, exclude=VOLATILE_FIELDS) -> str:
+    """
+    Return content hash of normalized definition.
+
+    >>> content_hash({'a': 1, 'b': None}) == content_hash({'a': 1, 'last_modified': 3})
+    True
+    """
+    normalized = normalize_definition(definition, exclude=exclude)
+    data = json.dumps(normalized, sort_keys=True, separators=(',', ':'), cls=JSONDateEncoder)
+
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def is_changed(local: dict, remote: dict, exclude=VOLATILE_FIELDS) -> bool:
+    """
+    Compare local definition against its remote counterpart.
+
+    Only attributes present in the local definition are compared, as the backend may add extra attributes.
+
+    >>> is_changed({'id': 1, 'name': 'a'}, {'id': 1, 'name': 'a', 'last_modified': 1, 'extra': 'x'})
+    False
+    >>> is_changed({'id': 1, 'name': 'b'}, {'id': 1, 'name': 'a'})
+    True
+    """
+    if remote is None:
+        return True
+
+    remote = {k: remote.get(k) for k in local}
+
+    return content_hash(local, exclude=exclude) != content_hash(remote, exclude=exclude)
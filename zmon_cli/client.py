@@ -1,25 +1,44 @@
+import os
 import ast
+import sys
 import logging
 import json
+import random
+import time
+import hashlib
+import sqlite3
+import contextlib
 import functools
 import re
+import threading
 import traceback
 
 import requests
 
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from urllib.parse import urljoin, urlsplit, urlunsplit, SplitResult
 
-from opentracing_utils import trace, extract_span_from_kwargs
+import opentracing
+
+from opentracing.ext import tags as opentracing_tags
+from opentracing_utils import extract_span_from_kwargs
 
 from zmon_cli import __version__
 from zmon_cli.config import DEFAULT_TIMEOUT
+from zmon_cli.transport import TransportError, create_transport
+from zmon_cli.breaker import CircuitBreaker
+from zmon_cli.hedging import HedgingPolicy, hedged_call
+from zmon_cli.models import Entity, CheckDefinition, AlertDefinition
 
 
 API_VERSION = 'v1'
 
 ZMON_USER_AGENT = 'zmon-client/{}'.format(__version__)
 
+TRACING_COMPONENT = 'zmon-client'
+
 ACTIVE_ALERT_DEF = 'checks/all-active-alert-definitions'
 ACTIVE_CHECK_DEF = 'checks/all-active-check-definitions'
 ALERT_DATA = 'status/alert'
@@ -42,6 +61,15 @@ DASHBOARD_VIEW_URL = '#/dashboards/views/'
 GRAFANA_DASHBOARD_URL = 'visualization/dashboard/'
 TOKEN_LOGIN_URL = 'tv/'
 
+# entities per page of Zmon.iter_entities
+DEFAULT_PAGE_SIZE = 1000
+
+# threads sending hedged GET requests (two per request at most)
+HEDGING_WORKERS = 128
+
+# next page cursor, if entity API responds with {"entities": [...], "next_cursor": "..."}
+NEXT_CURSOR = 'next_cursor'
+
 logger = logging.getLogger(__name__)
 
 parentheses_re = re.compile('[(]+|[)]+')
@@ -65,6 +93,20 @@ class ZmonArgumentError(ZmonError):
     pass
 
 
+class ZmonDeadlineExceeded(ZmonError):
+    """A ZMON client error indicating that a request was not sent, because the client deadline expired."""
+    pass
+
+
+class ZmonCircuitOpenError(ZmonError):
+    """A ZMON client error indicating that a request was not sent, because the backend failed repeatedly."""
+
+    def __init__(self, host, retry_after=0):
+        super().__init__('Circuit open for {} after repeated failures, retry in {:.0f} sec'.format(host, retry_after))
+        self.host = host
+        self.retry_after = retry_after
+
+
 def logged(f):
     @functools.wraps(f)
     def wrapper(*args, **kwargs):
@@ -77,6 +119,64 @@ def logged(f):
     return wrapper
 
 
+# passed to traced methods if the call is not traced: all span operations are no-ops
+NOOP_SPAN = opentracing.Tracer().start_span()
+
+SPAN_ARG_NAME = 'span'
+
+
+def pop_span(kwargs):
+    """Remove and return span passed by the caller in ``kwargs``, if any."""
+    for k, v in list(kwargs.items()):
+        if isinstance(v, opentracing.Span):
+            return kwargs.pop(k)
+
+
+def traced(pass_span=False):
+    """
+    Trace and log (on failure) a ``Zmon`` method.
+
+    Tracing is resolved by the client once (see ``Zmon.trace_sampled``). Untraced calls get no span (or the noop span
+    if ``pass_span`` is set), so they cost no more than a direct call.
+    """
+    def decorator(f):
+        operation_name = f.__name__
+
+        @functools.wraps(f)
+        def wrapper(self, *args, **kwargs):
+            if self._tracer is None or not self.trace_sampled(operation_name):
+                if kwargs:
+                    pop_span(kwargs)
+                if pass_span:
+                    kwargs[SPAN_ARG_NAME] = NOOP_SPAN
+                try:
+                    return f(self, *args, **kwargs)
+                except Exception:
+                    logger.error('ZMON client failed in: {}'.format(operation_name))
+                    raise
+
+            parent_span = pop_span(kwargs) or getattr(self._tracer, 'active_span', None)
+
+            span = self._tracer.start_span(operation_name=operation_name, child_of=parent_span)
+            span.set_tag(opentracing_tags.COMPONENT, TRACING_COMPONENT)
+            if pass_span:
+                kwargs[SPAN_ARG_NAME] = span
+
+            try:
+                return f(self, *args, **kwargs)
+            except Exception as e:
+                logger.error('ZMON client failed in: {}'.format(operation_name))
+                span.set_tag('error', True)
+                span.log_kv({'exception': str(e)})
+                raise
+            finally:
+                span.finish()
+
+        return wrapper
+
+    return decorator
+
+
 def compare_entities(e1, e2):
     try:
         e1_copy = e1.copy()
@@ -97,6 +197,287 @@ def get_valid_entity_id(e):
     return invalid_entity_id_re.sub('-', parentheses_re.sub(lambda m: '[' if '(' in m.group() else ']', e.lower()))
 
 
+class EntityCheckResult(namedtuple('EntityCheckResult', 'error entity_id')):
+    """Entity pre-flight check result, with the (possibly fixed) entity ID. ``error`` is ``None`` for a valid entity."""
+    __slots__ = ()
+
+
+class EntityValidationError(namedtuple('EntityValidationError', 'index entity_id error')):
+    """Invalid entity at position ``index`` of the validated entities."""
+    __slots__ = ()
+
+    def __str__(self):
+        return '#{} ({}): {}'.format(self.index, self.entity_id, self.error)
+
+
+def check_entity(entity, fix_id=False) -> EntityCheckResult:
+    """
+    Check entity without any network I/O: required fields, valid ID and JSON serialization.
+
+    >>> check_entity({'id': 'My Entity', 'type': 'instance'}, fix_id=True)
+    EntityCheckResult(error=None, entity_id='my-entity')
+    """
+    if not isinstance(entity, dict):
+        return EntityCheckResult('Entity must be an object', None)
+
+    entity_id = entity.get('id')
+    if entity_id is None or 'type' not in entity:
+        return EntityCheckResult('Entity "id" and "type" are required.', entity_id)
+
+    if not isinstance(entity_id, str):
+        return EntityCheckResult('Entity ID must be a string.', entity_id)
+
+    if invalid_entity_id_re.search(entity_id) is not None:
+        if not fix_id:
+            return EntityCheckResult('Invalid entity ID.', entity_id)
+        entity_id = get_valid_entity_id(entity_id)
+
+    try:
+        json.dumps(entity, cls=JSONDateEncoder)
+    except (TypeError, ValueError) as e:
+        return EntityCheckResult('Entity is not JSON serializable: {}'.format(e), entity_id)
+
+    return EntityCheckResult(None, entity_id)
+
+
+class CheckCommandResult(namedtuple('CheckCommandResult', 'error lineno offset')):
+    """Check command validation result. ``error`` is ``None`` for a valid check command."""
+    __slots__ = ()
+
+    @property
+    def valid(self):
+        return self.error is None
+
+    def __str__(self):
+        if self.valid:
+            return 'OK'
+        if self.lineno is not None:
+            return 'line {}, column {}: {}'.format(self.lineno, self.offset, self.error)
+        return self.error
+
+
+VALID_CHECK_COMMAND = CheckCommandResult(None, None, None)
+
+
+def check_command_key(src: str) -> str:
+    # syntax validity depends on the python version!
+    data = '{}.{}\0{}'.format(sys.version_info[0], sys.version_info[1], src)
+    return hashlib.sha256(data.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def compile_check_command(src: str) -> CheckCommandResult:
+    try:
+        ast.parse(src)
+    except SyntaxError as e:
+        return CheckCommandResult(str(e), e.lineno, e.offset)
+    except Exception as e:
+        return CheckCommandResult(str(e), None, None)
+
+    return VALID_CHECK_COMMAND
+
+
+class CheckCommandCache:
+    """
+    Cache of check command validation results keyed by content hash of the check command.
+
+    Results are kept in memory, and additionally persisted in a SQLite database if ``path`` is set.
+
+    :param path: Path of persistent cache database. Default is ``None`` (in-memory only).
+    :type path: str
+
+    :param max_size: Maximum number of in-memory cached results.
+    :type max_size: int
+
+    :param max_db_size: Maximum number of persisted results. Least recently used results are pruned on insert.
+    :type max_db_size: int
+    """
+
+    def __init__(self, path=None, max_size=4096, max_db_size=100000):
+        self.path = path
+        self.max_size = max_size
+        self.max_db_size = max_db_size
+
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        if self._db is None and self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                self._db.execute('CREATE TABLE IF NOT EXISTS check_commands (key TEXT PRIMARY KEY, result TEXT)')
+
+                # last use, added to caches created by earlier versions
+                columns = [row[1] for row in self._db.execute('PRAGMA table_info(check_commands)')]
+                if 'used' not in columns:
+                    with self._db:
+                        self._db.execute('ALTER TABLE check_commands ADD COLUMN used REAL NOT NULL DEFAULT 0')
+                        self._db.execute('CREATE INDEX IF NOT EXISTS idx_check_commands_used ON check_commands (used)')
+            except Exception:
+                logger.warning('Failed to open check command cache: {}'.format(self.path), exc_info=True)
+                self.path = None
+                self._db = None
+
+        return self._db
+
+    def _remember(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        if len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def get_many(self, keys) -> dict:
+        """Return dict of cached results for ``keys``. Missing keys are not included."""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._results:
+                    found[key] = self._results[key]
+                    self._results.move_to_end(key)
+                else:
+                    missing.append(key)
+
+            db = self._connect() if missing else None
+            if db is not None:
+                try:
+                    used = []
+                    for key in missing:
+                        row = db.execute('SELECT result FROM check_commands WHERE key = ?', (key,)).fetchone()
+                        if row:
+                            found[key] = CheckCommandResult(*json.loads(row[0]))
+                            self._remember(key, found[key])
+                            used.append(key)
+
+                    if used:
+                        now = time.time()
+                        with db:
+                            db.executemany('UPDATE check_commands SET used = ? WHERE key = ?', [(now, k) for k in used])
+                except sqlite3.Error:
+                    logger.warning('Failed to read check command cache', exc_info=True)
+
+        return found
+
+    def set_many(self, results: dict):
+        """Store validation results, keyed by :func:`check_command_key`."""
+        with self._lock:
+            for key, result in results.items():
+                self._remember(key, result)
+
+            db = self._connect()
+            if db is not None and results:
+                try:
+                    now = time.time()
+                    with db:
+                        db.executemany('INSERT OR REPLACE INTO check_commands (key, result, used) VALUES (?, ?, ?)',
+                                       [(k, json.dumps(list(r)), now) for k, r in results.items()])
+                        self._prune(db)
+                except sqlite3.Error:
+                    logger.warning('Failed to write check command cache', exc_info=True)
+
+    def _prune(self, db):
+        """Delete least recently used results, exceeding ``max_db_size``."""
+        count = db.execute('SELECT COUNT(*) FROM check_commands').fetchone()[0]
+        if count > self.max_db_size:
+            db.execute('DELETE FROM check_commands WHERE key IN '
+                       '(SELECT key FROM check_commands ORDER BY used LIMIT ?)', (count - self.max_db_size,))
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set(self, key, result):
+        self.set_many({key: result})
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def close(self):
+        """Close persistent cache database, it is opened again on next use."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# in-process cache, shared by all clients without a persistent cache
+default_check_command_cache = CheckCommandCache()
+
+
+class GuardedSession:
+    """
+    Transport wrapper applying the client circuit breaker to every request, and hedging to GET requests if enabled.
+    Other attributes are the transport's.
+
+    Errors (e.g. connection errors and timeouts) and 5xx responses are failures, any other response is a success.
+    """
+
+    def __init__(self, transport, breaker=None, hedging=None, hedging_workers=HEDGING_WORKERS):
+        self.transport = transport
+        self.breaker = breaker
+        self.hedging = hedging
+
+        self._hedging_workers = hedging_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._hedging_workers)
+            return self._executor
+
+    def _request(self, method, url, **kwargs):
+        breaker = self.breaker
+        if breaker is None:
+            return getattr(self.transport, method)(url, **kwargs)
+
+        host = urlsplit(url).netloc
+        if not breaker.allow(host):
+            raise ZmonCircuitOpenError(host, breaker.retry_after(host))
+
+        try:
+            resp = getattr(self.transport, method)(url, **kwargs)
+        except Exception:
+            # any error must count, or a half-open circuit would wait for its probe forever
+            breaker.failure(host)
+            raise
+
+        status_code = getattr(resp, 'status_code', None)
+        if isinstance(status_code, int) and status_code >= 500:
+            breaker.failure(host)
+        else:
+            breaker.success(host)
+
+        return resp
+
+    def get(self, url, **kwargs):
+        if self.hedging is None:
+            return self._request('get', url, **kwargs)
+
+        # GET requests are idempotent, so sending a duplicate is safe
+        return hedged_call(self.hedging, self.executor, lambda: self._request('get', url, **kwargs))
+
+    def post(self, url, **kwargs):
+        return self._request('post', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self._request('put', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self._request('delete', url, **kwargs)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.transport.close()
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
 class Zmon:
     """ZMON client class that enables communication with ZMON backend.
 
@@ -112,7 +493,7 @@ class Zmon:
     :param password: ZMON authentication password. Ignored if ``token`` is used.
     :type password: str
 
-    :param timeout: HTTP requests timeout. Default is 10 sec.
+    :param timeout: HTTP requests (read) timeout. Default is 10 sec.
     :type timeout: int
 
     :param verify: Verify SSL connection. Default is ``True``.
@@ -120,58 +501,331 @@ class Zmon:
 
     :param user_agent: ZMON user agent. Default is generated by ZMON client and includes lib version.
     :type user_agent: str
+
+    :param check_command_cache: Path of persistent check command validation cache. Default is ``None`` (in-memory).
+    :type check_command_cache: str
+
+    :param tracer: Opentracing tracer. Default is the global ``opentracing.tracer``. Tracing is disabled if no
+                   tracer is configured, i.e. the global tracer is the noop tracer.
+    :type tracer: :class:`opentracing.Tracer`
+
+    :param trace_sample_rate: Ratio of traced calls, between 0 and 1. Either a single rate, or a dict of rates per
+                              client method name, with an optional ``*`` key as default rate. Default is 1.
+    :type trace_sample_rate: float, dict
+
+    :param transport: HTTP transport, either ``requests`` (default) or ``httpx`` for HTTP/2, if available. See
+                      :mod:`zmon_cli.transport`.
+    :type transport: str
+
+    :param models: Return entities, check and alert definitions as compact read-only models instead of dicts. See
+                   :mod:`zmon_cli.models`. Default is ``False``.
+    :type models: bool
+
+    :param circuit_breaker: Per-host circuit breaker, either a :class:`zmon_cli.breaker.CircuitBreaker` or a dict of
+                            its settings (``failure_threshold``, ``open_interval`` and ``half_open_probes``). While
+                            open, requests raise :class:`zmon_cli.client.ZmonCircuitOpenError`. ``True`` enables a
+                            breaker with default settings. Default is ``None`` (disabled).
+    :type circuit_breaker: :class:`zmon_cli.breaker.CircuitBreaker`, dict, bool
+
+    :param hedging: Hedge GET requests, i.e. send a duplicate request if there is no response within a percentile of
+                    recent latencies. Either a :class:`zmon_cli.hedging.HedgingPolicy` or a dict of its settings
+                    (``percentile``, ``max_extra``, ``window`` and ``min_samples``). Default is ``None`` (disabled).
+    :type hedging: :class:`zmon_cli.hedging.HedgingPolicy`, dict
+
+    :param connect_timeout: HTTP connect timeout. Default is ``None`` (same as ``timeout``).
+    :type connect_timeout: float
     """
 
     def __init__(
             self, url, token=None, username=None, password=None, timeout=DEFAULT_TIMEOUT, verify=True,
-            user_agent=ZMON_USER_AGENT):
+            user_agent=ZMON_USER_AGENT, check_command_cache=None, tracer=None, trace_sample_rate=1.0,
+            transport=None, models=False, circuit_breaker=None, hedging=None, connect_timeout=None):
         """Initialize ZMON client."""
         self.timeout = timeout
 
+        if not isinstance(trace_sample_rate, dict):
+            trace_sample_rate = {'*': trace_sample_rate}
+        self._trace_sample_rates = dict(trace_sample_rate)
+        self._trace_default_rate = self._trace_sample_rates.pop('*', 1.0)
+
+        if tracer is None and type(opentracing.tracer) is not opentracing.Tracer:
+            tracer = opentracing.tracer
+        if self._trace_default_rate <= 0 and not any(r > 0 for r in self._trace_sample_rates.values()):
+            tracer = None
+        self._tracer = tracer
+
+        self.models = models
+
+        self.check_command_cache = (
+            CheckCommandCache(check_command_cache) if check_command_cache else default_check_command_cache)
+
         split = urlsplit(url)
         self.base_url = urlunsplit(SplitResult(split.scheme, split.netloc, '', '', ''))
         self.url = urljoin(self.base_url, self._join_path(['api', API_VERSION, '']))
 
-        self._session = requests.Session()
-
         self._timeout = timeout
+        self._connect_timeout = connect_timeout
         self.user_agent = user_agent
 
+        # absolute time.monotonic() deadline of all requests, see ``deadline``
+        self.deadline_at = None
+
+        # set, once the API turned out to ignore entity paging parameters, see ``iter_entities``
+        self._entity_paging_unsupported = False
+
+        auth = None
         if username and password and token is None:
-            self._session.auth = (username, password)
+            auth = (username, password)
 
-        self._session.headers.update({'User-Agent': user_agent, 'Content-Type': 'application/json'})
+        headers = {'User-Agent': user_agent, 'Content-Type': 'application/json'}
 
         if token:
-            self._session.headers.update({'Authorization': 'Bearer {}'.format(token)})
+            headers['Authorization'] = 'Bearer {}'.format(token)
 
         if not verify:
             logger.warning('ZMON client will skip SSL verification!')
             requests.packages.urllib3.disable_warnings()
-            self._session.verify = False
+
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker()
+        elif isinstance(circuit_breaker, dict):
+            circuit_breaker = CircuitBreaker(**circuit_breaker)
+        self.circuit_breaker = circuit_breaker or None
+
+        if isinstance(hedging, dict):
+            hedging = HedgingPolicy(**hedging)
+        self.hedging = hedging or None
+
+        try:
+            self._session = GuardedSession(
+                create_transport(transport, headers=headers, auth=auth, verify=verify), self.circuit_breaker,
+                self.hedging)
+        except TransportError as e:
+            raise ZmonError(str(e))
 
     @property
     def session(self):
         return self._session
 
+    def close(self):
+        """Close client session with its connection pools, and the persistent check command cache."""
+        self._session.close()
+        if self.check_command_cache is not default_check_command_cache:
+            self.check_command_cache.close()
+
+    def stats(self) -> dict:
+        """
+        Client statistics, e.g. for monitoring long running bulk jobs.
+
+        :return: Dict with ``circuits``: circuit breaker state and counters per host, and ``hedging``: hedged
+                 request counters and current hedging delay (``None`` if hedging is disabled).
+        :rtype: dict
+        """
+        return {
+            'circuits': self.circuit_breaker.stats() if self.circuit_breaker else {},
+            'hedging': self.hedging.stats() if self.hedging else None,
+        }
+
+    @contextlib.contextmanager
+    def deadline(self, seconds):
+        """
+        Context manager limiting the total time of all requests, in all threads, to ``seconds``.
+
+        Every request uses the remaining time as its timeout, and raises
+        :class:`zmon_cli.client.ZmonDeadlineExceeded` without being sent once the deadline expired. Nested deadlines
+        can only be shorter.
+        """
+        previous = self.deadline_at
+
+        deadline_at = time.monotonic() + seconds
+        if previous is not None:
+            deadline_at = min(previous, deadline_at)
+
+        self.deadline_at = deadline_at
+        try:
+            yield self
+        finally:
+            self.deadline_at = previous
+
+    def remaining(self):
+        """Seconds until the deadline expires, or ``None`` if there is no deadline."""
+        if self.deadline_at is None:
+            return None
+        return self.deadline_at - time.monotonic()
+
+    def request_timeout(self):
+        """
+        Timeout of the next request: ``timeout``, or ``(connect_timeout, timeout)`` if a connect timeout is set, bounded
+        by the remaining time until the deadline.
+
+        :raises: ZmonDeadlineExceeded
+        """
+        timeout, connect_timeout = self._timeout, self._connect_timeout
+
+        remaining = self.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise ZmonDeadlineExceeded('Deadline exceeded')
+
+            timeout = remaining if timeout is None else min(timeout, remaining)
+            if connect_timeout is not None:
+                connect_timeout = min(connect_timeout, remaining)
+
+        if connect_timeout is not None:
+            return (connect_timeout, timeout)
+        return timeout
+
+    @property
+    def tracer(self):
+        """Opentracing tracer used by the client, or ``None`` if tracing is disabled."""
+        return self._tracer
+
+    def trace_sampled(self, operation_name: str) -> bool:
+        """Return whether a call of client method ``operation_name`` should be traced."""
+        rate = self._trace_sample_rates.get(operation_name, self._trace_default_rate)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
     @staticmethod
     def is_valid_entity_id(entity_id):
         return invalid_entity_id_re.search(entity_id) is None
 
     @staticmethod
-    def validate_check_command(src):
+    def validate_entities(entities, fix_ids=False, workers=None, min_pool_size=256, start=0, seen=None,
+                          executor=None) -> tuple:
+        """
+        Validate and de-duplicate entities before pushing them, without any network I/O.
+
+        Entities are checked with :func:`zmon_cli.client.check_entity` across a process pool. Entities with the same
+        ID as a previous one are reported as duplicates.
+
+        :param entities: Iterable of entity dicts.
+        :type entities: iterable
+
+        :param fix_ids: Normalize invalid entity IDs instead of reporting them. Fixed entities are copies.
+        :type fix_ids: bool
+
+        :param workers: Number of worker processes. Default is number of CPUs.
+        :type workers: int
+
+        :param min_pool_size: Minimum number of entities to use a process pool.
+        :type min_pool_size: int
+
+        :param start: Index of the first entity, when validating a stream in chunks.
+        :type start: int
+
+        :param seen: Dict of already seen entity IDs to their index, when validating a stream in chunks. Updated in
+                     place.
+        :type seen: dict
+
+        :param executor: Process pool to use instead of a new one, when validating a stream in chunks.
+        :type executor: :class:`concurrent.futures.ProcessPoolExecutor`
+
+        :return: Tuple of valid entities list and list of :class:`zmon_cli.client.EntityValidationError`.
+        :rtype: tuple
+        """
+        entities = list(entities)
+        seen = {} if seen is None else seen
+
+        check = functools.partial(check_entity, fix_id=fix_ids)
+        if len(entities) < min_pool_size:
+            results = [check(e) for e in entities]
+        else:
+            chunksize = max(1, len(entities) // ((workers or os.cpu_count() or 1) * 4))
+            if executor is not None:
+                results = list(executor.map(check, entities, chunksize=chunksize))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(check, entities, chunksize=chunksize))
+
+        valid = []
+        errors = []
+        for index, (entity, result) in enumerate(zip(entities, results), start):
+            if result.error:
+                errors.append(EntityValidationError(index, result.entity_id, result.error))
+                continue
+
+            if result.entity_id in seen:
+                errors.append(EntityValidationError(
+                    index, result.entity_id, 'Duplicate entity ID, first seen at #{}'.format(seen[result.entity_id])))
+                continue
+
+            seen[result.entity_id] = index
+
+            if result.entity_id != entity['id']:
+                entity = dict(entity, id=result.entity_id)
+            valid.append(entity)
+
+        return valid, errors
+
+    @staticmethod
+    def validate_check_command(src, cache=None):
         """
         Validates if ``check command`` is valid syntax. Raises exception in case of invalid syntax.
 
+        Validation results are cached by content hash of ``src``.
+
         :param src: Check command python source code.
         :type src: str
 
+        :param cache: Validation results cache. Default is the in-process cache.
+        :type cache: :class:`zmon_cli.client.CheckCommandCache`
+
         :raises: ZmonError
         """
-        try:
-            ast.parse(src)
-        except Exception as e:
-            raise ZmonError('Invalid check command: {}'.format(e))
+        cache = cache or default_check_command_cache
+
+        key = check_command_key(src)
+        result = cache.get(key)
+        if result is None:
+            result = compile_check_command(src)
+            cache.set(key, result)
+
+        if not result.valid:
+            raise ZmonError('Invalid check command: {}'.format(result.error))
+
+    def validate_check_commands(self, commands, workers=None, min_pool_size=32) -> list:
+        """
+        Validate syntax of many check commands.
+
+        Cached results are returned directly, remaining commands are compiled across a process pool.
+
+        :param commands: Iterable of check commands python source code.
+        :type commands: iterable
+
+        :param workers: Number of worker processes. Default is number of CPUs.
+        :type workers: int
+
+        :param min_pool_size: Minimum number of uncached commands to use a process pool.
+        :type min_pool_size: int
+
+        :return: List of :class:`zmon_cli.client.CheckCommandResult`, in the same order as ``commands``.
+        :rtype: list
+        """
+        commands = list(commands)
+        keys = [check_command_key(src) for src in commands]
+
+        results = self.check_command_cache.get_many(set(keys))
+
+        pending = OrderedDict()
+        for key, src in zip(keys, commands):
+            if key not in results:
+                pending[key] = src
+
+        if pending:
+            logger.debug('Validating {} check commands ...'.format(len(pending)))
+
+            if len(pending) < min_pool_size:
+                compiled = [compile_check_command(src) for src in pending.values()]
+            else:
+                chunksize = max(1, len(pending) // ((workers or os.cpu_count() or 1) * 4))
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    compiled = list(executor.map(compile_check_command, pending.values(), chunksize=chunksize))
+
+            compiled = dict(zip(pending.keys(), compiled))
+            self.check_command_cache.set_many(compiled)
+            results.update(compiled)
+
+        return [results[key] for key in keys]
 
     def _join_path(self, parts):
         return '/'.join(str(p).strip('/') for p in parts)
@@ -192,6 +846,15 @@ class Zmon:
 
         return resp.json()
 
+    def as_models(self, model, data, models=None):
+        """Convert dict, or list of dicts, to ``model`` if models are enabled."""
+        if not (self.models if models is None else models) or data is None:
+            return data
+
+        if isinstance(data, list):
+            return model.from_list(data)
+        return model.from_dict(data)
+
 ########################################################################################################################
 # DEEPLINKS
 ########################################################################################################################
@@ -266,7 +929,7 @@ class Zmon:
         :return: ZMON status.
         :rtype: dict
         """
-        resp = self.session.get(self.endpoint(STATUS), timeout=self._timeout)
+        resp = self.session.get(self.endpoint(STATUS), timeout=self.request_timeout())
 
         return self.json(resp)
 
@@ -274,9 +937,8 @@ class Zmon:
 # ENTITIES
 ########################################################################################################################
 
-    @trace(pass_span=True)
-    @logged
-    def get_entities(self, query=None, **kwargs) -> list:
+    @traced(pass_span=True)
+    def get_entities(self, query=None, models=None, **kwargs) -> list:
         """
         Get ZMON entities, with optional filtering.
 
@@ -284,6 +946,9 @@ class Zmon:
                       all entities of type: ``instance``.
         :type query: dict
 
+        :param models: Return :class:`zmon_cli.models.Entity` objects. Default is the client ``models`` setting.
+        :type models: bool
+
         :return: List of entities.
         :rtype: list
         """
@@ -295,13 +960,126 @@ class Zmon:
 
         params = {'query': query_str} if query else None
 
-        resp = self.session.get(self.endpoint(ENTITIES), params=params, timeout=self._timeout)
+        resp = self.session.get(self.endpoint(ENTITIES), params=params, timeout=self.request_timeout())
 
-        return self.json(resp)
+        return self.as_models(Entity, self.json(resp), models)
 
-    @trace(pass_span=True)
-    @logged
-    def get_entity(self, entity_id: str, **kwargs) -> str:
+    @traced(pass_span=True)
+    def get_entities_page(self, query=None, limit=None, offset=None, cursor=None, **kwargs):
+        """
+        Get a single page of ZMON entities.
+
+        :return: Tuple of entities list and next page cursor. Cursor is ``None`` unless the API supports cursor
+                 paging.
+        :rtype: tuple
+        """
+        query_str = json.dumps(query) if query else ''
+
+        current_span = extract_span_from_kwargs(**kwargs)
+        current_span.log_kv({'query': query_str, 'limit': limit, 'offset': offset})
+
+        params = {'query': query_str} if query else {}
+        params['limit'] = limit
+        if cursor is not None:
+            params['cursor'] = cursor
+        else:
+            params['offset'] = offset
+
+        resp = self.session.get(self.endpoint(ENTITIES), params=params, timeout=self.request_timeout())
+
+        page = self.json(resp)
+        if isinstance(page, dict):
+            return page.get('entities', []), page.get(NEXT_CURSOR)
+
+        return page, None
+
+    def iter_entities(self, query=None, page_size=DEFAULT_PAGE_SIZE, models=None):
+        """
+        Iterate over ZMON entities, with optional filtering, fetching them in pages of ``page_size``.
+
+        The next page is prefetched in the background, while the current one is processed. If the API does not
+        support paging, all entities are fetched at once, and by later calls too.
+
+        :param query: Entity filtering query. Default is ``None``.
+        :type query: dict
+
+        :param page_size: Number of entities per page. Default is 1000, ``None`` or 0 disables paging.
+        :type page_size: int
+
+        :param models: Return :class:`zmon_cli.models.Entity` objects. Default is the client ``models`` setting.
+        :type models: bool
+
+        :return: Generator of entities.
+        :rtype: generator
+        """
+        if not page_size or self._entity_paging_unsupported:
+            yield from self.get_entities(query=query, models=models)
+            return
+
+        logger.debug('Retrieving entities with query: {} in pages of {} ...'.format(query, page_size))
+
+        try:
+            entities, cursor = self.get_entities_page(query=query, limit=page_size, offset=0)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 400:
+                raise
+            logger.debug('Entity paging not supported, retrieving all entities ...')
+            self._entity_paging_unsupported = True
+            yield from self.get_entities(query=query, models=models)
+            return
+
+        if len(entities) > page_size:
+            # API ignored the limit and returned everything
+            self._entity_paging_unsupported = True
+            yield from self.as_models(Entity, entities, models)
+            return
+
+        offset = len(entities)
+        cursor_paging = cursor is not None
+
+        # IDs of entities yielded so far, in case the API turns out to ignore the offset
+        seen = set()
+
+        # single worker: only the next page is prefetched, an abandoned prefetch is not waited for
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            while True:
+                # a short page is the last one
+                last = cursor is None if cursor_paging else len(entities) < page_size
+
+                prefetch = None
+                if not last:
+                    prefetch = executor.submit(self.get_entities_page, query=query, limit=page_size, offset=offset,
+                                               cursor=cursor)
+
+                yield from self.as_models(Entity, entities, models)
+
+                if prefetch is None:
+                    return
+
+                ids = {e.get('id') for e in entities}
+                if not cursor_paging:
+                    seen |= ids
+
+                entities, cursor = prefetch.result()
+
+                if not entities:
+                    return
+
+                if not cursor_paging and ids.issuperset(e.get('id') for e in entities):
+                    # API ignored the offset and returned the previous page again (maybe in different order)
+                    logger.debug('Entity paging not supported, offset was ignored, retrieving all entities ...')
+                    self._entity_paging_unsupported = True
+                    remaining = [e for e in self.get_entities(query=query, models=False) if e.get('id') not in seen]
+                    yield from self.as_models(Entity, remaining, models)
+                    return
+
+                offset += len(entities)
+        finally:
+            executor.shutdown(wait=False)
+
+    @traced(pass_span=True)
+    def get_entity(self, entity_id: str, models=None, **kwargs) -> str:
         """
         Retrieve single entity.
 
@@ -316,11 +1094,11 @@ class Zmon:
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('entity_id', entity_id)
 
-        resp = self.session.get(self.endpoint(ENTITIES, entity_id, trailing_slash=False), timeout=self._timeout)
-        return self.json(resp)
+        resp = self.session.get(
+            self.endpoint(ENTITIES, entity_id, trailing_slash=False), timeout=self.request_timeout())
+        return self.as_models(Entity, self.json(resp), models)
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def add_entity(self, entity: dict, **kwargs) -> requests.Response:
         """
         Create or update an entity on ZMON.
@@ -347,14 +1125,14 @@ class Zmon:
         current_span.set_tag('entity_id', entity['id'])
 
         data = json.dumps(entity, cls=JSONDateEncoder)
-        resp = self.session.put(self.endpoint(ENTITIES, trailing_slash=False), data=data, timeout=self._timeout)
+        resp = self.session.put(
+            self.endpoint(ENTITIES, trailing_slash=False), data=data, timeout=self.request_timeout())
 
         resp.raise_for_status()
 
         return resp
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def delete_entity(self, entity_id: str, **kwargs) -> bool:
         """
         Delete entity from ZMON.
@@ -374,7 +1152,7 @@ class Zmon:
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('entity_id', entity_id)
 
-        resp = self.session.delete(self.endpoint(ENTITIES, entity_id))
+        resp = self.session.delete(self.endpoint(ENTITIES, entity_id), timeout=self.request_timeout())
 
         resp.raise_for_status()
 
@@ -384,8 +1162,7 @@ class Zmon:
 # DASHBOARD
 ########################################################################################################################
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def get_dashboard(self, dashboard_id: str, **kwargs) -> dict:
         """
         Retrieve a ZMON dashboard.
@@ -399,12 +1176,11 @@ class Zmon:
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('dashboard_id', dashboard_id)
 
-        resp = self.session.get(self.endpoint(DASHBOARD, dashboard_id), timeout=self._timeout)
+        resp = self.session.get(self.endpoint(DASHBOARD, dashboard_id), timeout=self.request_timeout())
 
         return self.json(resp)
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def update_dashboard(self, dashboard: dict, **kwargs) -> dict:
         """
         Create or update dashboard.
@@ -422,11 +1198,12 @@ class Zmon:
             logger.debug('Updating dashboard with ID: {} ...'.format(dashboard['id']))
             current_span.set_tag('dashboard_id', dashboard['id'])
 
-            resp = self.session.post(self.endpoint(DASHBOARD, dashboard['id']), json=dashboard, timeout=self._timeout)
+            resp = self.session.post(
+                self.endpoint(DASHBOARD, dashboard['id']), json=dashboard, timeout=self.request_timeout())
         else:
             # new dashboard
             logger.debug('Adding new dashboard ...')
-            resp = self.session.post(self.endpoint(DASHBOARD), json=dashboard, timeout=self._timeout)
+            resp = self.session.post(self.endpoint(DASHBOARD), json=dashboard, timeout=self.request_timeout())
 
         resp.raise_for_status()
 
@@ -436,9 +1213,8 @@ class Zmon:
 # CHECK-DEFS
 ########################################################################################################################
 
-    @trace(pass_span=True)
-    @logged
-    def get_check_definition(self, definition_id: int, **kwargs) -> dict:
+    @traced(pass_span=True)
+    def get_check_definition(self, definition_id: int, models=None, **kwargs) -> dict:
         """
         Retrieve check defintion.
 
@@ -451,30 +1227,28 @@ class Zmon:
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('check_id', definition_id)
 
-        resp = self.session.get(self.endpoint(CHECK_DEF, definition_id), timeout=self._timeout)
+        resp = self.session.get(self.endpoint(CHECK_DEF, definition_id), timeout=self.request_timeout())
 
         # TODO: total hack! API returns 200 if check def does not exist!
         if resp.text == '':
             resp.status_code = 404
             resp.reason = 'Not Found'
 
-        return self.json(resp)
+        return self.as_models(CheckDefinition, self.json(resp), models)
 
-    @trace()
-    @logged
-    def get_check_definitions(self) -> list:
+    @traced()
+    def get_check_definitions(self, models=None) -> list:
         """
         Return list of all ``active`` check definitions.
 
         :return: List of check-defs.
         :rtype: list
         """
-        resp = self.session.get(self.endpoint(ACTIVE_CHECK_DEF), timeout=self._timeout)
+        resp = self.session.get(self.endpoint(ACTIVE_CHECK_DEF), timeout=self.request_timeout())
 
-        return self.json(resp).get('check_definitions')
+        return self.as_models(CheckDefinition, self.json(resp).get('check_definitions'), models)
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def update_check_definition(self, check_definition, skip_validation=False, **kwargs) -> dict:
         """
         Update existing check definition.
@@ -501,18 +1275,17 @@ class Zmon:
 
         if not skip_validation:
             try:
-                self.validate_check_command(check_definition['command'])
+                self.validate_check_command(check_definition['command'], cache=self.check_command_cache)
             except Exception:
                 current_span.set_tag('error', True)
                 current_span.log_kv({'exception': traceback.format_exc()})
                 raise
 
-        resp = self.session.post(self.endpoint(CHECK_DEF), json=check_definition, timeout=self._timeout)
+        resp = self.session.post(self.endpoint(CHECK_DEF), json=check_definition, timeout=self.request_timeout())
 
         return self.json(resp)
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def delete_check_definition(self, check_definition_id: int, **kwargs) -> requests.Response:
         """
         Delete existing check definition.
@@ -526,7 +1299,7 @@ class Zmon:
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('check_id', str(check_definition_id))
 
-        resp = self.session.delete(self.endpoint(CHECK_DEF, check_definition_id))
+        resp = self.session.delete(self.endpoint(CHECK_DEF, check_definition_id), timeout=self.request_timeout())
 
         resp.raise_for_status()
 
@@ -536,9 +1309,8 @@ class Zmon:
 # ALERT-DEFS & DATA
 ########################################################################################################################
 
-    @trace(pass_span=True)
-    @logged
-    def get_alert_definition(self, alert_id: int, **kwargs) -> dict:
+    @traced(pass_span=True)
+    def get_alert_definition(self, alert_id: int, models=None, **kwargs) -> dict:
         """
         Retrieve alert definition.
 
@@ -551,25 +1323,23 @@ class Zmon:
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('alert_id', str(alert_id))
 
-        resp = self.session.get(self.endpoint(ALERT_DEF, alert_id), timeout=self._timeout)
+        resp = self.session.get(self.endpoint(ALERT_DEF, alert_id), timeout=self.request_timeout())
 
-        return self.json(resp)
+        return self.as_models(AlertDefinition, self.json(resp), models)
 
-    @trace()
-    @logged
-    def get_alert_definitions(self) -> list:
+    @traced()
+    def get_alert_definitions(self, models=None) -> list:
         """
         Return list of all ``active`` alert definitions.
 
         :return: List of alert-defs.
         :rtype: list
         """
-        resp = self.session.get(self.endpoint(ACTIVE_ALERT_DEF), timeout=self._timeout)
+        resp = self.session.get(self.endpoint(ACTIVE_ALERT_DEF), timeout=self.request_timeout())
 
-        return self.json(resp).get('alert_definitions')
+        return self.as_models(AlertDefinition, self.json(resp).get('alert_definitions'), models)
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def create_alert_definition(self, alert_definition: dict, **kwargs) -> dict:
         """
         Create new alert definition.
@@ -598,12 +1368,11 @@ class Zmon:
             raise ZmonArgumentError('Alert defintion must have "check_definition_id"')
         current_span.set_tag('check_id', alert_definition['check_definition_id'])
 
-        resp = self.session.post(self.endpoint(ALERT_DEF), json=alert_definition, timeout=self._timeout)
+        resp = self.session.post(self.endpoint(ALERT_DEF), json=alert_definition, timeout=self.request_timeout())
 
         return self.json(resp)
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def update_alert_definition(self, alert_definition: dict, **kwargs) -> dict:
         """
         Update existing alert definition.
@@ -639,12 +1408,11 @@ class Zmon:
             alert_definition['status'] = 'ACTIVE'
 
         resp = self.session.put(
-            self.endpoint(ALERT_DEF, alert_definition['id']), json=alert_definition, timeout=self._timeout)
+            self.endpoint(ALERT_DEF, alert_definition['id']), json=alert_definition, timeout=self.request_timeout())
 
         return self.json(resp)
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def delete_alert_definition(self, alert_definition_id: int, **kwargs) -> dict:
         """
         Delete existing alert definition.
@@ -657,12 +1425,11 @@ class Zmon:
         """
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('alert_id', str(alert_definition_id))
-        resp = self.session.delete(self.endpoint(ALERT_DEF, alert_definition_id))
+        resp = self.session.delete(self.endpoint(ALERT_DEF, alert_definition_id), timeout=self.request_timeout())
 
         return self.json(resp)
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def get_alert_data(self, alert_id: int, **kwargs) -> dict:
         """
         Retrieve alert data.
@@ -687,7 +1454,7 @@ class Zmon:
         """
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('alert_id', str(alert_id))
-        resp = self.session.get(self.endpoint(ALERT_DATA, alert_id, 'all-entities'), timeout=self._timeout)
+        resp = self.session.get(self.endpoint(ALERT_DATA, alert_id, 'all-entities'), timeout=self.request_timeout())
 
         return self.json(resp)
 
@@ -695,8 +1462,7 @@ class Zmon:
 # SEARCH
 ########################################################################################################################
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def search(self, q, limit=None, teams=None, **kwargs) -> dict:
         """
         Search ZMON dashboards, checks, alerts and grafana dashboards with optional team filtering.
@@ -734,7 +1500,7 @@ class Zmon:
             params['teams'] = ','.join(teams)
 
         current_span.log_kv({'query', json.dumps(params)})
-        resp = self.session.get(self.endpoint(SEARCH), params=params, timeout=self._timeout)
+        resp = self.session.get(self.endpoint(SEARCH), params=params, timeout=self.request_timeout())
 
         return self.json(resp)
 
@@ -743,8 +1509,7 @@ class Zmon:
 # ONETIME-TOKENS
 ########################################################################################################################
 
-    @trace()
-    @logged
+    @traced()
     def list_onetime_tokens(self) -> list:
         """
         List exisitng one-time tokens.
@@ -762,12 +1527,11 @@ class Zmon:
               created: 2016-08-26 12:51:13.506000
               token: 9pSzKpcO
         """
-        resp = self.session.get(self.endpoint(TOKENS), timeout=self._timeout)
+        resp = self.session.get(self.endpoint(TOKENS), timeout=self.request_timeout())
 
         return self.json(resp)
 
-    @trace()
-    @logged
+    @traced()
     def get_onetime_token(self) -> str:
         """
         Retrieve new one-time token.
@@ -777,7 +1541,7 @@ class Zmon:
         :return: One-time token.
         :retype: str
         """
-        resp = self.session.post(self.endpoint(TOKENS), json={}, timeout=self._timeout)
+        resp = self.session.post(self.endpoint(TOKENS), json={}, timeout=self.request_timeout())
 
         resp.raise_for_status()
 
@@ -787,8 +1551,7 @@ class Zmon:
 # GRAFANA
 ########################################################################################################################
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def get_grafana_dashboard(self, grafana_dashboard_uid: str, **kwargs) -> dict:
         """
         Retrieve Grafana dashboard.
@@ -802,12 +1565,11 @@ class Zmon:
         current_span = extract_span_from_kwargs(**kwargs)
         current_span.set_tag('grafana_dashboard_uid', grafana_dashboard_uid)
         url = self.endpoint(GRAFANA, grafana_dashboard_uid, trailing_slash=False)
-        resp = self.session.get(url, timeout=self._timeout)
+        resp = self.session.get(url, timeout=self.request_timeout())
 
         return self.json(resp)
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def update_grafana_dashboard(self, grafana_dashboard: dict, **kwargs) -> dict:
         """
         Update existing Grafana dashboard.
@@ -837,7 +1599,8 @@ class Zmon:
         if 'id' in grafana_dashboard['dashboard'] and grafana_dashboard['dashboard']['id'] is not None:
             current_span.set_tag('grafana_dashboard_id', grafana_dashboard['dashboard']['id'])
 
-        resp = self.session.post(self.endpoint(GRAFANA), json=json.dumps(grafana_dashboard), timeout=self._timeout)
+        data = json.dumps(grafana_dashboard, cls=JSONDateEncoder)
+        resp = self.session.post(self.endpoint(GRAFANA), data=data, timeout=self.request_timeout())
 
         return self.json(resp)
 
@@ -845,8 +1608,7 @@ class Zmon:
 # DOWNTIMES
 ########################################################################################################################
 
-    @trace(pass_span=True)
-    @logged
+    @traced(pass_span=True)
     def create_downtime(self, downtime: dict, **kwargs) -> dict:
         """
         Create a downtime for specific entities.
@@ -886,7 +1648,7 @@ class Zmon:
         # current_span.set_tag('start_time', str(downtime.get('start_time')))
         # current_span.set_tag('end_time', str(downtime.get('end_time')))
 
-        resp = self.session.post(self.endpoint(DOWNTIME), json=downtime, timeout=self._timeout)
+        resp = self.session.post(self.endpoint(DOWNTIME), json=downtime, timeout=self.request_timeout())
 
         return self.json(resp)
 
@@ -896,13 +1658,13 @@ class Zmon:
 
     @logged
     def get_groups(self):
-        resp = self.session.get(self.endpoint(GROUPS), timeout=self._timeout)
+        resp = self.session.get(self.endpoint(GROUPS), timeout=self.request_timeout())
 
         return self.json(resp)
 
     @logged
     def switch_active_user(self, group_name, user_name):
-        resp = self.session.delete(self.endpoint(GROUPS, group_name, 'active'))
+        resp = self.session.delete(self.endpoint(GROUPS, group_name, 'active'), timeout=self.request_timeout())
 
         if not resp.ok:
             logger.error('Failed to de-activate group: {}'.format(group_name))
@@ -910,7 +1672,7 @@ class Zmon:
 
         logger.debug('Switching active user: {}'.format(user_name))
 
-        resp = self.session.put(self.endpoint(GROUPS, group_name, 'active', user_name), timeout=self._timeout)
+        resp = self.session.put(self.endpoint(GROUPS, group_name, 'active', user_name), timeout=self.request_timeout())
 
         if not resp.ok:
             logger.error('Failed to switch active user {}'.format(user_name))
@@ -920,7 +1682,7 @@ class Zmon:
 
     @logged
     def add_member(self, group_name, user_name):
-        resp = self.session.put(self.endpoint(GROUPS, group_name, MEMBER, user_name), timeout=self._timeout)
+        resp = self.session.put(self.endpoint(GROUPS, group_name, MEMBER, user_name), timeout=self.request_timeout())
 
         resp.raise_for_status()
 
@@ -928,7 +1690,7 @@ class Zmon:
 
     @logged
     def remove_member(self, group_name, user_name):
-        resp = self.session.delete(self.endpoint(GROUPS, group_name, MEMBER, user_name))
+        resp = self.session.delete(self.endpoint(GROUPS, group_name, MEMBER, user_name), timeout=self.request_timeout())
 
         resp.raise_for_status()
 
@@ -936,7 +1698,7 @@ class Zmon:
 
     @logged
     def add_phone(self, member_email, phone_nr):
-        resp = self.session.put(self.endpoint(GROUPS, member_email, PHONE, phone_nr), timeout=self._timeout)
+        resp = self.session.put(self.endpoint(GROUPS, member_email, PHONE, phone_nr), timeout=self.request_timeout())
 
         resp.raise_for_status()
 
@@ -944,7 +1706,7 @@ class Zmon:
 
     @logged
     def remove_phone(self, member_email, phone_nr):
-        resp = self.session.delete(self.endpoint(GROUPS, member_email, PHONE, phone_nr))
+        resp = self.session.delete(self.endpoint(GROUPS, member_email, PHONE, phone_nr), timeout=self.request_timeout())
 
         resp.raise_for_status()
 
@@ -952,7 +1714,7 @@ class Zmon:
 
     @logged
     def set_name(self, member_email, member_name):
-        resp = self.session.put(self.endpoint(GROUPS, member_email, PHONE, member_name), timeout=self._timeout)
+        resp = self.session.put(self.endpoint(GROUPS, member_email, PHONE, member_name), timeout=self.request_timeout())
 
         resp.raise_for_status()
 
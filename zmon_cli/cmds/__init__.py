@@ -1,25 +1,35 @@
 from zmon_cli.cmds.command import cli
 
 from zmon_cli.cmds.alert import alert_definitions
+from zmon_cli.cmds.batch import batch
 from zmon_cli.cmds.check import check_definitions
+from zmon_cli.cmds.completion import completion
+from zmon_cli.cmds.daemon import daemon
 from zmon_cli.cmds.dashboard import dashboard
 from zmon_cli.cmds.data import data
 from zmon_cli.cmds.downtime import downtimes
 from zmon_cli.cmds.entity import entities
+from zmon_cli.cmds.export import export
 from zmon_cli.cmds.grafana import grafana
 from zmon_cli.cmds.group import groups, members
+from zmon_cli.cmds.manifest import apply_manifest
 from zmon_cli.cmds.search import search
 from zmon_cli.cmds.token import tv_tokens
 
 
 __all__ = (
     alert_definitions,
+    apply_manifest,
+    batch,
     check_definitions,
     cli,
+    completion,
+    daemon,
     dashboard,
     data,
     downtimes,
     entities,
+    export,
     grafana,
     groups,
     members,
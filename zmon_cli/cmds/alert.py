@@ -1,4 +1,5 @@
 import json
+import functools
 
 import yaml
 
@@ -7,8 +8,15 @@ import click
 from clickclick import AliasedGroup, Action, ok
 
 from zmon_cli.cmds.command import cli, get_client, yaml_output_option, output_option, pretty_json
-from zmon_cli.output import dump_yaml, Output, render_alerts
+from zmon_cli.cmds.command import targets_option, query_targets, tag_targets
+from zmon_cli.cmds.entity import get_entity_index, entity_matches
+from zmon_cli.output import dump_yaml, Output, render_alerts, render_matches
 from zmon_cli.client import ZmonArgumentError
+from zmon_cli.bulk import call_concurrently, hash_join
+
+
+# check definition fields joined into alert definitions, prefixed with "check_"
+JOINED_CHECK_FIELDS = ('name', 'interval', 'command', 'owning_team')
 
 
 @cli.group('alert-definitions', cls=AliasedGroup)
@@ -68,21 +76,38 @@ def get_alert_definition(obj, alert_id, output, pretty):
         act.echo(alert)
 
 
+def get_alerts_with_checks(client) -> list:
+    """Retrieve all active alert and check definitions concurrently, and join check fields into alerts."""
+    alerts, checks = call_concurrently(client.get_alert_definitions, client.get_check_definitions)
+
+    return hash_join(alerts, checks, 'check_definition_id', fields=JOINED_CHECK_FIELDS, prefix='check_')
+
+
 @alert_definitions.command('list')
+@click.option('--with-checks', is_flag=True, help='Include name, interval and command of the alert check definition.')
 @click.pass_obj
+@targets_option
 @output_option
 @pretty_json
-def list_alert_definitions(obj, output, pretty):
+def list_alert_definitions(obj, with_checks, targets, output, pretty):
     """List all active alert definitions"""
-    client = get_client(obj.config)
-
-    with Output('Retrieving active alert definitions ...', nl=True, output=output, pretty_json=pretty,
-                printer=render_alerts) as act:
-        alerts = client.get_alert_definitions()
+    def _list(client):
+        alerts = get_alerts_with_checks(client) if with_checks else client.get_alert_definitions()
 
         for alert in alerts:
             alert['link'] = client.alert_details_url(alert)
 
+        return alerts
+
+    client = None if targets else get_client(obj.config)
+
+    with Output('Retrieving active alert definitions ...', nl=True, output=output, pretty_json=pretty,
+                printer=render_alerts) as act:
+        if targets:
+            alerts = tag_targets(query_targets(obj.config, targets, _list))
+        else:
+            alerts = _list(client)
+
         act.echo(alerts)
 
 
@@ -90,27 +115,82 @@ def list_alert_definitions(obj, output, pretty):
 @click.argument('field')
 @click.argument('value')
 @click.pass_obj
+@targets_option
 @output_option
 @pretty_json
-def filter_alert_definitions(obj, field, value, output, pretty):
+def filter_alert_definitions(obj, field, value, targets, output, pretty):
     """Filter active alert definitions"""
-    client = get_client(obj.config)
-
-    with Output('Retrieving and filtering alert definitions ...', nl=True, output=output, pretty_json=pretty,
-                printer=render_alerts) as act:
+    def _filter(client):
         alerts = client.get_alert_definitions()
 
-        if field == 'check_definition_id':
-            value = int(value)
-
         filtered = [alert for alert in alerts if alert.get(field) == value]
 
         for alert in filtered:
             alert['link'] = client.alert_details_url(alert)
 
+        return filtered
+
+    client = None if targets else get_client(obj.config)
+
+    with Output('Retrieving and filtering alert definitions ...', nl=True, output=output, pretty_json=pretty,
+                printer=render_alerts) as act:
+        if field == 'check_definition_id':
+            value = int(value)
+
+        if targets:
+            filtered = tag_targets(query_targets(obj.config, targets, _filter))
+        else:
+            filtered = _filter(client)
+
         act.echo(filtered)
 
 
+@alert_definitions.command('entities')
+@click.argument('alert_ids', nargs=-1, type=int)
+@click.option('--ids', 'with_ids', is_flag=True, help='List IDs of matched entities, instead of match counts.')
+@click.option('--offline', is_flag=True, help='Match entities of local entity mirror, see "zmon entities mirror".')
+@click.pass_obj
+@output_option
+@pretty_json
+def alert_entities(obj, alert_ids, with_ids, offline, output, pretty):
+    """
+    Match entities of alert definitions locally
+
+    Alert entity filters are applied to the entities of the alert check definition. Without ALERT_IDS, all active
+    alert definitions are matched.
+
+    E.g.:
+        zmon alert-definitions entities 123 --ids
+    """
+    client = get_client(obj.config)
+
+    def _alerts_and_checks():
+        if not alert_ids:
+            return call_concurrently(client.get_alert_definitions, client.get_check_definitions)
+
+        alerts = call_concurrently(*(functools.partial(client.get_alert_definition, i) for i in alert_ids))
+        check_ids = sorted({alert['check_definition_id'] for alert in alerts})
+        checks = call_concurrently(*(functools.partial(client.get_check_definition, i) for i in check_ids))
+        return alerts, checks
+
+    with Output('Matching alert definition entities ...', nl=True, output=output, pretty_json=pretty,
+                printer=render_matches) as act:
+        try:
+            index, (alerts, checks) = call_concurrently(
+                functools.partial(get_entity_index, client, obj.config, offline=offline), _alerts_and_checks)
+        except ZmonArgumentError as e:
+            act.error(str(e))
+            return
+
+        checks = {check['id']: check for check in checks}
+
+        act.echo(
+            entity_matches(alert, index, index.match_alert(alert, checks.get(alert['check_definition_id'], {})),
+                           with_ids)
+            for alert in alerts
+        )
+
+
 @alert_definitions.command('create')
 @click.argument('yaml_file', type=click.File('rb'))
 @click.pass_obj
@@ -0,0 +1,91 @@
+import sys
+import shlex
+
+import click
+
+from clickclick import info, warning, error, fatal_error
+
+from zmon_cli.cmds.command import cli, enable_cache, output_option, pretty_json
+from zmon_cli.output import Output
+from zmon_cli.batch import parse_operations, run_batch
+from zmon_cli.bulk import DEFAULT_CONCURRENCY
+from zmon_cli.client import ZmonArgumentError
+
+
+# all batch operations share configuration and client session
+BATCH_CACHE_TTL = 3600
+
+
+def render_batch(results):
+    for result in results:
+        info('[{}] zmon {}'.format(result['id'], ' '.join(shlex.quote(a) for a in result['args'])))
+
+        if result['output']:
+            click.echo(result['output'], nl=False)
+
+        if result['error']:
+            error('[{}] skipped: {}'.format(result['id'], result['error']))
+        elif result['exit_code']:
+            error('[{}] failed with exit code {}'.format(result['id'], result['exit_code']))
+
+
+########################################################################################################################
+# BATCH
+########################################################################################################################
+
+@cli.command('batch')
+@click.argument('batch_file', type=click.File('rb'))
+@click.option('-j', '--concurrency', type=click.IntRange(1, 64), default=DEFAULT_CONCURRENCY, show_default=True,
+              help='Number of concurrent operations.')
+@click.pass_context
+@output_option
+@pretty_json
+def batch(ctx, batch_file, concurrency, output, pretty):
+    """
+    Run many operations from a YAML or NDJSON file ("-" for stdin)
+
+    Operations are CLI commands, running in one process with a shared client session. Independent operations run
+    concurrently, results are reported in order.
+
+    E.g.:
+
+    \b
+        - entities push '{"id": "my-entity", "type": "instance"}'
+        - id: downtime
+          args: [downtimes, create, -d, 30, my-entity]
+        - args: [alert-definitions, get, 123]
+          depends_on: downtime
+    """
+    try:
+        operations = parse_operations(batch_file.read())
+    except ZmonArgumentError as e:
+        fatal_error(str(e))
+
+    color = ctx.color if ctx.color is not None else sys.stdout.isatty()
+
+    previous = enable_cache(BATCH_CACHE_TTL)
+    try:
+        results = run_batch(cli, ctx.obj, operations, concurrency=concurrency, color=color)
+    finally:
+        enable_cache(previous)
+
+    if output == 'text':
+        render_batch(results)
+    else:
+        with Output('Running batch ...', output=output, pretty_json=pretty) as act:
+            act.echo(results)
+
+    succeeded = len([r for r in results if r['exit_code'] == 0])
+    skipped = len([r for r in results if r['error']])
+    failed = len(results) - succeeded - skipped
+
+    if output == 'text':
+        summary = 'Batch: {} operations, {} succeeded, {} failed, {} skipped'.format(
+            len(results), succeeded, failed, skipped)
+        if failed or skipped:
+            warning(summary)
+        else:
+            info(summary)
+
+    if failed or skipped:
+        ctx.exit(1)
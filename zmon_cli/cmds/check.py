@@ -1,12 +1,18 @@
+import functools
+
 import yaml
 
 import click
 
-from clickclick import AliasedGroup, Action, ok
+from clickclick import AliasedGroup, Action, ok, info, error, fatal_error
 
 from zmon_cli.cmds.command import cli, get_client, yaml_output_option, pretty_json, output_option
-from zmon_cli.output import dump_yaml, Output, render_checks
+from zmon_cli.cmds.command import targets_option, query_targets, tag_targets
+from zmon_cli.cmds.entity import get_entity_index, entity_matches
+from zmon_cli.output import dump_yaml, Output, render_checks, render_matches
 from zmon_cli.client import ZmonArgumentError
+from zmon_cli.bulk import DEFAULT_CONCURRENCY, call_concurrently, find_definition_files, load_yaml_file
+from zmon_cli.bulk import run_concurrently, is_changed
 
 
 @cli.group('check-definitions', cls=AliasedGroup)
@@ -62,19 +68,28 @@ def get_check_definition(obj, check_id, output, pretty):
 
 @check_definitions.command('list')
 @click.pass_obj
+@targets_option
 @output_option
 @pretty_json
-def list_check_definitions(obj, output, pretty):
+def list_check_definitions(obj, targets, output, pretty):
     """List all active check definitions"""
-    client = get_client(obj.config)
-
-    with Output('Retrieving active check definitions ...', nl=True, output=output, pretty_json=pretty,
-                printer=render_checks) as act:
+    def _list(client):
         checks = client.get_check_definitions()
 
         for check in checks:
             check['link'] = client.check_definition_url(check)
 
+        return checks
+
+    client = None if targets else get_client(obj.config)
+
+    with Output('Retrieving active check definitions ...', nl=True, output=output, pretty_json=pretty,
+                printer=render_checks) as act:
+        if targets:
+            checks = tag_targets(query_targets(obj.config, targets, _list))
+        else:
+            checks = _list(client)
+
         act.echo(checks)
 
 
@@ -82,14 +97,12 @@ def list_check_definitions(obj, output, pretty):
 @click.argument('field')
 @click.argument('value')
 @click.pass_obj
+@targets_option
 @output_option
 @pretty_json
-def filter_check_definitions(obj, field, value, output, pretty):
+def filter_check_definitions(obj, field, value, targets, output, pretty):
     """Filter active check definitions"""
-    client = get_client(obj.config)
-
-    with Output('Retrieving and filtering check definitions ...', nl=True, output=output, pretty_json=pretty,
-                printer=render_checks) as act:
+    def _filter(client):
         checks = client.get_check_definitions()
 
         filtered = [check for check in checks if check.get(field) == value]
@@ -97,9 +110,55 @@ def filter_check_definitions(obj, field, value, output, pretty):
         for check in filtered:
             check['link'] = client.check_definition_url(check)
 
+        return filtered
+
+    client = None if targets else get_client(obj.config)
+
+    with Output('Retrieving and filtering check definitions ...', nl=True, output=output, pretty_json=pretty,
+                printer=render_checks) as act:
+        if targets:
+            filtered = tag_targets(query_targets(obj.config, targets, _filter))
+        else:
+            filtered = _filter(client)
+
         act.echo(filtered)
 
 
+@check_definitions.command('entities')
+@click.argument('check_ids', nargs=-1, type=int)
+@click.option('--ids', 'with_ids', is_flag=True, help='List IDs of matched entities, instead of match counts.')
+@click.option('--offline', is_flag=True, help='Match entities of local entity mirror, see "zmon entities mirror".')
+@click.pass_obj
+@output_option
+@pretty_json
+def check_entities(obj, check_ids, with_ids, offline, output, pretty):
+    """
+    Match entities of check definitions locally
+
+    Without CHECK_IDS, all active check definitions are matched.
+
+    E.g.:
+        zmon check-definitions entities 123 --ids
+    """
+    client = get_client(obj.config)
+
+    def _checks():
+        if check_ids:
+            return call_concurrently(*(functools.partial(client.get_check_definition, i) for i in check_ids))
+        return client.get_check_definitions()
+
+    with Output('Matching check definition entities ...', nl=True, output=output, pretty_json=pretty,
+                printer=render_matches) as act:
+        try:
+            index, checks = call_concurrently(
+                functools.partial(get_entity_index, client, obj.config, offline=offline), _checks)
+        except ZmonArgumentError as e:
+            act.error(str(e))
+            return
+
+        act.echo(entity_matches(check, index, index.match_check(check), with_ids) for check in checks)
+
+
 @check_definitions.command('update')
 @click.argument('yaml_file', type=click.File('rb'))
 @click.option('--skip-validation', is_flag=True, help='Skip check command syntax validation.')
@@ -120,6 +179,95 @@ def update(obj, yaml_file, skip_validation):
             act.error(str(e))
 
 
+@check_definitions.command('apply')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--skip-validation', is_flag=True, help='Skip check command syntax validation.')
+@click.option('--dry-run', is_flag=True, help='Only report changed check definitions, do not update.')
+@click.option('-j', '--concurrency', type=click.IntRange(1, 64), default=DEFAULT_CONCURRENCY, show_default=True,
+              help='Number of concurrent requests.')
+@click.pass_obj
+def apply(obj, directory, skip_validation, dry_run, concurrency):
+    """Update all changed check definitions in a directory"""
+    client = get_client(obj.config)
+
+    paths = find_definition_files(directory)
+
+    with Action('Loading {} check definition files ...'.format(len(paths))):
+        loaded = run_concurrently(load_yaml_file, paths, concurrency=concurrency)
+
+    checks = []
+    failed = []
+    for path, check, e in loaded:
+        if e is not None or not isinstance(check, dict):
+            failed.append((path, 'Failed to load: {}'.format(e or 'not a check definition')))
+        elif 'owning_team' not in check:
+            failed.append((path, 'Check definition must have "owning_team"'))
+        else:
+            checks.append((path, check))
+
+    if not skip_validation:
+        with Action('Validating check commands ...'):
+            results = client.validate_check_commands(check.get('command', '') for _, check in checks)
+
+        valid = []
+        for (path, check), result in zip(checks, results):
+            if not result.valid:
+                failed.append((path, 'Invalid check command: {}'.format(result)))
+            else:
+                valid.append((path, check))
+        checks = valid
+
+    with Action('Retrieving active check definitions ...'):
+        live = client.get_check_definitions()
+
+    by_id = {c['id']: c for c in live}
+    by_name = {(c.get('name'), c.get('owning_team')): c for c in live}
+
+    changed = []
+    for path, check in checks:
+        remote = by_id.get(check['id']) if check.get('id') else by_name.get((check.get('name'), check['owning_team']))
+        if is_changed(check, remote):
+            changed.append((path, check))
+
+    user = obj.config.get('user', 'unknown')
+
+    def _update(item):
+        path, check = item
+        check['last_modified_by'] = user
+        return client.update_check_definition(check, skip_validation=True)
+
+    updated = []
+    if changed and not dry_run:
+        with Action('Updating {} check definitions ...'.format(len(changed))):
+            results = run_concurrently(_update, changed, concurrency=concurrency)
+
+        for (path, _), check, e in results:
+            if e is None:
+                updated.append((path, check))
+            else:
+                failed.append((path, e))
+
+    for path, check in updated:
+        ok('{}: {}'.format(path, client.check_definition_url(check)))
+
+    if dry_run:
+        for path, _ in changed:
+            info('{}: changed'.format(path))
+
+    for path, e in failed:
+        error('{}: {}'.format(path, e))
+
+    summary = 'Checks: {} total, {} unchanged, {} {}, {} failed'.format(
+        len(paths), len(checks) - len(changed), len(changed) if dry_run else len(updated),
+        'changed' if dry_run else 'updated', len(failed))
+
+    if failed:
+        # non-zero exit status, e.g. for CI pipelines
+        fatal_error(summary)
+
+    info(summary)
+
+
 @check_definitions.command('delete')
 @click.argument('check_id', type=int)
 @click.pass_obj
@@ -1,18 +1,29 @@
 import click
+import json
+import hashlib
 import logging
 import os
+import time
+import threading
 
-from clickclick import AliasedGroup
+from collections import OrderedDict
+
+from clickclick import AliasedGroup, warning
 from easydict import EasyDict
 
 from zmon_cli import __version__
+from zmon_cli import daemon as zmon_daemon
 
-from zmon_cli.config import DEFAULT_CONFIG_FILE, DEFAULT_TIMEOUT
-from zmon_cli.config import get_config_data, configure_logging, set_config_file
+from zmon_cli.config import DEFAULT_CONFIG_FILE, DEFAULT_TIMEOUT, CHECK_COMMAND_CACHE_FILE
+from zmon_cli.config import get_config_data, configure_logging, set_config_file, get_cache_dir
 
-from zmon_cli.output import Output, render_status
+from zmon_cli.output import Output, render_status, render_status_watch
 
-from zmon_cli.client import Zmon
+from zmon_cli.client import Zmon, ZmonDeadlineExceeded, ZmonCircuitOpenError
+from zmon_cli.completion import DEFAULT_REFRESH_INTERVAL, refresh_in_background
+from zmon_cli.bulk import run_concurrently
+from zmon_cli.status_watch import StatusHistory, poll_status
+from zmon_cli.status_watch import DEFAULT_WATCH_INTERVAL, DEFAULT_HISTORY_SIZE, DEFAULT_STALL_AFTER
 
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
@@ -23,9 +34,64 @@ output_option = click.option('-o', '--output', type=click.Choice(['text', 'json'
 yaml_output_option = click.option('-o', '--output', type=click.Choice(['text', 'json', 'yaml']), default='yaml',
                                   help='Use alternative output format. Default is YAML.')
 
+# configuration keys never inherited by targets
+CREDENTIAL_KEYS = ('user', 'password', 'token')
+
+# abbreviations which must keep resolving, even though newer commands share their prefix
+COMMAND_ALIASES = {
+    'a': 'alert-definitions',
+    'e': 'entities',
+}
+
+# commands not triggering a background refresh of the completion cache
+NO_COMPLETION_REFRESH = ('completion', 'configure', 'daemon', 'help')
+
+# warm configuration and clients of "zmon daemon", mapping key to (expiry, value)
+_cache = {}
+_cache_ttl = 0
+_cache_lock = threading.Lock()
+
 pretty_json = click.option('--pretty', is_flag=True,
                            help='Pretty print JSON output. Ignored if output format is not JSON')
 
+targets_option = click.option('--targets', metavar='NAMES',
+                              help='Query ZMON deployments configured in "targets": comma separated names or "all".')
+
+
+class CliGroup(AliasedGroup):
+    """Aliased group with fixed abbreviations for backwards compatibility."""
+
+    def get_command(self, ctx, cmd_name):
+        return super().get_command(ctx, COMMAND_ALIASES.get(cmd_name, cmd_name))
+
+    def invoke(self, ctx):
+        try:
+            result = super().invoke(ctx)
+        except ZmonDeadlineExceeded as e:
+            # outstanding requests failed fast, partial results are already reported
+            raise click.ClickException('{} (--deadline {} sec)'.format(e, ctx.params.get('deadline')))
+        except ZmonCircuitOpenError as e:
+            # backend is failing, requests are not sent
+            raise click.ClickException(str(e))
+
+        failed = ctx.obj.get('failed_targets') if ctx.obj else None
+        if failed:
+            # partial results of other targets are already reported
+            raise click.ClickException('Targets failed: {}'.format(', '.join(failed)))
+
+        refresh_completion_cache(ctx)
+        return result
+
+
+def refresh_completion_cache(ctx):
+    """Refresh shell completion cache in the background, after a command succeeded in an interactive shell."""
+    config = ctx.obj.config if ctx.obj else {}
+    if ctx.invoked_subcommand in NO_COMPLETION_REFRESH or not config.get('url') or not zmon_daemon.is_interactive():
+        return
+
+    refresh_in_background(ctx.params.get('config_file') or DEFAULT_CONFIG_FILE,
+                          interval=config.get('completion_refresh_interval', DEFAULT_REFRESH_INTERVAL))
+
 
 def print_version(ctx, param, value):
     if not value or ctx.resilient_parsing:
@@ -34,44 +100,204 @@ def print_version(ctx, param, value):
     ctx.exit()
 
 
+def enable_cache(ttl) -> int:
+    """
+    Cache configuration and clients across CLI invocations for ``ttl`` seconds. Disabled if ``ttl`` is 0. Evicted
+    clients are closed.
+
+    :return: Previous cache TTL.
+    :rtype: int
+    """
+    global _cache_ttl
+
+    previous, _cache_ttl = _cache_ttl, ttl
+    if ttl <= 0:
+        with _cache_lock:
+            for _, value in _cache.values():
+                close_cached(value)
+            _cache.clear()
+
+    return previous
+
+
+def close_cached(value):
+    """Close evicted cache value, e.g. session and check command cache of a client."""
+    close = getattr(value, 'close', None)
+    if close is not None:
+        close()
+
+
+def cached(key, fn):
+    if _cache_ttl <= 0:
+        return fn()
+
+    with _cache_lock:
+        now = time.time()
+
+        # expired entries are evicted, not only replaced, as keys change with config and forwarded environment
+        for k, (expiry, value) in list(_cache.items()):
+            if expiry < now:
+                del _cache[k]
+                close_cached(value)
+
+        entry = _cache.get(key)
+        if entry is None:
+            entry = (now + _cache_ttl, fn())
+            _cache[key] = entry
+
+        return entry[1]
+
+
+def credentials_hash(*credentials) -> str:
+    """
+    Hash credentials, so cache keys do not hold them in plain text.
+
+    >>> credentials_hash('user', 'password') == credentials_hash('user', 'password')
+    True
+    """
+    return hashlib.sha256(json.dumps(credentials).encode('utf-8')).hexdigest()
+
+
 def get_client(config):
-    verify = config.get('verify', True)
+    # clients depend on forwarded environment of "zmon daemon", e.g. token, proxies and cache location
+    key = ('client', config.get('url'),
+           credentials_hash(config.get('user'), config.get('password'), config.get('token'),
+                            [os.environ.get(k) for k in zmon_daemon.FORWARDED_ENV]), config.get('verify', True),
+           config.get('timeout', DEFAULT_TIMEOUT), config.get('connect_timeout'), config.get('transport'),
+           json.dumps(config.get('circuit_breaker'), sort_keys=True), json.dumps(config.get('hedging'), sort_keys=True))
+
+    client = cached(key, lambda: create_client(config))
+    # deadline of this CLI invocation, clients are reused by "zmon daemon" and "zmon batch"
+    client.deadline_at = config.get('deadline')
+    return client
+
+
+def create_client(config):
+    kwargs = {
+        'verify': config.get('verify', True),
+        'timeout': config.get('timeout', DEFAULT_TIMEOUT),
+        'connect_timeout': config.get('connect_timeout'),
+        'check_command_cache': os.path.join(get_cache_dir(), CHECK_COMMAND_CACHE_FILE),
+        'transport': config.get('transport'),
+        'circuit_breaker': config.get('circuit_breaker'),
+        'hedging': config.get('hedging'),
+    }
 
     if 'user' in config and 'password' in config:
-        return Zmon(config['url'], username=config['user'], password=config['password'], verify=verify,
-                    timeout=config.get('timeout', DEFAULT_TIMEOUT))
+        return Zmon(config['url'], username=config['user'], password=config['password'], **kwargs)
     elif os.environ.get('ZMON_TOKEN'):
-        return Zmon(config['url'], token=os.environ.get('ZMON_TOKEN'), verify=verify,
-                    timeout=config.get('timeout', DEFAULT_TIMEOUT))
+        return Zmon(config['url'], token=os.environ.get('ZMON_TOKEN'), **kwargs)
     elif 'token' in config:
-        return Zmon(config['url'], token=config['token'], verify=verify, timeout=config.get('timeout', DEFAULT_TIMEOUT))
+        return Zmon(config['url'], token=config['token'], **kwargs)
 
     raise RuntimeError('Failed to intitialize ZMON client. Invalid configuration!')
 
 
+def get_target_configs(config, targets) -> OrderedDict:
+    """
+    Return client configuration per target. Targets inherit settings (e.g. timeout) they do not override, but never
+    credentials of other deployments: every target configures its own ``token`` or ``user`` and ``password``, unless
+    ``ZMON_TOKEN`` is set.
+
+    >>> get_target_configs({'url': 'a', 'token': 't', 'timeout': 5, 'targets': {'eu': {'url': 'b', 'user': 'u',
+    ...                                                                                'password': 'p'}}}, 'all')
+    OrderedDict([('eu', {'url': 'b', 'timeout': 5, 'user': 'u', 'password': 'p'})])
+    """
+    available = config.get('targets') or {}
+    if not available:
+        raise click.UsageError('No "targets" configured in config file')
+
+    if targets == 'all':
+        names = sorted(available)
+    else:
+        names = [name.strip() for name in targets.split(',') if name.strip()]
+
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise click.UsageError('Unknown targets: {}'.format(', '.join(unknown)))
+
+    base = {k: v for k, v in config.items() if k != 'targets' and k not in CREDENTIAL_KEYS}
+
+    result = OrderedDict()
+    for name in names:
+        target = dict(base, **(available[name] or {}))
+        if not target.get('url'):
+            raise click.UsageError('Target "{}" is improperly configured: key "url" is missing'.format(name))
+        if not ('token' in target or ('user' in target and 'password' in target) or os.environ.get('ZMON_TOKEN')):
+            raise click.UsageError(
+                'Target "{}" is improperly configured: key "token" or "user" and "password" missing'.format(name))
+        result[name] = target
+
+    return result
+
+
+def query_targets(config, targets, fn) -> list:
+    """
+    Call ``fn`` with a client for every target, concurrently. Failing targets are reported and skipped, and recorded
+    as ``failed_targets`` of the CLI context object, so the command exits with an error after its partial output.
+
+    :return: List of ``(target, result)`` tuples, in target order.
+    :rtype: list
+    """
+    clients = [(name, get_client(c)) for name, c in get_target_configs(config, targets).items()]
+
+    results = []
+    failed = []
+    for (name, _), result, e in run_concurrently(lambda item: fn(item[1]), clients, concurrency=len(clients)):
+        if e is not None:
+            warning('Target {} failed: {}'.format(name, e), err=True)
+            failed.append(name)
+        else:
+            results.append((name, result))
+
+    ctx = click.get_current_context(silent=True)
+    if failed and ctx is not None and ctx.obj is not None:
+        ctx.obj.setdefault('failed_targets', []).extend(failed)
+
+    return results
+
+
+def tag_targets(results) -> list:
+    """
+    Merge list results of :func:`query_targets`, tagging every item with its target.
+
+    >>> tag_targets([('eu', [{'id': 1}]), ('us', [{'id': 1}, {'id': 2}])])
+    [{'id': 1, 'target': 'eu'}, {'id': 1, 'target': 'us'}, {'id': 2, 'target': 'us'}]
+    """
+    return [dict(item, target=target) for target, items in results for item in items]
+
+
 ########################################################################################################################
 # CLI
 ########################################################################################################################
 
-@click.group(cls=AliasedGroup, context_settings=CONTEXT_SETTINGS)
+@click.group(cls=CliGroup, context_settings=CONTEXT_SETTINGS)
 @click.option('-c', '--config-file', help='Use alternative config file', default=DEFAULT_CONFIG_FILE, metavar='PATH')
 @click.option('-v', '--verbose', help='Verbose logging', is_flag=True)
 @click.option('-V', '--version', is_flag=True, callback=print_version, expose_value=False, is_eager=True)
 @click.option('-t', '--timeout', help='timeout for calls', default=DEFAULT_TIMEOUT)
+@click.option('--connect-timeout', type=float, help='Connect timeout for calls. Default is the timeout for calls.')
+@click.option('--deadline', type=float, metavar='SECONDS',
+              help='Time limit for all calls of the command, remaining calls fail once it expires.')
 @click.pass_context
-def cli(ctx, config_file, verbose, timeout=DEFAULT_TIMEOUT):
+def cli(ctx, config_file, verbose, timeout=DEFAULT_TIMEOUT, connect_timeout=None, deadline=None):
     """
     ZMON command line interface
     """
-    configure_logging(logging.DEBUG if verbose else logging.INFO)
-
     fn = os.path.expanduser(config_file)
     config = {}
 
     if os.path.exists(fn):
-        config = get_config_data(config_file)
+        config = dict(cached(('config', fn, os.path.getmtime(fn)), lambda: get_config_data(config_file)))
+
+    configure_logging(logging.DEBUG if verbose else logging.INFO, config)
 
     config['timeout'] = timeout
+    if connect_timeout is not None:
+        config['connect_timeout'] = connect_timeout
+
+    # absolute time.monotonic() deadline, inherited by targets and batch operations
+    config['deadline'] = time.monotonic() + deadline if deadline else None
 
     ctx.obj = EasyDict(config=config)
 
@@ -85,13 +311,43 @@ def configure(obj, config_file):
 
 
 @cli.command()
+@click.option('-w', '--watch', is_flag=True,
+              help='Poll status, showing queue drain rates, worker throughput and stalled workers.')
+@click.option('--interval', type=float, default=DEFAULT_WATCH_INTERVAL, show_default=True,
+              help='Seconds between polls with --watch.')
+@click.option('--count', type=int, default=0, help='Stop after COUNT polls with --watch. Default is to poll until '
+              'interrupted.')
+@click.option('--history', 'history_size', type=int, default=DEFAULT_HISTORY_SIZE, show_default=True,
+              help='Samples kept to compute rates with --watch.')
+@click.option('--stall-after', type=float, default=DEFAULT_STALL_AFTER, show_default=True,
+              help='Seconds without new check invocations, after which a worker is stalled.')
 @click.pass_obj
 @output_option
 @pretty_json
-def status(obj, output, pretty):
-    """Check ZMON system status"""
+def status(obj, watch, interval, count, history_size, stall_after, output, pretty):
+    """
+    Check ZMON system status
+
+    With --watch, the status is polled and updated in place. JSON and YAML output is written once per poll.
+    """
+    if watch and zmon_daemon.serving:
+        # polls until interrupted, which would block the daemon
+        raise zmon_daemon.ForwardingUnsupported('status --watch')
+
     client = get_client(obj.config)
 
+    if watch:
+        out = Output('', output=output, pretty_json=pretty, printer=render_status_watch)
+        try:
+            for history in poll_status(client, StatusHistory(size=history_size), interval=interval, count=count):
+                if output == 'text':
+                    # no-op, if not a terminal
+                    click.clear()
+                out.echo(history.summary(stall_after=stall_after))
+        except KeyboardInterrupt:
+            pass
+        return
+
     with Output('Retrieving status ...', printer=render_status, output=output, pretty_json=pretty) as act:
         status = client.status()
         act.echo(status)
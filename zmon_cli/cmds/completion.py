@@ -0,0 +1,29 @@
+import click
+
+from clickclick import AliasedGroup, Action, ok
+
+from zmon_cli import completion as zmon_completion
+from zmon_cli.cmds.command import cli, get_client
+
+
+@cli.group('completion', cls=AliasedGroup)
+def completion():
+    """Manage local cache of shell completion"""
+    pass
+
+
+@completion.command('refresh')
+@click.pass_obj
+def refresh(obj):
+    """
+    Refresh shell completion cache of IDs and team names
+
+    The cache is refreshed in the background after commands run in an interactive shell, at most every
+    "completion_refresh_interval" seconds (default is one hour, 0 disables).
+    """
+    client = get_client(obj.config)
+
+    with Action('Refreshing completion cache in {} ...'.format(zmon_completion.get_completion_dir())):
+        stats = zmon_completion.refresh(client)
+
+    ok(', '.join('{} {}'.format(stats[kind], kind) for kind in zmon_completion.COMPLETION_KINDS))
@@ -0,0 +1,79 @@
+import sys
+import time
+import subprocess
+
+import click
+
+from clickclick import AliasedGroup, Action, ok, info, fatal_error
+
+from zmon_cli import daemon as zmon_daemon
+from zmon_cli.cmds.command import cli
+
+
+@cli.group('daemon', cls=AliasedGroup)
+def daemon():
+    """Manage local daemon serving CLI invocations"""
+    if zmon_daemon.serving:
+        # never run daemon management commands within the daemon itself
+        raise zmon_daemon.ForwardingUnsupported('daemon command')
+
+
+@daemon.command('start')
+@click.option('-b', '--background', is_flag=True, help='Run daemon in background.')
+@click.option('--socket', 'socket_path', metavar='PATH', help='Daemon socket path.')
+@click.option('--idle-timeout', type=int, default=zmon_daemon.DEFAULT_IDLE_TIMEOUT, show_default=True,
+              help='Stop daemon after idling for this many seconds. Set 0 to never stop.')
+@click.option('--cache-ttl', type=int, default=zmon_daemon.DEFAULT_CACHE_TTL, show_default=True,
+              help='Seconds to keep configuration, tokens and client sessions.')
+def start(background, socket_path, idle_timeout, cache_ttl):
+    """
+    Start daemon
+
+    Subsequent "zmon" invocations are forwarded to the daemon, reusing its warm configuration, tokens and HTTP
+    sessions. Interactive commands, commands reading stdin and "zmon status --watch" always run in the calling
+    process.
+    """
+    socket_path = socket_path or zmon_daemon.get_socket_path()
+
+    if not background:
+        try:
+            zmon_daemon.serve(socket_path, idle_timeout=idle_timeout, cache_ttl=cache_ttl)
+        except RuntimeError as e:
+            fatal_error(str(e))
+        return
+
+    args = [sys.executable, '-c', 'from zmon_cli.main import main; main()', 'daemon', 'start',
+            '--socket', socket_path, '--idle-timeout', str(idle_timeout), '--cache-ttl', str(cache_ttl)]
+
+    with Action('Starting ZMON CLI daemon ...') as act:
+        subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+
+        for _ in range(50):
+            if zmon_daemon.request({'command': 'status'}, path=socket_path):
+                break
+            time.sleep(0.1)
+        else:
+            act.fatal_error('daemon did not start')
+
+
+@daemon.command('stop')
+@click.option('--socket', 'socket_path', metavar='PATH', help='Daemon socket path.')
+def stop(socket_path):
+    """Stop daemon"""
+    if zmon_daemon.request({'command': 'stop'}, path=socket_path) is None:
+        info('ZMON CLI daemon is not running')
+    else:
+        ok('ZMON CLI daemon stopped')
+
+
+@daemon.command('status')
+@click.option('--socket', 'socket_path', metavar='PATH', help='Daemon socket path.')
+def status(socket_path):
+    """Show daemon status"""
+    response = zmon_daemon.request({'command': 'status'}, path=socket_path)
+    if response is None:
+        info('ZMON CLI daemon is not running')
+    else:
+        ok('ZMON CLI daemon running with PID {pid}, up {uptime:.0f} seconds, served {served} commands'.format(
+            **response))
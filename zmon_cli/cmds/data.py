@@ -1,6 +1,7 @@
 import click
 
 from zmon_cli.cmds.command import cli, get_client, yaml_output_option, pretty_json
+from zmon_cli.cmds.command import targets_option, query_targets
 from zmon_cli.output import Output
 
 
@@ -8,13 +9,12 @@ from zmon_cli.output import Output
 @click.argument('alert_id')
 @click.argument('entity_ids', nargs=-1)
 @click.pass_obj
+@targets_option
 @yaml_output_option
 @pretty_json
-def data(obj, alert_id, entity_ids, output, pretty):
+def data(obj, alert_id, entity_ids, targets, output, pretty):
     """Get check data for alert and entities"""
-    client = get_client(obj.config)
-
-    with Output('Retrieving alert data ...', nl=True, output=output, pretty_json=pretty) as act:
+    def _values(client):
         data = client.get_alert_data(alert_id)
 
         if not entity_ids:
@@ -22,6 +22,15 @@ def data(obj, alert_id, entity_ids, output, pretty):
         else:
             result = [d for d in data if d['entity'] in entity_ids]
 
-        values = {v['entity']: v['results'][0]['value'] for v in result if len(v['results'])}
+        return {v['entity']: v['results'][0]['value'] for v in result if len(v['results'])}
+
+    client = None if targets else get_client(obj.config)
+
+    with Output('Retrieving alert data ...', nl=True, output=output, pretty_json=pretty) as act:
+        if targets:
+            # alert data keyed by target
+            values = dict(query_targets(obj.config, targets, _values))
+        else:
+            values = _values(client)
 
         act.echo(values)
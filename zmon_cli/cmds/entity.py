@@ -1,19 +1,56 @@
 import os
 import json
-import yaml
+import time
 
 import requests
 import click
 
-from clickclick import AliasedGroup, Action, action, ok, fatal_error
+from clickclick import AliasedGroup, Action, action, ok, error, fatal_error
 
 from zmon_cli.cmds.command import cli, get_client, output_option, yaml_output_option, pretty_json
+from zmon_cli.cmds.command import targets_option, query_targets, tag_targets
 from zmon_cli.output import render_entities, Output, log_http_exception
 
-from zmon_cli.client import ZmonArgumentError
+from zmon_cli.client import ZmonArgumentError, DEFAULT_PAGE_SIZE
+from zmon_cli.config import get_cache_dir
+from zmon_cli.mirror import EntityMirror, ENTITY_MIRROR_FILE
+from zmon_cli.entity_filter import EntityIndex
+from zmon_cli.bulk import DEFAULT_CONCURRENCY, chunked, run_concurrently
+from zmon_cli.records import spool_input, iter_input
 
 from calendar import timegm
 from time import strptime
+from concurrent.futures import ProcessPoolExecutor
+
+
+# entities read, validated and pushed at a time, bounding memory usage for large input
+PUSH_CHUNK_SIZE = 10000
+
+
+def get_entity_mirror(config):
+    path = config.get('entity_mirror') or os.path.join(get_cache_dir(), ENTITY_MIRROR_FILE)
+    return EntityMirror(os.path.expanduser(path))
+
+
+def get_entity_index(client, config, offline=False) -> EntityIndex:
+    """Index all entities, retrieved from ZMON or from the local entity mirror, to match entity filters locally."""
+    if offline:
+        with get_entity_mirror(config) as mirror:
+            if mirror.last_sync is None:
+                raise ZmonArgumentError('Local entity mirror is empty: run "zmon entities mirror" first!')
+            return EntityIndex(mirror.query())
+
+    return EntityIndex(client.get_entities(models=True))
+
+
+def entity_matches(definition, index, positions, with_ids=False) -> dict:
+    """Summarize entities matched by a check or alert definition: match count, and optionally entity IDs."""
+    result = {'id': definition['id'], 'name': definition.get('name'), 'matched': len(positions)}
+    if 'check_definition_id' in definition:
+        result['check_definition_id'] = definition['check_definition_id']
+    if with_ids:
+        result['entities'] = index.entity_ids(positions)
+    return result
 
 
 def entity_last_modified(e):
@@ -28,46 +65,70 @@ def entity_last_modified(e):
 ########################################################################################################################
 
 @cli.group('entities', cls=AliasedGroup, invoke_without_command=True)
+@click.option('--page-size', type=click.IntRange(0), default=DEFAULT_PAGE_SIZE, show_default=True,
+              help='Retrieve entities in pages of this size (0 to disable paging).')
 @click.pass_context
+@targets_option
 @output_option
 @pretty_json
-def entities(ctx, output, pretty):
+def entities(ctx, page_size, targets, output, pretty):
     """Manage entities"""
     if not ctx.invoked_subcommand:
-        client = get_client(ctx.obj.config)
+        client = None if targets else get_client(ctx.obj.config)
 
         with Output('Retrieving all entities ...', output=output, printer=render_entities, pretty_json=pretty) as act:
-            entities = client.get_entities()
+            if targets:
+                entities = tag_targets(query_targets(ctx.obj.config, targets, lambda c: c.get_entities(models=True)))
+            else:
+                # consumed while further pages are retrieved
+                entities = client.iter_entities(page_size=page_size, models=True)
             act.echo(entities)
 
 
 @entities.command('get')
 @click.argument('entity_id')
 @click.pass_obj
+@targets_option
 @yaml_output_option
 @pretty_json
-def get_entity(obj, entity_id, output, pretty):
-    """Get a single entity by ID"""
-    client = get_client(obj.config)
+def get_entity(obj, entity_id, targets, output, pretty):
+    """
+    Get a single entity by ID
+
+    With --targets, all entities with this ID are listed, tagged with their target.
+    """
+    def _get(client):
+        try:
+            return [client.get_entity(entity_id)]
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return []
+            raise
+
+    client = None if targets else get_client(obj.config)
 
     with Output('Retrieving entity {} ...'.format(entity_id), nl=True, output=output, pretty_json=pretty) as act:
-        entity = client.get_entity(entity_id)
+        if targets:
+            entity = tag_targets(query_targets(obj.config, targets, _get))
+        else:
+            entity = client.get_entity(entity_id)
         act.echo(entity)
 
 
 @entities.command('filter')
 @click.argument('filters', nargs=-1)
 @click.pass_obj
+@targets_option
 @output_option
 @pretty_json
-def filter_entities(obj, filters, output, pretty):
+def filter_entities(obj, filters, targets, output, pretty):
     """
     List entities filtered by key values pairs
 
     E.g.:
         zmon entities filter type instance application_id my-app
     """
-    client = get_client(obj.config)
+    client = None if targets else get_client(obj.config)
 
     if len(filters) % 2:
         fatal_error('Invalid filters count: expected even number of args!')
@@ -77,40 +138,158 @@ def filter_entities(obj, filters, output, pretty):
 
         query = dict(zip(filters[0::2], filters[1::2]))
 
-        entities = client.get_entities(query=query)
+        if targets:
+            entities = tag_targets(
+                query_targets(obj.config, targets, lambda c: c.get_entities(query=query, models=True)))
+        else:
+            entities = client.get_entities(query=query, models=True)
         entities = sorted(entities, key=entity_last_modified)
 
         act.echo(entities)
 
 
-@entities.command('push')
-@click.argument('entity')
+@entities.command('mirror')
+@click.option('-i', '--index', 'indexes', multiple=True, metavar='ATTRIBUTE',
+              help='Index entity attribute for faster queries. Can be used multiple times.')
 @click.pass_obj
-def push_entity(obj, entity):
-    """Push one or more entities"""
+def mirror_entities(obj, indexes):
+    """
+    Sync all entities into local mirror
+
+    Local mirror is used by "zmon entities query".
+    """
     client = get_client(obj.config)
 
-    if (entity.endswith('.json') or entity.endswith('.yaml')) and os.path.exists(entity):
-        with open(entity, 'rb') as fd:
-            data = yaml.safe_load(fd)
-    else:
-        data = json.loads(entity)
+    with get_entity_mirror(obj.config) as mirror:
+        indexes = list(indexes) + list(obj.config.get('entity_mirror_indexes', []))
+        if indexes:
+            with Action('Indexing entity attributes: {} ...'.format(', '.join(indexes))):
+                mirror.add_indexes(indexes)
+
+        with Action('Retrieving all entities ...'):
+            timestamp = time.time()
+            entities = client.get_entities()
+
+        with Action('Syncing {} entities into {} ...'.format(len(entities), mirror.path)):
+            stats = mirror.sync(entities, timestamp=timestamp)
+
+        ok('{added} added, {updated} updated, {deleted} deleted, {unchanged} unchanged'.format(**stats))
+
+
+@entities.command('query')
+@click.argument('filters', nargs=-1)
+@click.pass_obj
+@output_option
+@pretty_json
+def query_entities(obj, filters, output, pretty):
+    """
+    List entities from local mirror filtered by key values pairs
 
-    if not isinstance(data, list):
-        data = [data]
+    Run "zmon entities mirror" first, to sync the local mirror.
 
-    with Action('Creating new entities ...', nl=True) as act:
-        for e in data:
-            action('Creating entity {} ...'.format(e['id']))
+    E.g.:
+        zmon entities query type instance application_id my-app
+    """
+    if len(filters) % 2:
+        fatal_error('Invalid filters count: expected even number of args!')
+
+    with get_entity_mirror(obj.config) as mirror:
+        if mirror.last_sync is None:
+            fatal_error('Local entity mirror is empty: run "zmon entities mirror" first!')
+
+        with Output('Querying local entities ...', nl=True, output=output, printer=render_entities,
+                    pretty_json=pretty) as act:
+            query = dict(zip(filters[0::2], filters[1::2]))
+
+            entities = mirror.query(query)
+            entities = sorted(entities, key=entity_last_modified)
+
+            act.echo(entities)
+
+
+def push_entities(client, read_records, fix_ids=False, skip_invalid=False, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Validate all entities, then push the valid ones. Input is read twice in chunks, so only a chunk of streamed input is
+    held in memory, and no entity is pushed if input is invalid.
+
+    :param read_records: Callable returning a new iterable of input records on every call.
+    """
+    # validation process pool is shared by all chunks and both passes
+    with ProcessPoolExecutor() as executor:
+        # first pass only keeps IDs (to find duplicates) and errors
+        seen = {}
+        errors = []
+        start = 0
+        with Action('Validating entities ...') as act:
             try:
-                client.add_entity(e)
-                ok()
+                for chunk in chunked(read_records(), PUSH_CHUNK_SIZE):
+                    _, chunk_errors = client.validate_entities(
+                        chunk, fix_ids=fix_ids, start=start, seen=seen, executor=executor)
+                    errors.extend(chunk_errors)
+                    start += len(chunk)
             except ZmonArgumentError as e:
-                act.error(str(e))
-            except requests.HTTPError as e:
-                log_http_exception(e, act)
-            except Exception as e:
-                act.error('Failed: {}'.format(str(e)))
+                act.fatal_error(str(e))
+
+            if errors:
+                act.error('{} of {} invalid'.format(len(errors), start))
+
+        for e in errors:
+            error('Invalid entity {}'.format(e))
+
+        if errors and not skip_invalid:
+            fatal_error('{} invalid entities, no entities pushed (use --skip-invalid to push valid entities)'.format(
+                len(errors)))
+
+        seen = {}
+        start = pushed = 0
+        with Action('Creating new entities ...', nl=True) as act:
+            for chunk in chunked(read_records(), PUSH_CHUNK_SIZE):
+                valid, _ = client.validate_entities(chunk, fix_ids=fix_ids, start=start, seen=seen, executor=executor)
+                start += len(chunk)
+
+                for e, _, exc in run_concurrently(client.add_entity, valid, concurrency=concurrency):
+                    action('Creating entity {} ...'.format(e['id']))
+                    if exc is None:
+                        pushed += 1
+                        ok()
+                    elif isinstance(exc, ZmonArgumentError):
+                        act.error(str(exc))
+                    elif isinstance(exc, requests.HTTPError):
+                        log_http_exception(exc, act)
+                    else:
+                        act.error('Failed: {}'.format(str(exc)))
+
+    return pushed
+
+
+@entities.command('push')
+@click.argument('entity')
+@click.option('--fix-ids', is_flag=True, help='Normalize invalid entity IDs instead of rejecting them.')
+@click.option('--skip-invalid', is_flag=True, help='Push valid entities, even if some entities are invalid.')
+@click.option('-j', '--concurrency', type=click.IntRange(1, 64), default=DEFAULT_CONCURRENCY, show_default=True,
+              help='Number of concurrent requests.')
+@click.pass_obj
+def push_entity(obj, entity, fix_ids, skip_invalid, concurrency):
+    """
+    Push one or more entities
+
+    ENTITY is an entity JSON, or a JSON, NDJSON or (multi-document) YAML file, optionally gzip-compressed. Use "-" to
+    read from stdin.
+
+    All entities are validated before any entity is pushed: required fields, entity IDs, duplicate IDs and JSON
+    serialization. Input is read incrementally, in chunks of 10000 entities, once for validation and once for pushing.
+    Stdin is copied to a temporary file to be read twice.
+    """
+    client = get_client(obj.config)
+
+    if entity == '-' or os.path.exists(entity):
+        with spool_input(entity) as path:
+            push_entities(client, lambda: iter_input(path), fix_ids=fix_ids, skip_invalid=skip_invalid,
+                          concurrency=concurrency)
+    else:
+        data = json.loads(entity)
+        entities = data if isinstance(data, list) else [data]
+        push_entities(client, lambda: entities, fix_ids=fix_ids, skip_invalid=skip_invalid, concurrency=concurrency)
 
 
 @entities.command('delete')
@@ -0,0 +1,193 @@
+import os
+import json
+
+import click
+import requests
+
+from clickclick import Action, info, error, fatal_error
+
+from zmon_cli.cmds.command import cli, get_client
+from zmon_cli.output import dump_yaml, log_http_exception
+from zmon_cli.bulk import DEFAULT_CONCURRENCY, DEFAULT_LISTING_LIMIT, run_concurrently
+
+
+EXPORT_MANIFEST = '.zmon-export.json'
+
+CHECKS = 'check-definitions'
+ALERTS = 'alert-definitions'
+DASHBOARDS = 'dashboards'
+GRAFANA = 'grafana'
+ENTITIES = 'entities'
+
+EXPORT_KINDS = (CHECKS, ALERTS, DASHBOARDS, GRAFANA, ENTITIES)
+
+
+def strip_none(obj):
+    if isinstance(obj, dict):
+        return {k: v for k, v in obj.items() if v is not None}
+    return obj
+
+
+def export_path(directory, kind, obj_id):
+    return os.path.join(directory, kind, '{}.yaml'.format(obj_id))
+
+
+def write_export_file(path, data):
+    tmp = '{}.tmp'.format(path)
+    with open(tmp, 'wb') as fd:
+        fd.write(dump_yaml(data).encode('utf-8'))
+    os.replace(tmp, path)
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, EXPORT_MANIFEST)) as fd:
+            return json.load(fd)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(directory, manifest):
+    path = os.path.join(directory, EXPORT_MANIFEST)
+    with open('{}.tmp'.format(path), 'w') as fd:
+        json.dump(manifest, fd, indent=4, sort_keys=True)
+    os.replace('{}.tmp'.format(path), path)
+
+
+def list_export_objects(client, search_limit=DEFAULT_LISTING_LIMIT) -> list:
+    """
+    List all objects to export.
+
+    :return: List of ``(kind, id, last_modified, data)`` tuples. ``data`` is ``None`` if details must be fetched.
+    :rtype: list
+    """
+    listings = run_concurrently(lambda get: get(), [
+        client.get_check_definitions,
+        client.get_alert_definitions,
+        lambda: client.search('', limit=search_limit),
+        client.get_entities,
+    ])
+
+    for _, _, e in listings:
+        if e is not None:
+            raise e
+
+    (_, checks, _), (_, alerts, _), (_, search, _), (_, entities, _) = listings
+
+    objects = []
+    objects.extend((CHECKS, c['id'], c.get('last_modified'), None) for c in checks)
+    objects.extend((ALERTS, a['id'], a.get('last_modified'), None) for a in alerts)
+    # search results carry no modification time, dashboards are always fetched
+    objects.extend((DASHBOARDS, d['id'], None, None) for d in search.get('dashboards', []))
+    objects.extend((GRAFANA, d['id'], None, None) for d in search.get('grafana_dashboards', []))
+    # entities listing is complete already
+    objects.extend((ENTITIES, e['id'], e.get('last_modified'), e) for e in entities)
+
+    return objects
+
+
+########################################################################################################################
+# EXPORT
+########################################################################################################################
+
+@cli.command('export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('-i', '--incremental', is_flag=True,
+              help='Only fetch objects modified since previous export into the same directory.')
+@click.option('-k', '--kind', 'kinds', multiple=True, type=click.Choice(EXPORT_KINDS),
+              help='Only export objects of this kind. Can be used multiple times. Default is all.')
+@click.option('--search-limit', type=int, default=DEFAULT_LISTING_LIMIT, show_default=True,
+              help='Maximum number of (grafana) dashboards to list.')
+@click.option('-j', '--concurrency', type=click.IntRange(1, 64), default=DEFAULT_CONCURRENCY, show_default=True,
+              help='Number of concurrent requests.')
+@click.pass_obj
+def export(obj, directory, incremental, kinds, search_limit, concurrency):
+    """
+    Export ZMON configuration into a directory
+
+    Checks, alerts, dashboards, grafana dashboards and entities are written as one YAML file per object.
+    """
+    client = get_client(obj.config)
+
+    kinds = kinds or EXPORT_KINDS
+
+    fetch = {
+        CHECKS: client.get_check_definition,
+        ALERTS: client.get_alert_definition,
+        DASHBOARDS: client.get_dashboard,
+        GRAFANA: client.get_grafana_dashboard,
+    }
+
+    for kind in kinds:
+        os.makedirs(os.path.join(directory, kind), exist_ok=True)
+
+    # manifest entries of kinds not exported this time are kept
+    existing = read_manifest(directory)
+    previous = existing if incremental else {}
+
+    with Action('Listing ZMON configuration ...') as act:
+        try:
+            objects = [o for o in list_export_objects(client, search_limit=search_limit) if o[0] in kinds]
+        except requests.RequestException as e:
+            log_http_exception(e, act)
+            act.fatal_error('Listing failed, nothing exported')
+
+    manifest = {kind: {} for kind in kinds}
+    pending = []
+    skipped = 0
+
+    for kind, obj_id, last_modified, data in objects:
+        key = str(obj_id)
+        path = export_path(directory, kind, obj_id)
+
+        if (last_modified is not None and previous.get(kind, {}).get(key) == last_modified and
+                os.path.exists(path)):
+            manifest[kind][key] = last_modified
+            skipped += 1
+        else:
+            pending.append((kind, obj_id, last_modified, data))
+
+    def _export(item):
+        kind, obj_id, last_modified, data = item
+        if data is None:
+            data = fetch[kind](obj_id)
+        write_export_file(export_path(directory, kind, obj_id), strip_none(data))
+
+    with Action('Exporting {} objects ...'.format(len(pending))):
+        results = run_concurrently(_export, pending, concurrency=concurrency)
+
+    failed = 0
+    for (kind, obj_id, last_modified, _), _, e in results:
+        key = str(obj_id)
+        if e is None:
+            manifest[kind][key] = last_modified
+        else:
+            failed += 1
+            error('{}/{}: {}'.format(kind, obj_id, e))
+            # keep previous export of the object, its modification time differs and it is fetched again next time
+            if key in previous.get(kind, {}):
+                manifest[kind][key] = previous[kind][key]
+
+    # remove files of objects, which are not listed anymore
+    listed = {kind: set() for kind in kinds}
+    for kind, obj_id, _, _ in objects:
+        listed[kind].add(str(obj_id))
+
+    removed = 0
+    for kind in kinds:
+        for key in set(previous.get(kind, {})) - listed[kind]:
+            try:
+                os.remove(export_path(directory, kind, key))
+                removed += 1
+            except OSError:
+                pass
+
+    write_manifest(directory, dict(existing, **manifest))
+
+    summary = 'Exported {} objects: {} fetched, {} unchanged, {} removed, {} failed'.format(
+        len(objects), len(pending) - failed, skipped, removed, failed)
+
+    if failed:
+        fatal_error(summary)
+    else:
+        info(summary)
@@ -1,12 +1,47 @@
 import yaml
 
 import click
+import requests
 
-from clickclick import AliasedGroup, Action, ok
+from clickclick import AliasedGroup, Action, ok, info, error, fatal_error
 
 from zmon_cli.cmds.command import cli, get_client, yaml_output_option, pretty_json
 from zmon_cli.output import Output
 from zmon_cli.client import ZmonArgumentError
+from zmon_cli.bulk import DEFAULT_CONCURRENCY, find_definition_files, load_yaml_file, run_concurrently, is_changed
+
+
+GRAFANA_DASHBOARD_FILE_EXTENSIONS = ('.yaml', '.yml', '.json')
+
+# dashboard attributes maintained by Grafana, which should never trigger an update
+GRAFANA_VOLATILE_FIELDS = set(['id', 'version', 'iteration', 'created', 'updated'])
+
+
+def is_grafana_dashboard_changed(local: dict, remote: dict) -> bool:
+    """
+    Compare local Grafana dashboard against its remote counterpart. Only the ``dashboard`` itself is compared, without
+    volatile attributes and ``meta`` data. Attributes added by Grafana (e.g. ``schemaVersion``) are ignored, if not
+    present locally.
+
+    >>> remote = {'dashboard': {'uid': 'a', 'title': 'A', 'version': 3, 'schemaVersion': 16}, 'meta': {'slug': 'a'}}
+    >>> is_grafana_dashboard_changed({'dashboard': {'uid': 'a', 'title': 'A'}}, remote)
+    False
+    >>> is_grafana_dashboard_changed({'dashboard': {'uid': 'a', 'title': 'B'}}, remote)
+    True
+    """
+    if remote is None:
+        return True
+
+    return is_changed(local.get('dashboard') or {}, remote.get('dashboard') or {}, exclude=GRAFANA_VOLATILE_FIELDS)
+
+
+def get_existing_grafana_dashboard(client, uid):
+    try:
+        return client.get_grafana_dashboard(uid)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
 
 
 @cli.group('grafana', cls=AliasedGroup)
@@ -49,6 +84,77 @@ def grafana_update(obj, yaml_file):
             act.error(e)
 
 
+@grafana.command('sync')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--dry-run', is_flag=True, help='Only report changed dashboards, do not update.')
+@click.option('-j', '--concurrency', type=click.IntRange(1, 64), default=DEFAULT_CONCURRENCY, show_default=True,
+              help='Number of concurrent requests.')
+@click.pass_obj
+def grafana_sync(obj, directory, dry_run, concurrency):
+    """Create/Update all changed ZMON dashboards in a directory"""
+    client = get_client(obj.config)
+
+    paths = find_definition_files(directory, extensions=GRAFANA_DASHBOARD_FILE_EXTENSIONS)
+
+    with Action('Loading {} dashboard files ...'.format(len(paths))):
+        loaded = run_concurrently(load_yaml_file, paths, concurrency=concurrency)
+
+    dashboards = []
+    failed = []
+    for path, dashboard, e in loaded:
+        if e is not None or not isinstance(dashboard, dict) or not isinstance(dashboard.get('dashboard'), dict):
+            failed.append((path, 'Failed to load: {}'.format(e or 'not a grafana dashboard')))
+        elif not dashboard['dashboard'].get('uid'):
+            failed.append((path, 'Grafana dashboard must have "uid". Hint: Use Grafana6 dashboard format.'))
+        else:
+            dashboards.append((path, dashboard))
+
+    with Action('Retrieving {} existing dashboards ...'.format(len(dashboards))):
+        existing = run_concurrently(lambda item: get_existing_grafana_dashboard(client, item[1]['dashboard']['uid']),
+                                    dashboards, concurrency=concurrency)
+
+    changed = []
+    unchanged = 0
+    for item, remote, e in existing:
+        if e is not None:
+            failed.append((item[0], e))
+        elif is_grafana_dashboard_changed(item[1], remote):
+            changed.append(item)
+        else:
+            unchanged += 1
+
+    updated = []
+    if changed and not dry_run:
+        with Action('Updating {} dashboards ...'.format(len(changed))):
+            results = run_concurrently(lambda item: client.update_grafana_dashboard(item[1]), changed,
+                                       concurrency=concurrency)
+
+        for (path, dashboard), _, e in results:
+            if e is None:
+                updated.append((path, dashboard))
+            else:
+                failed.append((path, e))
+
+    for path, dashboard in updated:
+        ok('{}: {}'.format(path, client.grafana_dashboard_url({'id': dashboard['dashboard']['uid']})))
+
+    if dry_run:
+        for path, _ in changed:
+            info('{}: changed'.format(path))
+
+    for path, e in failed:
+        error('{}: {}'.format(path, e))
+
+    summary = 'Dashboards: {} total, {} unchanged, {} {}, {} failed'.format(
+        len(paths), unchanged, len(changed) if dry_run else len(updated),
+        'changed' if dry_run else 'updated', len(failed))
+
+    if failed:
+        fatal_error(summary)
+    else:
+        info(summary)
+
+
 @grafana.command('help')
 @click.pass_context
 def help(ctx):
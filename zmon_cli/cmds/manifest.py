@@ -0,0 +1,171 @@
+import yaml
+
+import click
+
+from clickclick import Action, ok, info, error, fatal_error
+
+from zmon_cli.cmds.command import cli, get_client
+from zmon_cli.client import ZmonArgumentError
+from zmon_cli.bulk import DEFAULT_CONCURRENCY, run_concurrently, run_graph, is_changed
+
+
+def check_key(ref):
+    return 'check:{}'.format(ref)
+
+
+def alert_key(index):
+    return 'alert:{}'.format(index)
+
+
+def find_check(check, by_id, by_name):
+    if check.get('id'):
+        return by_id.get(check['id'])
+    return by_name.get((check.get('name'), check.get('owning_team')))
+
+
+def find_alert(alert, by_id, by_name):
+    if alert.get('id'):
+        return by_id.get(alert['id'])
+    return by_name.get((alert.get('name'), alert.get('check_definition_id')))
+
+
+########################################################################################################################
+# MANIFEST
+########################################################################################################################
+
+@cli.command('apply')
+@click.argument('manifest', type=click.File('rb'))
+@click.option('--skip-validation', is_flag=True, help='Skip check command syntax validation.')
+@click.option('--dry-run', is_flag=True, help='Only report changes, do not create or update anything.')
+@click.option('-j', '--concurrency', type=click.IntRange(1, 64), default=DEFAULT_CONCURRENCY, show_default=True,
+              help='Number of concurrent requests.')
+@click.pass_obj
+def apply_manifest(obj, manifest, skip_validation, dry_run, concurrency):
+    """
+    Create or update check and alert definitions from a manifest
+
+    Checks are keyed by a symbolic reference, which alerts can use as "check_definition_id".
+
+    E.g.:
+
+    \b
+        checks:
+          http-check:
+            name: My HTTP check
+            owning_team: my-team
+            command: http('http://example.org/', timeout=5).code()
+            interval: 60
+            entities: [{type: GLOBAL}]
+        alerts:
+          - name: My HTTP alert
+            check_definition_id: http-check
+            team: my-team
+            responsible_team: my-team
+            condition: '>400'
+            priority: 2
+    """
+    client = get_client(obj.config)
+
+    data = yaml.safe_load(manifest) or {}
+
+    checks = data.get('checks') or {}
+    alerts = data.get('alerts') or []
+    if isinstance(alerts, dict):
+        alerts = list(alerts.values())
+
+    user = obj.config.get('user', 'unknown')
+
+    with Action('Retrieving active check and alert definitions ...'):
+        listings = run_concurrently(lambda get: get(), [client.get_check_definitions, client.get_alert_definitions])
+
+    for _, _, e in listings:
+        if e is not None:
+            raise e
+
+    (_, live_checks, _), (_, live_alerts, _) = listings
+
+    checks_by_id = {c['id']: c for c in live_checks}
+    checks_by_name = {(c.get('name'), c.get('owning_team')): c for c in live_checks}
+    alerts_by_id = {a['id']: a for a in live_alerts}
+    alerts_by_name = {(a.get('name'), a.get('check_definition_id')): a for a in live_alerts}
+
+    invalid = {}
+    if not skip_validation:
+        with Action('Validating check commands ...'):
+            results = client.validate_check_commands(c.get('command', '') for c in checks.values())
+        invalid = {ref: result for ref, result in zip(checks, results) if not result.valid}
+
+    def _check_task(ref, check):
+        def _apply(deps):
+            if 'owning_team' not in check:
+                raise ZmonArgumentError('Check definition must have "owning_team"')
+            if ref in invalid:
+                raise ZmonArgumentError('Invalid check command: {}'.format(invalid[ref]))
+
+            remote = find_check(check, checks_by_id, checks_by_name)
+            if remote and not is_changed(check, remote):
+                return 'unchanged', remote
+            if dry_run:
+                return 'changed' if remote else 'new', remote or check
+
+            check['last_modified_by'] = user
+            return 'updated' if remote else 'created', client.update_check_definition(check, skip_validation=True)
+
+        return _apply, []
+
+    def _alert_task(alert):
+        ref = alert.get('check_definition_id')
+        dep = check_key(ref) if isinstance(ref, str) else None
+
+        def _apply(deps):
+            if dep:
+                alert['check_definition_id'] = deps[dep][1].get('id')
+
+            remote = find_alert(alert, alerts_by_id, alerts_by_name) if alert.get('check_definition_id') else None
+            if remote and not is_changed(alert, remote):
+                return 'unchanged', remote
+            if dry_run:
+                return 'changed' if remote else 'new', remote or alert
+
+            alert['last_modified_by'] = user
+            if remote:
+                alert['id'] = remote['id']
+                return 'updated', client.update_alert_definition(alert)
+
+            return 'created', client.create_alert_definition(alert)
+
+        return _apply, [dep] if dep else []
+
+    tasks = {check_key(ref): _check_task(ref, check) for ref, check in checks.items()}
+    tasks.update({alert_key(i): _alert_task(alert) for i, alert in enumerate(alerts)})
+
+    with Action('Applying {} check and {} alert definitions ...'.format(len(checks), len(alerts))):
+        results = run_graph(tasks, concurrency=concurrency)
+
+    counts = {}
+    for key in tasks:
+        result, e = results[key]
+        if e is not None:
+            counts['failed'] = counts.get('failed', 0) + 1
+            error('{}: {}'.format(key, e))
+            continue
+
+        status, definition = result
+        counts[status] = counts.get(status, 0) + 1
+
+        link = ''
+        if definition.get('id'):
+            link = (client.check_definition_url(definition) if key.startswith('check:')
+                    else client.alert_details_url(definition))
+
+        if status == 'unchanged':
+            info('{}: {} {}'.format(key, status, link))
+        else:
+            ok('{}: {} {}'.format(key, status, link))
+
+    summary = ', '.join('{} {}'.format(v, k) for k, v in sorted(counts.items()))
+    if counts.get('failed'):
+        # failed items include items skipped due to failed dependencies
+        fatal_error('Summary: {}'.format(summary))
+
+    info('Summary: {}'.format(summary or 'nothing to apply'))
@@ -1,45 +1,120 @@
+import os
+
 import click
 
+from clickclick import Action, ok, fatal_error
+
 from zmon_cli.cmds.command import cli, get_client, output_option, pretty_json
+from zmon_cli.cmds.command import targets_option, query_targets, tag_targets
+from zmon_cli.config import get_cache_dir
 from zmon_cli.output import Output, render_search
+from zmon_cli.bulk import DEFAULT_LISTING_LIMIT, run_concurrently
+from zmon_cli.search_index import SearchIndex, SEARCH_INDEX_FILE, SEARCH_KINDS
 
 from zmon_cli.client import ZmonArgumentError
 
 
+def get_search_index(config):
+    path = config.get('search_index') or os.path.join(get_cache_dir(), SEARCH_INDEX_FILE)
+    return SearchIndex(os.path.expanduser(path))
+
+
+def refresh_search_index(client, index, listing_limit=DEFAULT_LISTING_LIMIT) -> dict:
+    """Incrementally update local search index with current checks, alerts and (grafana) dashboards."""
+    listings = run_concurrently(lambda get: get(), [
+        client.get_check_definitions,
+        client.get_alert_definitions,
+        lambda: client.search('', limit=listing_limit),
+    ])
+
+    for _, _, e in listings:
+        if e is not None:
+            raise e
+
+    (_, checks, _), (_, alerts, _), (_, dashboards, _) = listings
+
+    stats = {}
+    for kind, objects in (('checks', checks), ('alerts', alerts), ('dashboards', dashboards['dashboards']),
+                          ('grafana_dashboards', dashboards['grafana_dashboards'])):
+        for k, v in index.update(kind, objects).items():
+            stats[k] = stats.get(k, 0) + v
+
+    index.save()
+
+    return stats
+
+
+def add_search_links(client, data) -> dict:
+    for check in data['checks']:
+        check['link'] = client.check_definition_url(check)
+
+    for alert in data['alerts']:
+        alert['link'] = client.alert_details_url(alert)
+
+    for dashboard in data['dashboards']:
+        dashboard['link'] = client.dashboard_url(dashboard['id'])
+
+    for dashboard in data['grafana_dashboards']:
+        dashboard['link'] = client.grafana_dashboard_url(dashboard)
+
+    return data
+
+
 @cli.command()
 @click.argument('search_query', default="")
 @click.option('--team', '-t', multiple=True, required=False,
               help='Filter search by team. Multiple teams filtering is supported.')
 @click.option('--limit', '-l', multiple=False, required=False,
               help='Limit number of results, default is 25')
+@click.option('--offline', is_flag=True,
+              help='Search local index, including check commands and alert conditions.')
+@click.option('--refresh-index', is_flag=True,
+              help='Update local index before searching. Implies --offline.')
 @click.pass_obj
+@targets_option
 @output_option
 @pretty_json
-def search(obj, search_query, team, limit, output, pretty):
+def search(obj, search_query, team, limit, offline, refresh_index, targets, output, pretty):
     """
     Search dashboards, alerts, checks and grafana dashboards.
 
     Example:
 
         $ zmon search "search query" -t team-1 -t team-2
+
+        $ zmon search --refresh-index "http_code"
+
+        $ zmon search --targets all "search query"
     """
-    client = get_client(obj.config)
+    if targets and (offline or refresh_index):
+        raise click.UsageError('--targets cannot be combined with local search index')
 
-    with Output('Searching ...', nl=True, output=output, pretty_json=pretty, printer=render_search) as act:
-        try:
-            data = client.search(search_query, limit=limit, teams=team)
+    client = None if targets else get_client(obj.config)
 
-            for check in data['checks']:
-                check['link'] = client.check_definition_url(check)
+    index = None
+    if offline or refresh_index:
+        index = get_search_index(obj.config)
 
-            for alert in data['alerts']:
-                alert['link'] = client.alert_details_url(alert)
+    if refresh_index:
+        with Action('Updating local search index ...'):
+            stats = refresh_search_index(client, index)
 
-            for dashboard in data['dashboards']:
-                dashboard['link'] = client.dashboard_url(dashboard['id'])
+        if not search_query:
+            ok('{indexed} indexed, {removed} removed, {unchanged} unchanged'.format(**stats))
+            return
+    elif offline and not len(index):
+        fatal_error('Local search index is empty: run "zmon search --refresh-index" first!')
 
-            for dashboard in data['grafana_dashboards']:
-                dashboard['link'] = client.grafana_dashboard_url(dashboard)
+    with Output('Searching ...', nl=True, output=output, pretty_json=pretty, printer=render_search) as act:
+        try:
+            if targets:
+                results = query_targets(obj.config, targets, lambda c: add_search_links(
+                    c, c.search(search_query, limit=limit, teams=team)))
+                data = {kind: tag_targets((t, r[kind]) for t, r in results) for kind in SEARCH_KINDS}
+            elif index is not None:
+                data = add_search_links(client, index.search(search_query, limit=limit, teams=team))
+            else:
+                data = add_search_links(client, client.search(search_query, limit=limit, teams=team))
 
             act.echo(data)
         except ZmonArgumentError as e:
@@ -0,0 +1,241 @@
+"""
+Shell completion of check, alert, dashboard and entity IDs and team names, served from a local cache.
+
+The completion path (:func:`main`, run as ``zmon __complete``) never uses the network and must only import lightweight
+modules, to answer while the user waits for completion. The cache holds one file per kind, with one value per line. It
+is refreshed by ``zmon completion refresh``, which runs in the background after other commands in interactive shells.
+"""
+import os
+import sys
+import time
+import bisect
+import itertools
+
+
+COMPLETE_COMMAND = '__complete'
+
+COMPLETION_CACHE_DIR = 'completion'
+
+COMPLETION_KINDS = ('checks', 'alerts', 'dashboards', 'entities', 'teams')
+
+# cache is refreshed in the background, if older
+DEFAULT_REFRESH_INTERVAL = 3600
+
+# marks the start of the last refresh, so concurrent commands do not refresh again
+REFRESH_STAMP_FILE = '.refreshed'
+
+# more candidates are not useful in a shell
+MAX_COMPLETIONS = 500
+
+# (group, command) -> kind of completed argument
+ARGUMENT_COMPLETIONS = {
+    ('alert-definitions', 'get'): 'alerts',
+    ('alert-definitions', 'delete'): 'alerts',
+    ('alert-definitions', 'entities'): 'alerts',
+    ('check-definitions', 'get'): 'checks',
+    ('check-definitions', 'delete'): 'checks',
+    ('check-definitions', 'entities'): 'checks',
+    ('dashboard', 'get'): 'dashboards',
+    ('entities', 'get'): 'entities',
+    ('entities', 'delete'): 'entities',
+}
+
+# options and filter fields, followed by a team name
+TEAM_WORDS = ('--team', 'team', 'owning_team', 'responsible_team')
+
+# global options taking a value, skipped to find the command
+VALUE_OPTIONS = ('-c', '--config-file', '-t', '--timeout', '--connect-timeout', '--deadline')
+
+
+def get_completion_dir() -> str:
+    """
+    Return completion cache directory, honoring ``ZMON_COMPLETION_CACHE``.
+
+    Not using :func:`zmon_cli.config.get_cache_dir` to keep completion imports light.
+    """
+    path = os.environ.get('ZMON_COMPLETION_CACHE')
+    if path:
+        return path
+
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'zmon-cli', COMPLETION_CACHE_DIR)
+
+
+def resolve_name(word, names):
+    """
+    Resolve a (unique prefix of a) command name, like the CLI does.
+
+    >>> resolve_name('alert', ['alert-definitions', 'check-definitions'])
+    'alert-definitions'
+    """
+    if word in names:
+        return word
+
+    matches = [name for name in names if name.startswith(word)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def completion_kind(words):
+    """
+    Return kind of value completed after ``words`` (without the word being completed), or ``None``.
+
+    >>> completion_kind(['zmon', '-c', 'test.yaml', 'alert', 'get'])
+    'alerts'
+    >>> completion_kind(['zmon', 'search', '--team'])
+    'teams'
+    """
+    if words and words[-1] in TEAM_WORDS:
+        return 'teams'
+
+    commands = []
+    skip = False
+    for word in words[1:]:
+        if skip:
+            skip = False
+        elif word.startswith('-'):
+            skip = word in VALUE_OPTIONS
+        else:
+            commands.append(word)
+
+    # only the first argument is completed
+    if len(commands) != 2:
+        return None
+
+    group = resolve_name(commands[0], {group for group, _ in ARGUMENT_COMPLETIONS})
+    command = resolve_name(commands[1], {command for g, command in ARGUMENT_COMPLETIONS if g == group})
+
+    return ARGUMENT_COMPLETIONS.get((group, command))
+
+
+def complete(kind, prefix='', path=None) -> list:
+    """Return cached values of ``kind`` starting with ``prefix``. Values are cached sorted, so they are bisected."""
+    path = os.path.join(path or get_completion_dir(), kind)
+
+    try:
+        with open(path, encoding='utf-8') as fd:
+            values = fd.read().splitlines()
+    except OSError:
+        # no cache yet
+        return []
+
+    result = []
+    for value in itertools.islice(values, bisect.bisect_left(values, prefix), None):
+        if not value.startswith(prefix) or len(result) >= MAX_COMPLETIONS:
+            break
+        result.append(value)
+
+    return result
+
+
+def main(args) -> int:
+    """
+    Print completions, one per line. Arguments are the index of the word being completed and all words of the command
+    line, i.e. bash ``COMP_CWORD`` and ``COMP_WORDS``.
+    """
+    try:
+        index = int(args[0])
+        words = args[1:]
+    except (IndexError, ValueError):
+        return 1
+
+    prefix = words[index] if index < len(words) else ''
+
+    kind = completion_kind(words[:index])
+    if kind:
+        for value in complete(kind, prefix):
+            print(value)
+
+    return 0
+
+
+########################################################################################################################
+# REFRESH
+########################################################################################################################
+
+def write_values(kind, values, path=None):
+    """Replace cached values of ``kind`` atomically, so concurrent completion never reads a partial file."""
+    path = path or get_completion_dir()
+    os.makedirs(path, exist_ok=True)
+
+    fn = os.path.join(path, kind)
+    tmp = '{}.{}.tmp'.format(fn, os.getpid())
+    with open(tmp, 'w', encoding='utf-8') as fd:
+        for value in values:
+            fd.write('{}\n'.format(value))
+
+    os.replace(tmp, fn)
+
+
+def refresh(client, path=None, listing_limit=None) -> dict:
+    """
+    Retrieve IDs and team names, and replace the completion cache.
+
+    :return: Number of cached values per kind.
+    :rtype: dict
+    """
+    # only used by the refresh command, not on the completion path
+    from zmon_cli.bulk import DEFAULT_LISTING_LIMIT, call_concurrently
+
+    checks, alerts, search, entities = call_concurrently(
+        client.get_check_definitions,
+        client.get_alert_definitions,
+        lambda: client.search('', limit=listing_limit or DEFAULT_LISTING_LIMIT),
+        lambda: client.get_entities(models=True),
+    )
+
+    dashboards = search.get('dashboards', [])
+
+    teams = {c.get('owning_team') for c in checks}
+    teams.update(a.get(field) for a in alerts for field in ('team', 'responsible_team'))
+    teams.update(d.get('team') for d in dashboards)
+
+    values = {
+        'checks': sorted(str(c['id']) for c in checks),
+        'alerts': sorted(str(a['id']) for a in alerts),
+        'dashboards': sorted(str(d['id']) for d in dashboards),
+        'entities': sorted(e['id'] for e in entities),
+        # team names with whitespace cannot be completed as a single shell word
+        'teams': sorted(t for t in teams if t and not any(c.isspace() for c in t)),
+    }
+
+    for kind in COMPLETION_KINDS:
+        write_values(kind, values[kind], path=path)
+
+    return {kind: len(v) for kind, v in values.items()}
+
+
+def is_stale(interval=DEFAULT_REFRESH_INTERVAL, path=None) -> bool:
+    stamp = os.path.join(path or get_completion_dir(), REFRESH_STAMP_FILE)
+    try:
+        return time.time() - os.path.getmtime(stamp) >= interval
+    except OSError:
+        return True
+
+
+def refresh_in_background(config_file, interval=DEFAULT_REFRESH_INTERVAL, path=None) -> bool:
+    """
+    Start ``zmon completion refresh`` as a detached process, if the cache is older than ``interval`` seconds.
+
+    :return: Whether a refresh was started.
+    :rtype: bool
+    """
+    if interval <= 0 or not is_stale(interval, path):
+        return False
+
+    import subprocess
+
+    path = path or get_completion_dir()
+    try:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, REFRESH_STAMP_FILE), 'w'):
+            pass
+
+        subprocess.Popen(
+            [sys.executable, '-m', 'zmon_cli', '-c', config_file, 'completion', 'refresh'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env=dict(os.environ, ZMON_COMPLETION_CACHE=path), start_new_session=True)
+    except OSError:
+        # completion cache is best effort, commands must not fail
+        return False
+
+    return True
@@ -1,5 +1,11 @@
 import os
+import glob
+import time
+import queue
+import atexit
+import random
 import logging
+import logging.handlers
 
 import yaml
 import click
@@ -9,19 +15,185 @@ import requests
 
 from clickclick import Action, error
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # no file locking (e.g. on Windows), shared log file is not rotated
+    fcntl = None
+
 
 DEFAULT_CONFIG_FILE = '~/.zmon-cli.yaml'
 DEFAULT_TIMEOUT = 10
 
+CHECK_COMMAND_CACHE_FILE = 'check-commands.db'
+
+DEFAULT_LOG_FILE = '/tmp/zmon-cli.log'
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUP_COUNT = 3
+# per-process log files not written for this long are removed
+DEFAULT_LOG_MAX_AGE = 7 * 24 * 3600
+LOG_FORMAT = '%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s'
+
+_log_listener = None
+_log_handler = None
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Pass only a sample of DEBUG records. Records of higher levels always pass.
+
+    >>> DebugSamplingFilter(0.0).filter(logging.makeLogRecord({'levelno': logging.INFO}))
+    True
+    >>> DebugSamplingFilter(0.0).filter(logging.makeLogRecord({'levelno': logging.DEBUG}))
+    False
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+
+def get_log_file(config=None):
+    """Return log file path from config. A ``{pid}`` placeholder is replaced with the current process ID."""
+    log_file = (config or {}).get('log_file') or DEFAULT_LOG_FILE
+    return os.path.expanduser(log_file.format(pid=os.getpid()))
+
+
+class SharedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size-rotated log file, shared by concurrent processes.
+
+    Rollover is serialized by a lock file. A process still writing to a file already rotated by another process only
+    reopens the log file, instead of rotating it again.
+    """
+
+    def doRollover(self):
+        with open(self.baseFilename + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                inode = None
+                if self.stream:
+                    inode = os.fstat(self.stream.fileno()).st_ino
+                    self.stream.close()
+                    self.stream = None
+
+                try:
+                    stat = os.stat(self.baseFilename)
+                except FileNotFoundError:
+                    stat = None
+
+                # a rotated file is only reopened
+                if stat is not None and inode in (None, stat.st_ino):
+                    super().doRollover()
+                elif not self.delay:
+                    self.stream = self._open()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def remove_old_log_files(config=None, max_age=None):
+    """Remove per-process log files (and their backups), which were not written for ``log_max_age`` seconds."""
+    config = config or {}
+    max_age = float(config.get('log_max_age', DEFAULT_LOG_MAX_AGE)) if max_age is None else max_age
+
+    pattern = os.path.expanduser(glob.escape(config['log_file']).replace('{pid}', '[0-9]*'))
+    deadline = time.time() - max_age
+
+    for path in glob.glob(pattern) + glob.glob(pattern + '.[0-9]*'):
+        try:
+            if os.path.getmtime(path) < deadline:
+                os.remove(path)
+        except OSError:
+            # removed concurrently, or not permitted
+            pass
+
+
+def get_log_file_handler(config=None) -> logging.Handler:
+    """
+    Return handler writing to the configured log file, opened in append mode and rotated by size.
+
+    The default log file is shared by concurrent processes, and rotated under a file lock. Per-process log files (with a
+    ``{pid}`` placeholder) are removed after ``log_max_age`` seconds without writes.
+    """
+    config = config or {}
+
+    max_bytes = int(config.get('log_max_bytes', DEFAULT_LOG_MAX_BYTES))
+    backup_count = int(config.get('log_backup_count', DEFAULT_LOG_BACKUP_COUNT))
+
+    if '{pid}' in (config.get('log_file') or DEFAULT_LOG_FILE):
+        remove_old_log_files(config)
+        return logging.handlers.RotatingFileHandler(
+            get_log_file(config), mode='a', maxBytes=max_bytes, backupCount=backup_count, delay=True)
+
+    if fcntl is None:
+        return logging.FileHandler(get_log_file(config), mode='a', delay=True)
+
+    return SharedRotatingFileHandler(
+        get_log_file(config), mode='a', maxBytes=max_bytes, backupCount=backup_count, delay=True)
+
+
+def stop_logging():
+    """Stop background log writer, flushing all queued records."""
+    global _log_listener, _log_handler
+
+    if _log_handler is not None:
+        logging.getLogger().removeHandler(_log_handler)
+        _log_handler = None
+
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+
+
+def configure_logging(loglevel, config=None):
+    """
+    Configure file logger to not clutter stdout with log lines.
+
+    Records are queued and written by a background thread, to a size-rotated log file opened in append mode.
+    Concurrent processes share the default log file, or use a ``{pid}`` placeholder in ``log_file`` to write separate
+    files.
+
+    Supported config keys: ``log_file``, ``log_max_bytes``, ``log_backup_count``, ``log_max_age`` and
+    ``log_debug_sample_rate``.
+    """
+    global _log_listener, _log_handler
+
+    config = config or {}
+
+    # reconfiguring replaces previous handler and listener
+    stop_logging()
+
+    file_handler = get_log_file_handler(config)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    _log_handler = logging.handlers.QueueHandler(queue.Queue())
+    _log_handler.addFilter(DebugSamplingFilter(float(config.get('log_debug_sample_rate', 1.0))))
+
+    _log_listener = logging.handlers.QueueListener(_log_handler.queue, file_handler)
+    _log_listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(loglevel)
+    root.addHandler(_log_handler)
 
-def configure_logging(loglevel):
-    # configure file logger to not clutter stdout with log lines
-    logging.basicConfig(level=loglevel, filename='/tmp/zmon-cli.log',
-                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
     logging.getLogger('urllib3.connectionpool').setLevel(logging.WARNING)
     logging.getLogger('requests.packages.urllib3.connectionpool').setLevel(logging.WARNING)
 
 
+atexit.register(stop_logging)
+
+
+def get_cache_dir():
+    """Return ZMON CLI cache directory, honoring ``XDG_CACHE_HOME``."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'zmon-cli')
+
+
 def get_config_data(config_file=DEFAULT_CONFIG_FILE):
     fn = os.path.expanduser(config_file)
     data = {}
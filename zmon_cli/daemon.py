@@ -0,0 +1,429 @@
+"""
+Local ZMON CLI daemon, serving CLI invocations over a Unix socket with warm configuration and client sessions.
+
+The client side (:func:`forward`) is used by every ``zmon`` invocation and must only import lightweight modules.
+"""
+import io
+import os
+import sys
+import json
+import time
+import socket
+import logging
+
+
+DAEMON_SOCKET_FILE = 'daemon.sock'
+
+DEFAULT_IDLE_TIMEOUT = 3600
+
+# cached configuration (including tokens) and clients expire after this many seconds
+DEFAULT_CACHE_TTL = 300
+
+CONNECT_TIMEOUT = 0.5
+
+# environment variables forwarded to the daemon, affecting command execution: credentials, proxies, CA bundles and
+# cache locations
+FORWARDED_ENV = (
+    'ZMON_TOKEN',
+    'HTTP_PROXY', 'HTTPS_PROXY', 'ALL_PROXY', 'NO_PROXY', 'http_proxy', 'https_proxy', 'all_proxy', 'no_proxy',
+    'REQUESTS_CA_BUNDLE', 'CURL_CA_BUNDLE', 'SSL_CERT_FILE', 'SSL_CERT_DIR',
+    'XDG_CACHE_HOME', 'ZMON_COMPLETION_CACHE',
+)
+
+logger = logging.getLogger(__name__)
+
+serving = False
+
+# stdout of the client running the current command is a terminal
+interactive = False
+
+
+def is_interactive() -> bool:
+    """Return whether stdout of the CLI invocation is a terminal, the client's stdout while serving commands."""
+    return interactive if serving else sys.stdout.isatty()
+
+
+class ForwardingUnsupported(Exception):
+    """
+    Raised by commands which cannot run in the daemon, e.g. reading stdin, prompting for input or running until
+    interrupted.
+    """
+
+
+class DaemonStdin:
+    """Replacement for stdin while serving commands: interactive commands must run in the calling process."""
+
+    def _unsupported(self, *args, **kwargs):
+        raise ForwardingUnsupported('stdin is not available in daemon')
+
+    read = readline = readlines = __iter__ = fileno = _unsupported
+
+    def isatty(self):
+        return False
+
+
+class DaemonOutput(io.TextIOBase):
+    """
+    Replacement for stdout or stderr while serving commands, streaming complete lines to the client, so long-running
+    commands show progress. Partial lines (e.g. prompts) are held back, so prompting commands can still fall back to
+    the calling process.
+    """
+
+    def __init__(self, connection, name):
+        self._connection = connection
+        self._name = name
+        self._buffer = []
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, s):
+        if not isinstance(s, str):
+            # tells click, this is a text stream
+            raise TypeError('write() argument must be str, not {}'.format(type(s).__name__))
+
+        self._buffer.append(s)
+        if '\n' in s:
+            lines, _, rest = ''.join(self._buffer).rpartition('\n')
+            self._buffer = [rest]
+            self._connection.send({self._name: lines + '\n'})
+
+        return len(s)
+
+    def flush(self):
+        # line buffered
+        pass
+
+    def send_rest(self):
+        rest = ''.join(self._buffer)
+        self._buffer = []
+        if rest:
+            self._connection.send({self._name: rest})
+
+    def discard(self):
+        self._buffer = []
+
+
+class DaemonConnection:
+    """Client connection of a forwarded command."""
+
+    def __init__(self, sock):
+        self._sock = sock
+
+        # output was sent, command cannot fall back to the calling process anymore
+        self.sent = False
+        self.disconnected = False
+
+    def send(self, message: dict):
+        if self.disconnected:
+            return
+
+        try:
+            send_message(self._sock, message)
+        except OSError:
+            # client was interrupted, abort the command like Ctrl-C would
+            self.disconnected = True
+            raise KeyboardInterrupt()
+
+        self.sent = True
+
+
+def get_socket_path() -> str:
+    """
+    Return daemon socket path, honoring ``ZMON_DAEMON_SOCKET``.
+
+    Not using :func:`zmon_cli.config.get_cache_dir` to keep client imports light.
+    """
+    path = os.environ.get('ZMON_DAEMON_SOCKET')
+    if path:
+        return path
+
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'zmon-cli', DAEMON_SOCKET_FILE)
+
+
+def send_message(sock, message: dict):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def receive_message(sock) -> dict:
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+
+    return json.loads(b''.join(chunks).decode('utf-8')) if chunks else None
+
+
+def connect(path=None):
+    """
+    Connect to a running daemon.
+
+    :return: Connected socket, or ``None`` if no daemon is listening.
+    """
+    path = path or get_socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        # commands may take arbitrarily long
+        sock.settimeout(None)
+    except OSError:
+        sock.close()
+        return None
+
+    return sock
+
+
+def request(message: dict, path=None) -> dict:
+    """
+    Send a single request to a running daemon.
+
+    :return: Daemon response, or ``None`` if no daemon is listening.
+    :rtype: dict
+    """
+    sock = connect(path)
+    if sock is None:
+        return None
+
+    try:
+        send_message(sock, message)
+        return receive_message(sock)
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+
+
+def forward(args, path=None):
+    """
+    Run CLI command in a running daemon. Output of the command is written as it is received.
+
+    :return: Exit code of the command, or ``None`` if the command must run in the calling process.
+    :rtype: int
+    """
+    # commands reading stdin are never forwarded
+    if '-' in args:
+        return None
+
+    sock = connect(path)
+    if sock is None:
+        return None
+
+    received = False
+    try:
+        send_message(sock, {
+            'args': list(args),
+            'cwd': os.getcwd(),
+            'env': {k: os.environ[k] for k in FORWARDED_ENV if k in os.environ},
+            'color': sys.stdout.isatty(),
+            'interactive': sys.stdout.isatty(),
+        })
+
+        with sock.makefile('rb') as fd:
+            for line in fd:
+                response = json.loads(line.decode('utf-8'))
+                received = True
+
+                if response.get('fallback'):
+                    return None
+                elif 'stdout' in response:
+                    sys.stdout.write(response['stdout'])
+                    sys.stdout.flush()
+                elif 'stderr' in response:
+                    sys.stderr.write(response['stderr'])
+                    sys.stderr.flush()
+                else:
+                    return response.get('exit_code', 0)
+    except KeyboardInterrupt:
+        # closing the connection aborts the command in the daemon
+        sys.stderr.write('Aborted!\n')
+        return 1
+    except (OSError, ValueError):
+        pass
+    finally:
+        sock.close()
+
+    # daemon stopped before running the command, or while running it
+    return 1 if received else None
+
+
+def run_command(message: dict, sock) -> dict:
+    """
+    Run a forwarded CLI command in daemon process, streaming its output to the client.
+
+    :return: Final response with exit code of the command, or ``fallback``, if the command must run in the calling
+             process.
+    :rtype: dict
+    """
+    import traceback
+    import contextlib
+
+    import click
+    import requests
+
+    from zmon_cli.cmds import cli
+    from zmon_cli.output import log_http_exception
+
+    global interactive
+
+    connection = DaemonConnection(sock)
+    stdout, stderr = DaemonOutput(connection, 'stdout'), DaemonOutput(connection, 'stderr')
+
+    cwd = os.getcwd()
+    env = {k: os.environ.get(k) for k in FORWARDED_ENV}
+    stdin = sys.stdin
+
+    exit_code = 0
+    try:
+        os.chdir(message.get('cwd') or cwd)
+        for k in FORWARDED_ENV:
+            os.environ.pop(k, None)
+        os.environ.update(message.get('env') or {})
+        sys.stdin = DaemonStdin()
+        interactive = bool(message.get('interactive'))
+
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                rv = cli.main(args=message.get('args', []), prog_name='zmon', standalone_mode=False,
+                              color=message.get('color'))
+                # ctx.exit(code) is returned instead of raised when not in standalone mode
+                exit_code = rv if isinstance(rv, int) else 0
+            except click.ClickException as e:
+                e.show()
+                exit_code = e.exit_code
+            except click.Abort:
+                click.echo('Aborted!', err=True)
+                exit_code = 1
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except requests.HTTPError as e:
+                log_http_exception(e)
+                exit_code = 1
+            except ForwardingUnsupported as e:
+                if not connection.sent:
+                    raise
+                # output was streamed already, the command cannot be run again by the client
+                click.echo('Error: {} is not supported in daemon, set ZMON_NO_DAEMON=1'.format(e), err=True)
+                exit_code = 1
+            except KeyboardInterrupt:
+                exit_code = 1
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+
+            try:
+                stdout.send_rest()
+                stderr.send_rest()
+            except KeyboardInterrupt:
+                pass
+    except ForwardingUnsupported:
+        stdout.discard()
+        stderr.discard()
+        return {'fallback': True}
+    finally:
+        sys.stdin = stdin
+        interactive = False
+        for k, v in env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        os.chdir(cwd)
+
+    return {'exit_code': exit_code}
+
+
+def listen(path):
+    """Bind daemon socket, accessible by current user only."""
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+
+    if os.path.exists(path):
+        if request({'command': 'status'}, path=path) is not None:
+            raise RuntimeError('ZMON CLI daemon is already running on {}'.format(path))
+        # stale socket of a previous daemon
+        os.unlink(path)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o077)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(umask)
+
+    sock.listen(16)
+    return sock
+
+
+def serve(path=None, idle_timeout=DEFAULT_IDLE_TIMEOUT, cache_ttl=DEFAULT_CACHE_TTL):
+    """
+    Serve forwarded CLI commands until stopped, or idle for ``idle_timeout`` seconds.
+
+    Commands are executed one at a time, reusing cached configuration, tokens and client sessions.
+    """
+    global serving
+
+    from zmon_cli.cmds.command import enable_cache
+
+    path = path or get_socket_path()
+    sock = listen(path)
+    sock.settimeout(idle_timeout or None)
+
+    enable_cache(cache_ttl)
+    serving = True
+
+    started = time.time()
+    served = 0
+
+    logger.info('ZMON CLI daemon listening on {}'.format(path))
+
+    try:
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                logger.info('ZMON CLI daemon idle for {} seconds, stopping'.format(idle_timeout))
+                break
+
+            with conn:
+                try:
+                    message = receive_message(conn) or {}
+                except (OSError, ValueError):
+                    logger.warning('Invalid daemon request', exc_info=True)
+                    continue
+
+                command = message.get('command')
+                if command == 'stop':
+                    send_message(conn, {'stopped': True})
+                    break
+                elif command == 'status':
+                    response = {'pid': os.getpid(), 'uptime': time.time() - started, 'served': served}
+                else:
+                    response = run_command(message, conn)
+                    if not response.get('fallback'):
+                        served += 1
+
+                try:
+                    send_message(conn, response)
+                except OSError:
+                    logger.warning('Failed to send daemon response', exc_info=True)
+    finally:
+        serving = False
+        enable_cache(0)
+        sock.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,139 @@
+"""
+Local matching of check and alert definition entity filters against an entity inventory.
+
+An entity filter (e.g. ``{'type': 'instance', 'application_id': 'my-app'}``) matches an entity, if the entity has all
+filter attributes with equal values. List attribute values match any of their elements. Values are compared as
+strings, like ZMON does.
+
+Entities are indexed once in an inverted index of attribute values, so a filter is matched by intersecting the entity
+sets of its attribute values, instead of scanning all entities.
+"""
+import json
+
+
+def value_key(value) -> str:
+    """
+    Return index key of an attribute or filter value.
+
+    >>> value_key('my-app'), value_key(8080), value_key(True), value_key(None)
+    ('my-app', '8080', 'true', 'null')
+    """
+    if isinstance(value, str):
+        return value
+    elif isinstance(value, bool) or value is None:
+        return json.dumps(value)
+    elif isinstance(value, (list, dict)):
+        return json.dumps(value, sort_keys=True)
+    return str(value)
+
+
+def value_keys(value) -> set:
+    """Return index keys of an entity attribute value. List values are also indexed by their scalar elements."""
+    keys = {value_key(value)}
+    if isinstance(value, list):
+        keys.update(value_key(v) for v in value if not isinstance(v, (list, dict)))
+    return keys
+
+
+class EntityIndex:
+    """
+    Inverted index of entity attribute values, to match entity filters.
+
+    >>> index = EntityIndex([
+    ...     {'id': 'i-1', 'type': 'instance', 'application_id': 'app-1'},
+    ...     {'id': 'i-2', 'type': 'instance', 'application_id': 'app-2'},
+    ...     {'id': 'db-1', 'type': 'database'},
+    ... ])
+    >>> index.entity_ids(index.match([{'type': 'instance'}], [{'application_id': 'app-2'}]))
+    ['i-1']
+
+    :param entities: Entities (dicts or models) to index.
+    :type entities: iterable
+    """
+
+    def __init__(self, entities=()):
+        self.ids = []
+
+        # attribute -> value key -> set of entity positions
+        self._postings = {}
+
+        # definitions often share the same filters, e.g. ``{'type': 'GLOBAL'}``
+        self._cache = {}
+
+        for entity in entities:
+            self.add(entity)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, entity):
+        pos = len(self.ids)
+        self.ids.append(entity['id'])
+
+        for attribute, value in entity.items():
+            values = self._postings.setdefault(attribute, {})
+            for key in value_keys(value):
+                values.setdefault(key, set()).add(pos)
+
+        self._cache.clear()
+
+    def match_filter(self, entity_filter: dict) -> frozenset:
+        """Return positions of entities matching all attribute values of ``entity_filter``."""
+        cache_key = json.dumps(entity_filter, sort_keys=True, default=str)
+
+        matched = self._cache.get(cache_key)
+        if matched is not None:
+            return matched
+
+        postings = []
+        for attribute, value in entity_filter.items():
+            entities = self._postings.get(attribute, {}).get(value_key(value))
+            if not entities:
+                postings = None
+                break
+            postings.append(entities)
+
+        if postings is None:
+            matched = frozenset()
+        elif not postings:
+            # empty filter matches everything
+            matched = frozenset(range(len(self.ids)))
+        else:
+            postings.sort(key=len)
+            matched = frozenset(postings[0].intersection(*postings[1:]))
+
+        self._cache[cache_key] = matched
+        return matched
+
+    def match(self, entities, entities_exclude=None) -> set:
+        """Return positions of entities matching any of ``entities`` and none of ``entities_exclude`` filters."""
+        matched = set().union(*(self.match_filter(f) for f in entities or ()))
+
+        for entity_filter in entities_exclude or ():
+            if not matched:
+                break
+            matched -= self.match_filter(entity_filter)
+
+        return matched
+
+    def match_check(self, check) -> set:
+        """Return positions of entities of a check definition."""
+        return self.match(check.get('entities'), check.get('entities_exclude'))
+
+    def match_alert(self, alert, check) -> set:
+        """
+        Return positions of entities of an alert definition: entities of its check definition, restricted by alert
+        entity filters (if any) and without excluded entities of the alert.
+        """
+        matched = self.match_check(check)
+
+        if alert.get('entities'):
+            matched &= self.match(alert['entities'])
+
+        for entity_filter in alert.get('entities_exclude') or ():
+            matched -= self.match_filter(entity_filter)
+
+        return matched
+
+    def entity_ids(self, positions) -> list:
+        return sorted(self.ids[pos] for pos in positions)
@@ -0,0 +1,174 @@
+"""
+Hedged requests, to cut tail latency of idempotent GET requests.
+
+If a request has not answered within a percentile of recently observed latencies, a duplicate request is sent. The
+first response wins, the other request is cancelled (or its response discarded). Hedges are limited to a ratio of all
+requests, so a slow backend does not get twice the load.
+"""
+import math
+import time
+import threading
+
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+
+DEFAULT_PERCENTILE = 95
+
+# hedges per request
+DEFAULT_MAX_EXTRA = 0.05
+
+# latencies kept to compute the hedging delay
+DEFAULT_WINDOW = 200
+
+# no hedging before enough latencies are observed
+DEFAULT_MIN_SAMPLES = 20
+
+
+class HedgingPolicy:
+    """
+    Hedging policy, based on recently observed latencies. Thread-safe.
+
+    >>> policy = HedgingPolicy(percentile=50, min_samples=3)
+    >>> policy.delay() is None
+    True
+    >>> for latency in (0.1, 0.2, 0.3):
+    ...     policy.record(latency)
+    >>> policy.delay()
+    0.2
+
+    :param percentile: Percentile of recent latencies, after which a hedge is sent.
+    :type percentile: float
+
+    :param max_extra: Maximum ratio of hedges to requests, i.e. extra load.
+    :type max_extra: float
+
+    :param window: Number of recent latencies to compute the percentile of.
+    :type window: int
+
+    :param min_samples: Minimum number of observed latencies, before requests are hedged.
+    :type min_samples: int
+    """
+
+    def __init__(self, percentile=DEFAULT_PERCENTILE, max_extra=DEFAULT_MAX_EXTRA, window=DEFAULT_WINDOW,
+                 min_samples=DEFAULT_MIN_SAMPLES):
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.min_samples = max(1, min_samples)
+
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self):
+        """Seconds to wait for a response before hedging, or ``None`` if not enough latencies are observed yet."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+
+        index = max(0, int(math.ceil(len(latencies) * self.percentile / 100.0)) - 1)
+        return latencies[min(index, len(latencies) - 1)]
+
+    def start(self):
+        """Count a request, which might be hedged."""
+        with self._lock:
+            self.requests += 1
+
+    def acquire(self) -> bool:
+        """Return whether a hedge may be sent, within the extra load budget."""
+        with self._lock:
+            if self.hedges + 1 > self.max_extra * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def won(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> dict:
+        delay = self.delay()
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'delay': delay,
+            }
+
+
+class Attempt:
+    """Timed request attempt, recording its latency once completed."""
+
+    def __init__(self, policy, fn):
+        self.policy = policy
+        self.fn = fn
+
+    def __call__(self):
+        start = time.monotonic()
+        result = self.fn()
+        self.policy.record(time.monotonic() - start)
+        return result
+
+
+def discard(future):
+    """Cancel a losing request, or close its response once it completes."""
+    def _close(f):
+        try:
+            close = getattr(f.result(), 'close', None)
+            if close is not None:
+                close()
+        except Exception:
+            pass
+
+    if not future.cancel():
+        future.add_done_callback(_close)
+
+
+def hedged_call(policy, executor, fn):
+    """
+    Call ``fn``, sending a hedge using ``executor`` if it does not return within the policy delay.
+
+    :return: First result. If all attempts fail, the last exception is raised.
+    """
+    policy.start()
+
+    attempt = Attempt(policy, fn)
+
+    delay = policy.delay()
+    if delay is None:
+        return attempt()
+
+    primary = executor.submit(attempt)
+    done, _ = wait([primary], timeout=delay)
+    if done or not policy.acquire():
+        return primary.result()
+
+    hedge = executor.submit(attempt)
+
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            try:
+                result = f.result()
+            except Exception as e:
+                error = e
+                continue
+
+            for other in pending:
+                discard(other)
+            if f is hedge:
+                policy.won()
+            return result
+
+    raise error
@@ -1,11 +1,40 @@
-import requests
+import os
+import sys
 
-from zmon_cli.cmds import cli
-from zmon_cli.output import log_http_exception
+from zmon_cli.completion import COMPLETE_COMMAND, main as complete
+
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        # importing the CLI is expensive, and not required if a daemon runs the command
+        if name == 'cli':
+            from zmon_cli import cmds
+            return cmds.cli
+
+        raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+else:
+    # no module level __getattr__ (PEP 562)
+    from zmon_cli.cmds import cli  # noqa
 
 
 def main():
+    if sys.argv[1:2] == [COMPLETE_COMMAND]:
+        # shell completion from local cache only, without importing the CLI
+        sys.exit(complete(sys.argv[2:]))
+
+    from zmon_cli.daemon import forward
+
+    if not os.environ.get('ZMON_NO_DAEMON'):
+        exit_code = forward(sys.argv[1:])
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    import requests
+
+    from zmon_cli import cmds
+    from zmon_cli.output import log_http_exception
+
     try:
-        cli()
+        cmds.cli()
     except requests.HTTPError as e:
         log_http_exception(e)
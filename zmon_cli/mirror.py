@@ -0,0 +1,227 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+
+from zmon_cli.client import JSONDateEncoder, ZmonArgumentError
+from zmon_cli.entity_filter import value_key
+
+
+ENTITY_MIRROR_FILE = 'entities.db'
+
+invalid_attribute_re = re.compile('["\'\\\\]')
+
+logger = logging.getLogger(__name__)
+
+
+# string key of a JSON value, like :func:`zmon_cli.entity_filter.value_key` for scalars
+VALUE_KEY = ("CASE {type} WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' WHEN 'null' THEN 'null' "
+             "ELSE CAST({value} AS TEXT) END")
+
+
+def attribute_path(attribute: str) -> str:
+    """
+    Return JSON path of an entity attribute, as SQL string literal.
+
+    >>> print(attribute_path('application_id'))
+    '$."application_id"'
+    """
+    if not attribute or invalid_attribute_re.search(attribute):
+        raise ZmonArgumentError('Invalid entity attribute: {}'.format(attribute))
+
+    return '\'$."{}"\''.format(attribute)
+
+
+def attribute_type_expression(attribute: str) -> str:
+    """Return SQL expression of the JSON type of an entity attribute, e.g. ``text``, ``integer`` or ``array``."""
+    return 'json_type(data, {})'.format(attribute_path(attribute))
+
+
+def attribute_key_expression(attribute: str) -> str:
+    """
+    Return SQL expression of the string key of a scalar entity attribute, to compare it with filter values.
+
+    >>> print(attribute_key_expression('port'))  # doctest: +ELLIPSIS
+    CASE json_type(data, '$."port"') WHEN 'true' THEN 'true' ... ELSE CAST(json_extract(data, '$."port"') AS TEXT) END
+    """
+    return VALUE_KEY.format(type=attribute_type_expression(attribute),
+                            value='json_extract(data, {})'.format(attribute_path(attribute)))
+
+
+def attribute_condition(attribute: str) -> str:
+    """
+    Return SQL condition matching an entity attribute with a filter value parameter. Scalar values are compared as
+    strings, list values match any of their scalar elements.
+    """
+    path = attribute_path(attribute)
+    element_key = VALUE_KEY.format(type='type', value='value')
+    return ("({key} = ? OR ({type} = 'array' AND EXISTS (SELECT 1 FROM json_each(data, {path}) "
+            "WHERE type NOT IN ('array', 'object') AND {element_key} = ?)))").format(
+        key=attribute_key_expression(attribute), type=attribute_type_expression(attribute), path=path,
+        element_key=element_key)
+
+
+def index_name(attribute: str, kind: str = 'attr') -> str:
+    return 'idx_entities_{}_{}'.format(kind, re.sub('[^a-zA-Z0-9_]', '_', attribute))
+
+
+class EntityMirror:
+    """
+    Local SQLite mirror of ZMON entities, for offline and indexed entity queries.
+
+    Entities are stored as JSON, with ``id`` and ``type`` columns. Additional attributes can be indexed.
+
+    :param path: Path of mirror database.
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self._db = sqlite3.connect(path)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS entities (
+                id TEXT PRIMARY KEY,
+                type TEXT,
+                last_modified TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entities_type ON entities(type);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        ''')
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _get_meta(self, key, default=None):
+        row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key, value):
+        self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    @property
+    def indexes(self) -> list:
+        """Indexed entity attributes."""
+        return self._get_meta('indexes', [])
+
+    @property
+    def last_sync(self):
+        return self._get_meta('last_sync')
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM entities').fetchone()[0]
+
+    def add_indexes(self, attributes):
+        """
+        Create indexes on additional entity attributes: on the string key of scalar values, and on the value type to
+        find list values.
+        """
+        indexes = self.indexes
+        with self._db:
+            for attribute in attributes:
+                if attribute in ('id', 'type'):
+                    continue
+                # index of previous versions on raw attribute value, not used by queries
+                self._db.execute('DROP INDEX IF EXISTS {}'.format(index_name(attribute)))
+                self._db.execute('CREATE INDEX IF NOT EXISTS {} ON entities({})'.format(
+                    index_name(attribute, 'key'), attribute_key_expression(attribute)))
+                self._db.execute('CREATE INDEX IF NOT EXISTS {} ON entities({})'.format(
+                    index_name(attribute, 'type'), attribute_type_expression(attribute)))
+                if attribute not in indexes:
+                    indexes.append(attribute)
+
+            self._set_meta('indexes', indexes)
+
+    def sync(self, entities, timestamp=None) -> dict:
+        """
+        Synchronize mirror with a full entity listing.
+
+        Only entities with a changed ``last_modified`` are written, and entities missing from listing are removed.
+
+        :param entities: Iterable of entity dicts.
+        :type entities: iterable
+
+        :return: Sync stats, with number of ``added``, ``updated``, ``deleted`` and ``unchanged`` entities.
+        :rtype: dict
+        """
+        known = dict(self._db.execute('SELECT id, last_modified FROM entities'))
+
+        stats = {'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        rows = []
+        seen = set()
+
+        for e in entities:
+            entity_id = e['id']
+            seen.add(entity_id)
+
+            last_modified = e.get('last_modified')
+            if last_modified is not None:
+                last_modified = str(last_modified)
+
+            if entity_id in known:
+                if last_modified is not None and known[entity_id] == last_modified:
+                    stats['unchanged'] += 1
+                    continue
+                stats['updated'] += 1
+            else:
+                stats['added'] += 1
+
+            rows.append((entity_id, e.get('type'), last_modified, json.dumps(e, cls=JSONDateEncoder)))
+
+        deleted = [(entity_id,) for entity_id in known if entity_id not in seen]
+        stats['deleted'] = len(deleted)
+
+        with self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO entities (id, type, last_modified, data) VALUES (?, ?, ?, ?)', rows)
+            self._db.executemany('DELETE FROM entities WHERE id = ?', deleted)
+            if timestamp is not None:
+                self._set_meta('last_sync', timestamp)
+
+        logger.debug('Entity mirror synced: {}'.format(stats))
+
+        return stats
+
+    def query(self, query=None) -> list:
+        """
+        Query mirrored entities, with optional filtering by attribute values.
+
+        Values are matched like entity filters (see :mod:`zmon_cli.entity_filter`): compared as strings, and list
+        attributes match any of their elements.
+
+        :param query: Entity filtering query. Example query ``{'type': 'instance'}`` to return all entities of
+                      type: ``instance``.
+        :type query: dict
+
+        :return: List of entities.
+        :rtype: list
+        """
+        conditions = []
+        params = []
+
+        for attribute, value in (query or {}).items():
+            key = value_key(value)
+            if attribute in ('id', 'type'):
+                conditions.append('{} = ?'.format(attribute))
+                params.append(key)
+            else:
+                conditions.append(attribute_condition(attribute))
+                params.extend((key, key))
+
+        sql = 'SELECT data FROM entities'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        return [json.loads(row[0]) for row in self._db.execute(sql, params)]
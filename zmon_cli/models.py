@@ -0,0 +1,164 @@
+"""
+Compact model classes for large listings of entities, check definitions and alert definitions.
+
+Models are read-only mappings: known fields are stored in ``__slots__``, any other field in a compact tuple. They can
+be used wherever the plain dicts returned by :class:`zmon_cli.client.Zmon` are read.
+"""
+import sys
+
+from collections.abc import Iterator, Mapping
+
+
+# short string values (types, teams, timestamps, ...) repeat a lot in large listings and are shared
+INTERN_MAX_LENGTH = 64
+
+
+class Model(Mapping):
+    """
+    Base model. Subclasses define ``FIELDS``, which are stored in slots. Absent fields are not set at all.
+
+    Other fields are stored as a tuple of values, with a tuple of their names shared by all objects of the same shape.
+
+    >>> e = Entity.from_dict({'id': 'e-1', 'type': 'instance', 'application_id': 'app-1'})
+    >>> e.id, e['application_id'], 'last_modified' in e
+    ('e-1', 'app-1', False)
+    >>> e == {'id': 'e-1', 'type': 'instance', 'application_id': 'app-1'}
+    True
+    """
+
+    __slots__ = ('_extra_names', '_extra_values')
+
+    FIELDS = ()
+    _field_names = frozenset()
+
+    # shared tuples of extra field names
+    _shapes = {}
+
+    def __init__(self, extra=None, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self._set_extra(extra or {})
+
+    def _set_extra(self, extra: dict):
+        names = tuple(extra)
+        self._extra_names = self._shapes.setdefault(names, names)
+        self._extra_values = tuple(extra.values())
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        obj = cls.__new__(cls)
+        extra = {}
+
+        field_names = cls._field_names
+        for name, value in data.items():
+            if type(value) is str and len(value) < INTERN_MAX_LENGTH:
+                value = sys.intern(value)
+
+            if name in field_names:
+                setattr(obj, name, value)
+            else:
+                extra[name] = value
+
+        obj._set_extra(extra)
+        return obj
+
+    @classmethod
+    def from_list(cls, data: list) -> list:
+        """Convert list of dicts in place, so that dicts can be released early."""
+        for i, d in enumerate(data):
+            data[i] = cls.from_dict(d)
+        return data
+
+    @property
+    def extra(self) -> dict:
+        """Fields other than ``FIELDS``."""
+        return dict(zip(self._extra_names, self._extra_values))
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in self.FIELDS if hasattr(self, name)}
+        data.update(zip(self._extra_names, self._extra_values))
+        return data
+
+    def __getitem__(self, key):
+        if key in self._field_names:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+
+        try:
+            return self._extra_values[self._extra_names.index(key)]
+        except ValueError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._field_names:
+            return hasattr(self, key)
+        return key in self._extra_names
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if hasattr(self, name):
+                yield name
+
+        yield from self._extra_names
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, self.to_dict())
+
+
+class Entity(Model):
+    """ZMON entity. Attributes other than ``id``, ``type`` and ``last_modified`` are kept as extra fields."""
+
+    FIELDS = ('id', 'type', 'last_modified')
+
+    __slots__ = FIELDS
+    _field_names = frozenset(FIELDS)
+
+    @property
+    def attributes(self) -> dict:
+        """Additional entity attributes."""
+        return self.extra
+
+
+class CheckDefinition(Model):
+    """ZMON check definition."""
+
+    FIELDS = (
+        'id', 'name', 'description', 'owning_team', 'command', 'interval', 'entities', 'entities_exclude', 'status',
+        'source_url', 'technical_details', 'potential_analysis', 'potential_impact', 'potential_solution', 'runtime',
+        'template', 'last_modified', 'last_modified_by',
+    )
+
+    __slots__ = FIELDS
+    _field_names = frozenset(FIELDS)
+
+
+class AlertDefinition(Model):
+    """ZMON alert definition."""
+
+    FIELDS = (
+        'id', 'name', 'description', 'check_definition_id', 'condition', 'entities', 'entities_exclude', 'status',
+        'priority', 'team', 'responsible_team', 'parameters', 'tags', 'period', 'template', 'parent_id',
+        'notifications', 'created_by', 'last_modified', 'last_modified_by',
+    )
+
+    __slots__ = FIELDS
+    _field_names = frozenset(FIELDS)
+
+
+def to_plain(obj):
+    """
+    Convert models (also in lists or iterators) to plain dicts, e.g. for JSON or YAML serialization.
+
+    >>> to_plain([Entity.from_dict({'id': 'e-1'}), {'id': 'e-2'}])
+    [{'id': 'e-1'}, {'id': 'e-2'}]
+    """
+    if isinstance(obj, Model):
+        return obj.to_dict()
+    elif isinstance(obj, (list, Iterator)):
+        return [to_plain(o) for o in obj]
+    return obj
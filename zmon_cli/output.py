@@ -1,11 +1,18 @@
+import sys
 import json
 import time
+import itertools
 
 import yaml
 import calendar
 
+from collections.abc import Iterator, Mapping
+
 from clickclick import print_table, OutputFormat, action, secho, error, ok, info
 
+from zmon_cli.models import to_plain
+from zmon_cli.status_watch import format_duration
+
 
 # fields to dump as literal blocks
 LITERAL_FIELDS = set(['command', 'condition', 'description'])
@@ -18,6 +25,9 @@ FIELD_SORT_INDEX = {k: chr(i) for i, k in enumerate(FIELD_ORDER)}
 
 LAST_MODIFIED_FMT = '%Y-%m-%d %H:%M:%S.%f'
 
+# array elements encoded at a time by streaming JSON output
+JSON_CHUNK_SIZE = 1000
+
 
 class literal_unicode(str):
     '''Empty class to serialize value as literal YAML block'''
@@ -56,6 +66,104 @@ def dump_yaml(data):
 yaml.add_representer(literal_unicode, literal_unicode_representer)
 
 
+def iter_json(obj, indent=None):
+    """
+    Encode JSON incrementally, exactly like ``json.dumps(obj, indent=indent)``.
+
+    Top-level lists and dicts, and iterators (e.g. generators) directly nested in them, are encoded element by element
+    in batches. So large results are never held as a single string, and generators are written while they produce
+    elements.
+
+    >>> ''.join(iter_json(e for e in [{'id': 1}, {'id': 2}]))
+    '[{"id": 1}, {"id": 2}]'
+    >>> ''.join(iter_json({'checks': iter([1, 2]), 'alerts': []}, indent=2)) == json.dumps(
+    ...     {'checks': [1, 2], 'alerts': []}, indent=2)
+    True
+    """
+    if isinstance(indent, int):
+        indent = ' ' * indent
+
+    return _iter_json(obj, json.JSONEncoder(indent=indent), indent, 0)
+
+
+def _iter_json(obj, encoder, indent, level):
+    streamed = isinstance(obj, Iterator) or (level == 0 and isinstance(obj, (list, tuple, Mapping)))
+    if isinstance(obj, Mapping) and not all(isinstance(key, str) for key in obj):
+        # non-string keys are converted by the encoder
+        streamed = False
+
+    if not streamed:
+        # one-shot encoding uses the fast C encoder, like json.dumps
+        encoded = encoder.encode(to_plain(obj))
+        if indent is not None and level:
+            encoded = encoded.replace('\n', '\n' + indent * level)
+        yield encoded
+        return
+
+    if indent is None:
+        first, separator, last = '', ', ', ''
+    else:
+        first = '\n' + indent * (level + 1)
+        separator = ',' + first
+        last = '\n' + indent * level
+
+    if isinstance(obj, Mapping):
+        opening, closing = '{', '}'
+        parts = _iter_json_items(obj, encoder, indent, level)
+    else:
+        opening, closing = '[', ']'
+        parts = _iter_json_elements(obj, encoder, indent, level, len(opening + first), len(last + closing))
+
+    empty = True
+    for part in parts:
+        yield opening + first if empty else separator
+        empty = False
+        yield from part
+
+    yield opening + closing if empty else last + closing
+
+
+def _iter_json_items(obj, encoder, indent, level):
+    for key, value in obj.items():
+        yield itertools.chain((json.dumps(key) + ': ',), _iter_json(value, encoder, indent, level + 1))
+
+
+def _iter_json_elements(obj, encoder, indent, level, head, tail):
+    """Encode array elements in batches, as encoding each element by itself is much slower."""
+    batch = []
+    for value in obj:
+        if isinstance(value, Iterator):
+            if batch:
+                yield _encode_batch(batch, encoder, indent, level, head, tail)
+                batch = []
+            yield _iter_json(value, encoder, indent, level + 1)
+            continue
+
+        batch.append(to_plain(value))
+        if len(batch) >= JSON_CHUNK_SIZE:
+            yield _encode_batch(batch, encoder, indent, level, head, tail)
+            batch = []
+
+    if batch:
+        yield _encode_batch(batch, encoder, indent, level, head, tail)
+
+
+def _encode_batch(batch, encoder, indent, level, head, tail) -> tuple:
+    # encoded as a separate array, without its brackets
+    encoded = encoder.encode(batch)
+    if indent is not None and level:
+        encoded = encoded.replace('\n', '\n' + indent * level)
+    return encoded[head:-tail],
+
+
+def write_json(obj, fd=None, indent=None):
+    """Write JSON incrementally to ``fd`` (default is stdout), see :func:`iter_json`."""
+    fd = fd or sys.stdout
+    for chunk in iter_json(obj, indent=indent):
+        fd.write(chunk)
+    fd.write('\n')
+
+
 def log_http_exception(e, act=None):
     err = act.error if act else error
     try:
@@ -104,38 +212,59 @@ class Output:
 
     def echo(self, out):
         if self.output == 'yaml':
-            print(dump_yaml(out))
+            print(dump_yaml(to_plain(out)))
         elif self.output == 'json':
-            print(json.dumps(out, indent=self.indent))
+            write_json(out, indent=self.indent)
         elif self.printer:
             self.printer(out, self.output)
         else:
             print(out)
 
 
+def with_target(headers, rows):
+    """
+    Prepend ``target`` column, if rows are tagged with their ZMON target.
+
+    >>> with_target(['id'], [{'id': 1, 'target': 'eu'}])
+    ['target', 'id']
+    """
+    if any('target' in row for row in rows):
+        return ['target'] + headers
+    return headers
+
+
+def last_modified_time(obj):
+    return calendar.timegm(time.gmtime(obj['last_modified'] / 1000))
+
+
 def render_entities(entities, output):
+    """
+    Render entities table, sorted by modification time. Entities from an iterator (e.g. paged retrieval) are consumed
+    as they arrive, keeping only table rows.
+    """
+    # rows are built from scratch, entities (dicts or models) are not modified
     rows = []
     for e in entities:
-        row = e
-        s = sorted(e.keys())
+        row = {'id': e['id'], 'type': e['type']}
+        if 'target' in e:
+            row['target'] = e['target']
 
         key_values = []
 
-        for k in s:
-            if k not in ('id', 'type'):
+        for k in sorted(e.keys()):
+            if k not in ('id', 'type', 'target'):
                 if k == 'last_modified':
-                    row['last_modified_time'] = (
-                        calendar.timegm(time.strptime(row.pop('last_modified'), LAST_MODIFIED_FMT)))
+                    row['last_modified_time'] = calendar.timegm(time.strptime(e[k], LAST_MODIFIED_FMT))
                 else:
                     key_values.append('{}={}'.format(k, e[k]))
 
         row['data'] = ' '.join(key_values)
         rows.append(row)
 
-    rows.sort(key=lambda r: (r['last_modified_time'], r['id'], r['type']))
+    rows.sort(key=lambda r: (r['last_modified_time'], r['id'], r['type'], r.get('target', '')))
 
     with OutputFormat(output):
-        print_table('id type last_modified_time data'.split(),
+        print_table(with_target('id type last_modified_time data'.split(), rows),
                     rows, titles={'last_modified_time': 'Modified'})
 
 
@@ -161,20 +290,62 @@ def render_status(status, output=None):
     print_table(['name', 'size'], rows)
 
 
-def render_checks(checks, output=None):
+def format_rate(rate, unit='/s'):
+    return '' if rate is None else '{:+.1f}{}'.format(rate, unit)
+
+
+def render_status_watch(summary, output=None):
+    """Render status summary of "zmon status --watch", with queue and worker rates over recent samples."""
+    secho('Alerts active: {}    ({} samples over {})'.format(
+        summary.get('alerts_active'), summary['samples'], format_duration(summary['span'])))
+    if summary.get('error'):
+        error('Polling status failed: {}'.format(summary['error']))
+
+    info('Workers:')
     rows = []
+    for worker in summary['workers']:
+        rows.append(dict(worker, rate=format_rate(worker['rate']), recent_rate=format_rate(worker['recent_rate']),
+                         state='STALLED' if worker['stalled'] else 'OK'))
 
-    for check in checks:
-        row = check
+    rows.sort(key=lambda x: x.get('name'))
 
-        row['last_modified_time'] = calendar.timegm(time.gmtime(row.pop('last_modified') / 1000))
+    print_table(['name', 'check_invocations', 'rate', 'recent_rate', 'last_execution_time', 'state'], rows,
+                titles={'rate': 'Rate', 'recent_rate': 'Recent'},
+                styles={'STALLED': {'fg': 'red', 'bold': True}, 'OK': {'fg': 'green'}})
 
-        row['name'] = row['name'][:60]
-        row['owning_team'] = row['owning_team'][:60].replace('\n', '')
+    info('Queues:')
+    rows = []
+    for queue in summary['queues']:
+        if queue['rate'] is None or queue['rate'] == 0:
+            trend = 'steady'
+        else:
+            trend = 'growing' if queue['rate'] > 0 else 'draining'
+        rows.append(dict(queue, rate=format_rate(queue['rate']), trend=trend,
+                         eta=format_duration(queue['eta']) if queue['eta'] is not None else None))
 
-        rows.append(row)
+    rows.sort(key=lambda x: x.get('name'))
 
-    rows.sort(key=lambda c: c['id'])
+    print_table(['name', 'size', 'rate', 'trend', 'eta'], rows, titles={'eta': 'ETA'},
+                styles={'growing': {'fg': 'red'}, 'draining': {'fg': 'green'}})
+
+
+def render_checks(checks, output=None):
+    rows = []
+
+    for check in checks:
+        rows.append({
+            'id': check['id'],
+            'name': check['name'][:60],
+            'owning_team': check['owning_team'][:60].replace('\n', ''),
+            'last_modified_time': last_modified_time(check),
+            'last_modified_by': check.get('last_modified_by'),
+            'status': check.get('status'),
+            'link': check.get('link'),
+        })
+        if 'target' in check:
+            rows[-1]['target'] = check['target']
+
+    rows.sort(key=lambda c: (c.get('target', ''), c['id']))
 
     # Not really used since all checks are ACTIVE!
     check_styles = {
@@ -183,28 +354,41 @@ def render_checks(checks, output=None):
         'INACTIVE': {'fg': 'yellow'},
     }
 
-    print_table(['id', 'name', 'owning_team', 'last_modified_time', 'last_modified_by', 'status', 'link'], rows,
+    headers = ['id', 'name', 'owning_team', 'last_modified_time', 'last_modified_by', 'status', 'link']
+
+    print_table(with_target(headers, rows), rows,
                 titles={'last_modified_time': 'Modified', 'last_modified_by': 'Modified by'}, styles=check_styles)
 
 
 def render_alerts(alerts, output=None):
     rows = []
 
-    for alert in alerts:
-        row = alert
-
-        row['last_modified_time'] = calendar.timegm(time.gmtime(row.pop('last_modified') / 1000))
-
-        row['name'] = row['name'][:60]
-        row['responsible_team'] = row['responsible_team'][:40].replace('\n', '')
-        row['team'] = row['team'][:40].replace('\n', '')
-
-        priorities = {1: 'HIGH', 2: 'MEDIUM', 3: 'LOW'}
-        row['priority'] = priorities.get(row['priority'], 'LOW')
+    priorities = {1: 'HIGH', 2: 'MEDIUM', 3: 'LOW'}
 
-        rows.append(row)
-
-    rows.sort(key=lambda c: c['id'])
+    for alert in alerts:
+        rows.append({
+            'id': alert['id'],
+            'name': alert['name'][:60],
+            'check_definition_id': alert.get('check_definition_id'),
+            'responsible_team': alert['responsible_team'][:40].replace('\n', ''),
+            'team': alert['team'][:40].replace('\n', ''),
+            'priority': priorities.get(alert['priority'], 'LOW'),
+            'last_modified_time': last_modified_time(alert),
+            'last_modified_by': alert.get('last_modified_by'),
+            'status': alert.get('status'),
+            'link': alert.get('link'),
+        })
+        if 'target' in alert:
+            rows[-1]['target'] = alert['target']
+        if 'check_name' in alert:
+            # joined check definition, see "alert-definitions list --with-checks"
+            rows[-1].update({
+                'check_name': (alert['check_name'] or '')[:40],
+                'check_interval': alert.get('check_interval'),
+                'check_command': (alert.get('check_command') or '').strip().split('\n')[0][:40],
+            })
+
+    rows.sort(key=lambda c: (c.get('target', ''), c['id']))
 
     check_styles = {
         'ACTIVE': {'fg': 'green'},
@@ -219,22 +403,53 @@ def render_alerts(alerts, output=None):
         'last_modified_time': 'Modified',
         'last_modified_by': 'Modified by',
         'check_definition_id': 'Check ID',
+        'check_name': 'Check',
+        'check_interval': 'Interval',
+        'check_command': 'Command',
     }
 
     headers = [
         'id', 'name', 'check_definition_id', 'responsible_team', 'team', 'priority', 'last_modified_time',
         'last_modified_by', 'status', 'link',
     ]
+    if any('check_name' in row for row in rows):
+        headers[3:3] = ['check_name', 'check_interval', 'check_command']
+
+    print_table(with_target(headers, rows), rows, titles=titles, styles=check_styles)
+
+
+def render_matches(matches, output=None):
+    """Render entities matched by check or alert definitions: counts, or one row per matched entity ID."""
+    matches = list(matches)
+    with_ids = any('entities' in match for match in matches)
+
+    rows = []
+    for match in matches:
+        row = {
+            'id': match['id'],
+            'name': (match.get('name') or '')[:60],
+            'check_definition_id': match.get('check_definition_id'),
+            'matched': match['matched'],
+        }
+        if with_ids and match.get('entities'):
+            rows.extend(dict(row, entity_id=entity_id) for entity_id in match['entities'])
+        else:
+            rows.append(row)
+
+    headers = ['id', 'name']
+    if any('check_definition_id' in match for match in matches):
+        headers.append('check_definition_id')
+    headers.append('entity_id' if with_ids else 'matched')
 
-    print_table(headers, rows, titles=titles, styles=check_styles)
+    print_table(headers, rows, titles={'check_definition_id': 'Check ID', 'entity_id': 'Entity'})
 
 
 def render_search(search, output):
 
     def _print_table(title, rows):
         info(title)
-        rows.sort(key=lambda x: x.get('title'))
-        print_table(['id', 'title', 'team', 'link'], rows)
+        rows = sorted(rows, key=lambda x: x.get('title'))
+        print_table(with_target(['id', 'title', 'team', 'link'], rows), rows)
         secho('')
 
     _print_table('Checks:', search['checks'])
@@ -0,0 +1,293 @@
+"""
+Streaming input of records (e.g. entities) from large files or stdin.
+
+Supported formats are JSON (a single document, an array or NDJSON) and multi-document YAML, optionally gzip-compressed.
+Records are parsed incrementally, so memory usage does not depend on input size.
+"""
+import io
+import os
+import re
+import sys
+import json
+import gzip
+import shutil
+import tempfile
+import contextlib
+
+import yaml
+
+from zmon_cli.client import ZmonArgumentError
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+YAML_EXTENSIONS = ('.yaml', '.yml')
+
+# bytes read per parsing step
+READ_SIZE = 64 * 1024
+
+# larger JSON records are considered invalid input, instead of buffering the remaining input
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+
+# libyaml based loader is much faster, if available
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+@contextlib.contextmanager
+def open_input(path):
+    """
+    Open input file, or stdin if ``path`` is ``-``, as binary stream. Gzip-compressed input is decompressed.
+
+    :return: Context manager of binary stream.
+    """
+    if path == '-':
+        raw = sys.stdin.buffer if hasattr(sys.stdin, 'buffer') else sys.stdin
+    else:
+        raw = open(path, 'rb')
+
+    try:
+        fd = raw if hasattr(raw, 'peek') else io.BufferedReader(raw)
+
+        if fd.peek(2)[:2] == GZIP_MAGIC:
+            fd = gzip.GzipFile(fileobj=fd, mode='rb')
+
+        yield fd
+    finally:
+        if raw is not sys.stdin and path != '-':
+            raw.close()
+
+
+@contextlib.contextmanager
+def spool_input(path):
+    """
+    Make input readable more than once: stdin (``-``) is copied to a temporary file, other paths are used as is.
+
+    :return: Context manager of input path.
+    """
+    if path != '-':
+        yield path
+        return
+
+    raw = sys.stdin.buffer if hasattr(sys.stdin, 'buffer') else sys.stdin
+    with tempfile.NamedTemporaryFile(prefix='zmon-cli-') as tmp:
+        shutil.copyfileobj(raw, tmp)
+        tmp.flush()
+        yield tmp.name
+
+
+def is_yaml(fd, path=None) -> bool:
+    """Input is YAML, if it has a YAML file extension or does not start like JSON."""
+    name, ext = os.path.splitext(path or '')
+    if ext == '.gz':
+        ext = os.path.splitext(name)[1]
+
+    if ext in YAML_EXTENSIONS:
+        return True
+
+    return fd.peek(READ_SIZE).lstrip()[:1] not in (b'{', b'[')
+
+
+class ValueScanner:
+    """
+    Find the end of a JSON value arriving in chunks, without decoding it. Each chunk is scanned once, so a large value
+    spanning many reads is not decoded again after every read.
+
+    >>> scanner = ValueScanner()
+    >>> scanner.feed('{"a": "}", "b": [1, '), scanner.feed('2]} {"c": 3}')
+    (None, 3)
+    """
+
+    STRUCTURE = re.compile(r'["{}\[\]]')
+    STRING = re.compile(r'["\\]')
+    SCALAR_END = re.compile(r'[\s,\]}]')
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.in_scalar = False
+
+        # escaped character at the start of the next chunk
+        self._skip = 0
+
+    def feed(self, data: str):
+        """Scan next chunk of the value. Return position of value end in ``data``, or ``None`` if not found yet."""
+        pos, self._skip = self._skip, 0
+
+        if not self.started and pos < len(data):
+            self.started = True
+            if data[pos] == '"':
+                self.in_string = True
+            elif data[pos] in '{[':
+                self.depth = 1
+            else:
+                self.in_scalar = True
+            pos += 1
+
+        while True:
+            if self.in_scalar:
+                m = self.SCALAR_END.search(data, pos)
+                return m.start() if m else None
+
+            if self.in_string:
+                m = self.STRING.search(data, pos)
+                if not m:
+                    return None
+                if m.group() == '\\':
+                    pos = m.end() + 1
+                    if pos > len(data):
+                        self._skip = pos - len(data)
+                        return None
+                    continue
+                self.in_string = False
+                pos = m.end()
+                if not self.depth:
+                    return pos
+                continue
+
+            m = self.STRUCTURE.search(data, pos)
+            if not m:
+                return None
+            pos = m.end()
+            if m.group() == '"':
+                self.in_string = True
+            elif m.group() in '{[':
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if not self.depth:
+                    return pos
+
+
+def read_value(fd, partial, read_size=READ_SIZE):
+    """
+    Read from ``fd`` until the JSON value starting ``partial`` is complete, or the stream ends.
+
+    :return: Tuple of buffer starting with the value, and whether the stream ended.
+    :rtype: tuple
+    """
+    scanner = ValueScanner()
+    chunks = [partial]
+    size = len(partial)
+
+    data = partial
+    while scanner.feed(data) is None:
+        if size > MAX_RECORD_SIZE:
+            raise ZmonArgumentError('Invalid JSON input: record larger than {} bytes'.format(MAX_RECORD_SIZE))
+
+        data = fd.read(read_size)
+        if not data:
+            return ''.join(chunks), True
+
+        chunks.append(data)
+        size += len(data)
+
+    return ''.join(chunks), False
+
+
+def iter_json(fd, read_size=READ_SIZE):
+    """
+    Parse whitespace separated JSON values (e.g. NDJSON) from a text stream. Elements of top-level arrays are
+    returned individually.
+
+    >>> list(iter_json(io.StringIO('{"id": 1}\\n{"id": 2}\\n[{"id": 3}, {"id": 4}]')))
+    [{'id': 1}, {'id': 2}, {'id': 3}, {'id': 4}]
+    """
+    decoder = json.JSONDecoder()
+
+    buf = ''
+    pos = 0
+    eof = False
+    in_array = False
+
+    # value at the buffer start was read completely
+    complete = False
+
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (in_array and buf[pos] == ',')):
+            pos += 1
+
+        if pos < len(buf):
+            if not in_array and buf[pos] == '[':
+                in_array = True
+                pos += 1
+                continue
+
+            if in_array and buf[pos] == ']':
+                in_array = False
+                pos += 1
+                continue
+
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError as e:
+                if eof or complete:
+                    raise ZmonArgumentError('Invalid JSON input: {}'.format(e))
+                end = None
+
+            # a scalar (e.g. a number) is incomplete, unless followed by a delimiter
+            if end is not None and (eof or complete or buf[end - 1] in '}]"' or
+                                    ValueScanner.SCALAR_END.match(buf, end)):
+                pos = end
+                complete = False
+                yield value
+                continue
+
+            # value spans reads
+            buf, eof = read_value(fd, buf[pos:], read_size=read_size)
+            pos = 0
+            complete = True
+            continue
+        elif eof:
+            if in_array:
+                raise ZmonArgumentError('Invalid JSON input: unterminated array')
+            return
+
+        chunk = fd.read(read_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def iter_yaml(fd):
+    """
+    Parse YAML documents from a stream. Elements of list documents are returned individually.
+
+    >>> list(iter_yaml(io.StringIO('id: 1\\n---\\n- id: 2\\n- id: 3\\n')))
+    [{'id': 1}, {'id': 2}, {'id': 3}]
+    """
+    try:
+        for doc in yaml.load_all(fd, Loader=YamlLoader):
+            if isinstance(doc, list):
+                yield from doc
+            elif doc is not None:
+                yield doc
+    except yaml.YAMLError as e:
+        raise ZmonArgumentError('Invalid YAML input: {}'.format(e))
+
+
+def iter_records(fd, path=None):
+    """
+    Parse records incrementally from a binary stream, see :func:`open_input`.
+
+    :param path: Input path, used to detect YAML input by file extension.
+    :type path: str
+
+    :return: Generator of records.
+    """
+    if is_yaml(fd, path):
+        # libyaml reads and decodes the binary stream itself
+        return iter_yaml(fd)
+
+    return iter_json(io.TextIOWrapper(fd, encoding='utf-8'))
+
+
+def iter_input(path):
+    """
+    Open input (see :func:`open_input`) and parse its records incrementally. Input is closed when records are
+    exhausted.
+
+    :return: Generator of records.
+    """
+    with open_input(path) as fd:
+        yield from iter_records(fd, path=path)
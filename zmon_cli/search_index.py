@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import bisect
+import logging
+import math
+
+from collections import defaultdict
+
+
+SEARCH_INDEX_FILE = 'search-index.json'
+
+SEARCH_KINDS = ('checks', 'alerts', 'dashboards', 'grafana_dashboards')
+
+DEFAULT_RESULT_LIMIT = 25
+
+# relative weight of indexed fields
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'title': 3.0,
+    'team': 2.0,
+    'owning_team': 2.0,
+    'responsible_team': 2.0,
+    'description': 1.0,
+    'command': 1.0,
+    'condition': 1.0,
+}
+
+# prefix matches rank lower than exact term matches
+PREFIX_MATCH_FACTOR = 0.5
+
+INDEX_VERSION = 1
+
+token_re = re.compile('[a-z0-9]+')
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text) -> list:
+    """
+    Split text into lowercase search terms.
+
+    >>> tokenize('HTTP check: zmon-controller /health_check')
+    ['http', 'check', 'zmon', 'controller', 'health', 'check']
+    """
+    if text is None:
+        return []
+    return token_re.findall(str(text).lower())
+
+
+def document_terms(doc: dict) -> dict:
+    """Return dict of term to weight for all indexed fields of ``doc``."""
+    terms = defaultdict(float)
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(doc.get(field)):
+            terms[term] += weight
+
+    return dict(terms)
+
+
+class SearchIndex:
+    """
+    Local inverted index of checks, alerts, dashboards and grafana dashboards.
+
+    :param path: Path of persisted index. Default is ``None`` (in-memory only).
+    :type path: str
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+        self.documents = {}
+        self.postings = {}
+        self._terms = None
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as fd:
+                data = json.load(fd)
+        except (OSError, ValueError):
+            logger.warning('Failed to load search index: {}'.format(self.path), exc_info=True)
+            return
+
+        if data.get('version') == INDEX_VERSION:
+            self.documents = data['documents']
+            self.postings = data['postings']
+            self._terms = None
+
+    def save(self):
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        tmp = '{}.tmp'.format(self.path)
+        with open(tmp, 'w') as fd:
+            json.dump({'version': INDEX_VERSION, 'documents': self.documents, 'postings': self.postings}, fd)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def terms(self) -> list:
+        """Sorted list of indexed terms, for prefix matching."""
+        if self._terms is None:
+            self._terms = sorted(self.postings)
+        return self._terms
+
+    def remove(self, key):
+        doc = self.documents.pop(key, None)
+        if doc is None:
+            return
+
+        for term in doc['terms']:
+            docs = self.postings.get(term, {})
+            docs.pop(key, None)
+            if not docs:
+                self.postings.pop(term, None)
+
+        self._terms = None
+
+    def add(self, kind, obj):
+        """Index a check definition, alert definition or (grafana) dashboard listing entry."""
+        key = '{}:{}'.format(kind, obj['id'])
+        self.remove(key)
+
+        terms = document_terms(obj)
+        self.documents[key] = {
+            'kind': kind,
+            'id': obj['id'],
+            'title': obj.get('name') or obj.get('title') or '',
+            'team': obj.get('owning_team') or obj.get('team') or '',
+            'last_modified': obj.get('last_modified'),
+            'terms': terms,
+        }
+
+        for term, weight in terms.items():
+            self.postings.setdefault(term, {})[key] = weight
+
+        self._terms = None
+
+    def update(self, kind, objects) -> dict:
+        """
+        Incrementally update index with a complete listing of ``kind``.
+
+        Objects with an unchanged ``last_modified`` are not re-indexed. Objects missing from listing are removed.
+
+        :return: Update stats, with number of ``indexed``, ``removed`` and ``unchanged`` objects.
+        :rtype: dict
+        """
+        stats = {'indexed': 0, 'removed': 0, 'unchanged': 0}
+        seen = set()
+
+        for obj in objects:
+            key = '{}:{}'.format(kind, obj['id'])
+            seen.add(key)
+
+            doc = self.documents.get(key)
+            last_modified = obj.get('last_modified')
+            if doc and last_modified is not None and doc['last_modified'] == last_modified:
+                stats['unchanged'] += 1
+                continue
+
+            self.add(kind, obj)
+            stats['indexed'] += 1
+
+        for key in [k for k, doc in self.documents.items() if doc['kind'] == kind and k not in seen]:
+            self.remove(key)
+            stats['removed'] += 1
+
+        return stats
+
+    def _match(self, token) -> dict:
+        """Return dict of document key to score for a single query token."""
+        scores = defaultdict(float)
+
+        i = bisect.bisect_left(self.terms, token)
+        while i < len(self.terms) and self.terms[i].startswith(token):
+            term = self.terms[i]
+            docs = self.postings[term]
+
+            idf = math.log(1 + len(self.documents) / len(docs))
+            factor = 1.0 if term == token else PREFIX_MATCH_FACTOR
+
+            for key, weight in docs.items():
+                scores[key] = max(scores[key], weight * idf * factor)
+            i += 1
+
+        return scores
+
+    def search(self, q, limit=None, teams=None) -> dict:
+        """
+        Search index. All query terms must match, either exactly or as prefix of an indexed term.
+
+        :param q: search query.
+        :type q: str
+
+        :param limit: Maximum number of results per kind. Default is 25.
+        :type limit: int
+
+        :param teams: List of teams to filter results. Default is None.
+        :type teams: list
+
+        :return: Search result, in the same format as :func:`zmon_cli.client.Zmon.search`.
+        :rtype: dict
+        """
+        limit = int(limit or DEFAULT_RESULT_LIMIT)
+
+        scores = None
+        for token in tokenize(q):
+            matches = self._match(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {k: s + matches[k] for k, s in scores.items() if k in matches}
+
+        if scores is None:
+            # empty query matches everything
+            scores = {k: 0.0 for k in self.documents}
+
+        result = {kind: [] for kind in SEARCH_KINDS}
+
+        for key in sorted(scores, key=lambda k: (-scores[k], self.documents[k]['title'])):
+            doc = self.documents[key]
+            if teams and doc['team'] not in teams:
+                continue
+
+            hits = result[doc['kind']]
+            if len(hits) < limit:
+                hits.append({'id': doc['id'], 'title': doc['title'], 'team': doc['team']})
+
+        return result
@@ -0,0 +1,204 @@
+"""
+Watching ZMON status over time: queue growth or drain rates, worker throughput and stalled workers.
+
+Status samples are kept in a fixed size ring buffer. Queue and worker names are shared between samples, so each sample
+only holds a timestamp and two tuples of numbers.
+"""
+import time
+import logging
+
+from collections import deque, namedtuple
+
+import requests
+
+from zmon_cli.client import ZmonCircuitOpenError
+
+
+DEFAULT_WATCH_INTERVAL = 5
+
+# samples kept to compute rates, i.e. 10 minutes at the default interval
+DEFAULT_HISTORY_SIZE = 120
+
+# workers without new check invocations for longer are considered stalled
+DEFAULT_STALL_AFTER = 60
+
+Sample = namedtuple('Sample', 'time queue_names queue_sizes worker_names worker_invocations')
+
+logger = logging.getLogger(__name__)
+
+
+def format_duration(seconds) -> str:
+    """
+    Format duration in seconds, e.g. an ETA.
+
+    >>> format_duration(42), format_duration(200), format_duration(7300)
+    ('42s', '3m 20s', '2h 1m')
+    """
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return '{}s'.format(seconds)
+    elif seconds < 3600:
+        return '{}m {}s'.format(seconds // 60, seconds % 60)
+    return '{}h {}m'.format(seconds // 3600, seconds % 3600 // 60)
+
+
+def rate(points):
+    """
+    Return change per second between first and last of ``(time, value)`` points, or ``None`` if unknown.
+
+    >>> rate([(0, 100), (5, 90), (10, 50)])
+    -5.0
+    """
+    if len(points) < 2 or points[-1][0] <= points[0][0]:
+        return None
+    return (points[-1][1] - points[0][1]) / (points[-1][0] - points[0][0])
+
+
+class StatusHistory:
+    """
+    Ring buffer of ZMON status samples.
+
+    >>> history = StatusHistory()
+    >>> history.add({'queues': [{'name': 'q', 'size': 100}]}, timestamp=0)
+    >>> history.add({'queues': [{'name': 'q', 'size': 80}]}, timestamp=10)
+    >>> history.queues()
+    [{'name': 'q', 'size': 80, 'rate': -2.0, 'eta': 40.0}]
+
+    :param size: Number of samples to keep.
+    :type size: int
+    """
+
+    def __init__(self, size=DEFAULT_HISTORY_SIZE):
+        self._samples = deque(maxlen=max(2, size))
+        self._names = {}
+
+        self.alerts_active = None
+        self.last_execution_times = {}
+        self.error = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def _shared(self, names: tuple) -> tuple:
+        return self._names.setdefault(names, names)
+
+    def add(self, status: dict, timestamp=None):
+        queues = [(q['name'], q.get('size') or 0) for q in status.get('queues', [])]
+        workers = [(w['name'], w.get('check_invocations') or 0) for w in status.get('workers', [])]
+
+        self._samples.append(Sample(
+            time.monotonic() if timestamp is None else timestamp,
+            self._shared(tuple(name for name, _ in queues)), tuple(size for _, size in queues),
+            self._shared(tuple(name for name, _ in workers)), tuple(count for _, count in workers),
+        ))
+
+        self.alerts_active = status.get('alerts_active')
+        self.last_execution_times = {w['name']: w.get('last_execution_time') for w in status.get('workers', [])}
+        self.error = None
+
+    @property
+    def span(self) -> float:
+        """Seconds covered by samples."""
+        if not self._samples:
+            return 0
+        return self._samples[-1].time - self._samples[0].time
+
+    def _series(self, names_field, values_field, name) -> list:
+        points = []
+        for sample in self._samples:
+            names = getattr(sample, names_field)
+            if name in names:
+                points.append((sample.time, getattr(sample, values_field)[names.index(name)]))
+        return points
+
+    def queues(self) -> list:
+        """Current queue sizes, with growth (positive) or drain (negative) rate per second and ETA until empty."""
+        if not self._samples:
+            return []
+
+        last = self._samples[-1]
+
+        result = []
+        for name, size in zip(last.queue_names, last.queue_sizes):
+            queue_rate = rate(self._series('queue_names', 'queue_sizes', name))
+            result.append({
+                'name': name,
+                'size': size,
+                'rate': queue_rate,
+                'eta': size / -queue_rate if queue_rate is not None and queue_rate < 0 else None,
+            })
+
+        return result
+
+    def workers(self, stall_after=DEFAULT_STALL_AFTER) -> list:
+        """
+        Current workers, with check invocation rate over all samples and since the previous sample. Workers without
+        new invocations for more than ``stall_after`` seconds are stalled.
+        """
+        if not self._samples:
+            return []
+
+        last = self._samples[-1]
+
+        result = []
+        for name, invocations in zip(last.worker_names, last.worker_invocations):
+            points = self._series('worker_names', 'worker_invocations', name)
+
+            # invocation counters are reset by worker restarts
+            start = 0
+            last_change = points[0][0]
+            for i in range(1, len(points)):
+                if points[i][1] < points[i - 1][1]:
+                    start = i
+                if points[i][1] != points[i - 1][1]:
+                    last_change = points[i][0]
+            points = points[start:]
+
+            result.append({
+                'name': name,
+                'check_invocations': invocations,
+                'last_execution_time': self.last_execution_times.get(name),
+                'rate': rate(points),
+                'recent_rate': rate(points[-2:]),
+                'stalled': points[-1][0] - last_change > stall_after,
+            })
+
+        return result
+
+    def summary(self, stall_after=DEFAULT_STALL_AFTER) -> dict:
+        return {
+            'alerts_active': self.alerts_active,
+            'samples': len(self),
+            'span': self.span,
+            'error': self.error,
+            'queues': self.queues(),
+            'workers': self.workers(stall_after=stall_after),
+        }
+
+
+def poll_status(client, history, interval=DEFAULT_WATCH_INTERVAL, count=0):
+    """
+    Poll ZMON status every ``interval`` seconds, reusing the client session, and add samples to ``history``. A failed
+    poll is recorded as ``history.error``, and polling continues.
+
+    :param count: Number of polls. Default is to poll forever.
+    :type count: int
+
+    :return: Generator yielding ``history`` after every poll.
+    """
+    polls = 0
+    while True:
+        start = time.monotonic()
+        try:
+            history.add(client.status(), timestamp=start)
+        except (requests.RequestException, ZmonCircuitOpenError) as e:
+            logger.debug('Polling status failed: {}'.format(e))
+            history.error = str(e)
+
+        polls += 1
+        yield history
+
+        if count and polls >= count:
+            return
+
+        time.sleep(max(0, interval - (time.monotonic() - start)))
@@ -0,0 +1,165 @@
+"""
+HTTP transports used by :class:`zmon_cli.client.Zmon`.
+
+A transport provides ``get``, ``post``, ``put`` and ``delete`` methods with :mod:`requests` call semantics (``params``,
+``json``, ``data`` and ``timeout`` keyword arguments, the timeout optionally as ``(connect, read)`` tuple), a mutable
+``headers`` mapping and ``close``. Responses provide ``status_code``, ``ok``, ``reason``, ``text``, ``json()`` and
+``raise_for_status()`` raising :class:`requests.HTTPError`.
+"""
+import json
+import logging
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+REQUESTS = 'requests'
+HTTPX = 'httpx'
+
+TRANSPORTS = (REQUESTS, HTTPX)
+
+logger = logging.getLogger(__name__)
+
+# connections kept per host, should cover the concurrency of bulk commands
+DEFAULT_POOL_SIZE = 64
+
+
+class TransportError(Exception):
+    """Transport is not available, e.g. because of a missing optional dependency."""
+
+
+class RequestsTransport(requests.Session):
+    """
+    Default transport: a :class:`requests.Session` with a connection pool sized for concurrent bulk requests.
+
+    HTTP/1.1 only, every concurrent request needs its own connection.
+    """
+
+    def __init__(self, headers=None, auth=None, verify=True, pool_size=DEFAULT_POOL_SIZE):
+        super().__init__()
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+        self.headers.update(headers or {})
+        self.auth = auth
+        self.verify = verify
+
+
+class HttpxResponse:
+    """Adapt :class:`httpx.Response` to the :class:`requests.Response` interface used by the client."""
+
+    def __init__(self, response):
+        self._response = response
+
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def reason(self):
+        return self._response.reason_phrase
+
+    @property
+    def text(self):
+        return self._response.text
+
+    @property
+    def content(self):
+        return self._response.content
+
+    def json(self, **kwargs):
+        return json.loads(self._response.content.decode(self._response.encoding or 'utf-8'), **kwargs)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(
+                '{} Error: {} for url: {}'.format(self.status_code, self.reason, self.url), response=self)
+
+
+class HttpxTransport:
+    """
+    Transport based on ``httpx``, using HTTP/2 if the server supports it: concurrent requests are then multiplexed over
+    a single connection per host.
+
+    Requires optional dependency ``httpx``, and ``h2`` for HTTP/2: ``pip install "zmon-cli[httpx]"``. Without ``h2``,
+    HTTP/1.1 is used.
+    """
+
+    def __init__(self, headers=None, auth=None, verify=True, pool_size=DEFAULT_POOL_SIZE, **client_kwargs):
+        try:
+            import httpx
+        except ImportError:
+            raise TransportError('Transport "httpx" requires optional dependency: pip install "zmon-cli[httpx]"')
+
+        self._httpx = httpx
+
+        client_kwargs.setdefault('http2', True)
+        client_kwargs.setdefault('limits', httpx.Limits(max_connections=pool_size,
+                                                        max_keepalive_connections=pool_size))
+
+        try:
+            self._client = httpx.Client(headers=headers, auth=auth, verify=verify, **client_kwargs)
+        except ImportError:
+            if not client_kwargs['http2']:
+                raise TransportError('Transport "httpx" requires optional dependency: pip install "zmon-cli[httpx]"')
+
+            logger.warning('HTTP/2 requires optional dependency "h2" (pip install "zmon-cli[httpx]"), using HTTP/1.1')
+            client_kwargs['http2'] = False
+            self._client = httpx.Client(headers=headers, auth=auth, verify=verify, **client_kwargs)
+
+    @property
+    def headers(self):
+        return self._client.headers
+
+    def request(self, method, url, params=None, json=None, data=None, timeout=None):
+        if isinstance(timeout, tuple):
+            # requests style (connect, read) timeout
+            timeout = self._httpx.Timeout(timeout[1], connect=timeout[0])
+
+        try:
+            # same as requests: no timeout unless specified
+            response = self._client.request(method, url, params=params, json=json, content=data, timeout=timeout)
+        except self._httpx.TimeoutException as e:
+            raise requests.Timeout(str(e))
+        except self._httpx.TransportError as e:
+            raise requests.ConnectionError(str(e))
+
+        return HttpxResponse(response)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        self._client.close()
+
+
+def create_transport(name=None, **kwargs):
+    """
+    Create transport by name. Default is ``requests``.
+
+    :raises: TransportError
+    """
+    name = name or REQUESTS
+
+    if name == REQUESTS:
+        return RequestsTransport(**kwargs)
+    elif name == HTTPX:
+        return HttpxTransport(**kwargs)
+
+    raise TransportError('Unknown transport "{}", expected one of: {}'.format(name, ', '.join(TRANSPORTS)))